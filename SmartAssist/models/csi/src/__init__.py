@@ -3,10 +3,15 @@ CSI (Clean Street Index) Module
 Clean Street Index computation from road and garbage segmentation
 
 This module provides:
-- CSI computation algorithms (compute_csi, get_discrete_csi)
+- CSI computation algorithms (compute_csi, compute_csi_histogram, compute_csi_batch, get_discrete_csi)
 - Filtering mask creation (create_filtering_masks)
-- Weight matrix generation (get_weight_matrix_linspace)
+- Weight matrix generation (get_weight_matrix_linspace, cached get_weight_profile_linspace)
 - Buffer probe for DeepStream integration (compute_csi_buffer_probe)
+- Worker processes computing CSI from shared memory masks (CsiWorkerPool)
+- CSI records per road distance (DistanceAggregator, VehicleSpeedReader)
+- Adaptive CSI rate from vehicle motion and mask changes (CsiRateController)
+- Segmentation mask access with reusable buffers (SegmentationMaskReader)
+- Debug overlay of the masks (MaskOverlay)
 - CSI probe bin creation (create_csiprobebin)
 """
 from .constants import (
@@ -21,23 +26,48 @@ from .constants import (
     DEFAULT_GARBAGE_TYPE_COEFFS,
     DEFAULT_SMOOTH,
     DEFAULT_CLIP_CSI,
+    WEIGHT_PROFILE_CACHE_SIZE,
     FRONT_CSI_LEVELS,
     REAR_CSI_LEVELS
 )
 
 from .computation import (
     compute_csi,
+    compute_csi_histogram,
+    compute_csi_batch,
     create_filtering_masks,
     get_discrete_csi,
     get_weight_matrix_linspace,
+    get_weight_profile_linspace,
     find_xmin_xmax
 )
 
 from .probes import (
     compute_csi_buffer_probe,
+    create_csi_worker_pool,
+    create_csi_aggregation,
+    create_csi_rate_controller,
+    create_vehicle_speed_reader,
     display_masks
 )
 
+from .worker import (
+    CsiResult,
+    CsiWorkerPool
+)
+
+from .aggregation import (
+    CsiRecord,
+    DistanceAggregator,
+    VehicleSpeedReader
+)
+
+from .masks import SegmentationMaskReader
+
+from .overlay import MaskOverlay
+
+from .rate import CsiRateController
+
 from .bins import (
     create_csiprobebin
 )
@@ -55,20 +85,44 @@ __all__ = [
     'DEFAULT_GARBAGE_TYPE_COEFFS',
     'DEFAULT_SMOOTH',
     'DEFAULT_CLIP_CSI',
+    'WEIGHT_PROFILE_CACHE_SIZE',
     'FRONT_CSI_LEVELS',
     'REAR_CSI_LEVELS',
     
     # Computation functions
     'compute_csi',
+    'compute_csi_histogram',
+    'compute_csi_batch',
     'create_filtering_masks',
     'get_discrete_csi',
     'get_weight_matrix_linspace',
+    'get_weight_profile_linspace',
     'find_xmin_xmax',
     
     # Buffer probes
     'compute_csi_buffer_probe',
+    'create_csi_worker_pool',
+    'create_csi_aggregation',
+    'create_csi_rate_controller',
+    'create_vehicle_speed_reader',
     'display_masks',
     
+    # Worker pool
+    'CsiResult',
+    'CsiWorkerPool',
+    
+    # Distance aggregation
+    'CsiRecord',
+    'DistanceAggregator',
+    'VehicleSpeedReader',
+    
+    # Mask access
+    'SegmentationMaskReader',
+    'MaskOverlay',
+    
+    # Rate control
+    'CsiRateController',
+    
     # Bin creation
     'create_csiprobebin',
 ]
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+CSI Distance Aggregation
+One CSI record per stretch of road instead of one per frame
+
+Per-frame CSI oversamples a parked vehicle and undersamples a fast one. A
+DistanceAggregator per camera integrates the vehicle speed between CSI samples and
+emits one record every `distance` metres, with the distance-weighted mean and the
+max of the CSI over that stretch and an optional EMA over the records. The state is
+a few running sums per camera, so time and memory per sample are constant.
+
+The speed comes from the VehicleSpeed CAN signal, polled from the CAN server by a
+VehicleSpeedReader thread so the streaming thread never waits for the socket.
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+
+
+# CSI of one stretch of road
+CsiRecord = namedtuple('CsiRecord', [
+    'key',                # 'front' or 'rear'
+    'start_time',         # time.time() the vehicle started covering the record
+    'end_time',           # time.time() of the sample completing the record
+    'distance',           # metres covered by the record
+    'samples',            # CSI samples in the record (a sample split between two records counts in both)
+    'mean_csi',           # distance-weighted mean of the relative CSI
+    'max_csi',            # highest relative CSI of the samples
+    'mean_absolute_csi',  # distance-weighted mean of the absolute CSI
+    'ema_csi',            # EMA of mean_csi over the records, None without EMA
+])
+
+KMH_TO_MS = 1 / 3.6
+
+
+class DistanceAggregator:
+    """
+    Running distance-weighted CSI statistics of one camera
+
+    Each sample is weighted by the distance driven since the previous sample, so
+    samples taken while standing still move neither the mean nor the max. The part
+    of a sample's distance beyond the record distance is carried into the next
+    record, so every record covers exactly `distance` metres.
+    """
+    __slots__ = ('key', 'distance', 'alpha', 'max_gap', 'last_time', 'ema',
+                 'start_time', 'travelled', 'samples', 'weighted_sum', 'weighted_absolute_sum', 'max_csi')
+
+    def __init__(self, key, distance=10.0, alpha=None, max_gap=1.0):
+        """
+        :param key: Camera key ('front' or 'rear')
+        :param distance: Metres of road per record
+        :param alpha: EMA weight of the newest record (0-1), None disables the EMA
+        :param max_gap: Longest time between two samples in seconds that is integrated
+                        (longer gaps, e.g. after a dropped stream, count as max_gap)
+        """
+        if distance <= 0:
+            raise ValueError(f'Record distance must be positive: {distance}')
+        if alpha is not None and not 0 < alpha <= 1:
+            raise ValueError(f'EMA alpha must be in (0, 1]: {alpha}')
+        self.key = key
+        self.distance = distance
+        self.alpha = alpha
+        self.max_gap = max_gap
+        self.last_time = None
+        self.ema = None
+        self._reset()
+
+    def _reset(self):
+        self.start_time = None
+        self.travelled = 0.0
+        self.samples = 0
+        self.weighted_sum = 0.0
+        self.weighted_absolute_sum = 0.0
+        self.max_csi = -math.inf
+
+    def update(self, relative_csi, absolute_csi, speed, timestamp=None):
+        """
+        Add one CSI sample
+
+        :param relative_csi: Relative CSI of the frame (NaN samples are skipped)
+        :param absolute_csi: Absolute CSI of the frame
+        :param speed: Vehicle speed in m/s, None if unknown (no distance is counted)
+        :param timestamp: Sample time (time.time()), now if None
+        :return: CsiRecord when the record distance is reached, otherwise None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        last_time, self.last_time = self.last_time, timestamp
+        if relative_csi != relative_csi:  # NaN, no road in the frame
+            return None
+
+        step = 0.0
+        if speed and last_time is not None:
+            step = max(speed, 0.0) * min(max(timestamp - last_time, 0.0), self.max_gap)
+
+        if step <= 0.0:
+            return None
+        if self.start_time is None:
+            self.start_time = last_time
+
+        room = self.distance - self.travelled
+        if step < room:
+            self._add(step, relative_csi, absolute_csi)
+            return None
+
+        self._add(room, relative_csi, absolute_csi)
+        record = self._emit(timestamp)
+        self.start_time = timestamp
+        # Distance beyond this record goes to the next one. A step longer than a whole
+        # record (fast driving at a low frame rate) only fills the record it ends in:
+        # the records in between would hold this one sample and are not emitted.
+        excess = (step - room) % self.distance
+        if excess > 0.0:
+            self._add(excess, relative_csi, absolute_csi)
+        return record
+
+    def _add(self, step, relative_csi, absolute_csi):
+        self.samples += 1
+        self.travelled += step
+        self.weighted_sum += step * relative_csi
+        self.weighted_absolute_sum += step * absolute_csi
+        if relative_csi > self.max_csi:
+            self.max_csi = relative_csi
+
+    def _emit(self, end_time):
+        mean_csi = self.weighted_sum / self.travelled
+        if self.alpha is not None:
+            self.ema = mean_csi if self.ema is None else self.ema + self.alpha * (mean_csi - self.ema)
+        record = CsiRecord(self.key, self.start_time, end_time, self.travelled, self.samples, mean_csi,
+                           self.max_csi, self.weighted_absolute_sum / self.travelled, self.ema)
+        self._reset()
+        return record
+
+
+class VehicleSpeedReader:
+    """
+    Latest vehicle speed from the CAN server, polled on a background thread
+    """
+
+    def __init__(self, app_context, signal='VehicleSpeed', unit='kmh', interval=1.0, max_age=3.0):
+        """
+        :param app_context: Application context holding 'can_client' (looked up on every poll)
+        :param signal: CAN signal with the vehicle speed
+        :param unit: 'kmh' or 'ms', unit of the signal
+        :param interval: Seconds between polls
+        :param max_age: Speed older than this many seconds counts as unknown
+        """
+        if unit not in ('kmh', 'ms'):
+            raise ValueError(f'Unknown speed unit: {unit}')
+        self.app_context = app_context
+        self.signal = signal
+        self.scale = KMH_TO_MS if unit == 'kmh' else 1.0
+        self.interval = interval
+        self.max_age = max_age
+        self.use_get_data = True
+
+        self.speed = None
+        self.updated_at = 0.0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start polling"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='csi_speed_reader', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop polling"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def get(self):
+        """
+        Latest speed
+
+        :return: Speed in m/s, None if no recent value
+        """
+        if self.speed is None or time.monotonic() - self.updated_at > self.max_age:
+            return None
+        return self.speed
+
+    def _run(self):
+        while self.running:
+            try:
+                can_client = self.app_context.get_value('can_client')
+                if can_client and can_client.connected:
+                    # Only the speed signal: the full get_all reply is large and slow to send every poll
+                    if self.use_get_data:
+                        response = can_client.get_data([self.signal])
+                        if response and 'error' in response:
+                            # Server without get_data, poll get_all from now on
+                            print(f'CAN server has no get_data ({response["error"]}), polling get_all')
+                            self.use_get_data = False
+                    if not self.use_get_data:
+                        response = can_client.get_all_data()
+                    entry = ((response or {}).get('data') or {}).get(self.signal)
+                    if entry is not None and entry.get('value') is not None:
+                        self.speed = float(entry['value']) * self.scale
+                        self.updated_at = time.monotonic()
+            except Exception as e:
+                print(f'Error reading {self.signal}: {e}')
+            time.sleep(self.interval)
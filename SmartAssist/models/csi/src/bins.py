@@ -13,7 +13,16 @@ import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
 
-from .probes import compute_csi_buffer_probe
+from functools import partial
+from types import SimpleNamespace
+
+from .probes import (
+    compute_csi_buffer_probe,
+    create_csi_worker_pool,
+    create_csi_aggregation,
+    create_csi_rate_controller,
+    create_vehicle_speed_reader
+)
 from pipeline.pipeline import make_element
 from pipeline.pipeline import link_static_srcpad_pad_to_request_sinkpad
 from pipeline.utils.paths import get_deepstream_config_path, CSI_ROAD_CONFIG, CSI_GARBAGE_CONFIG
@@ -187,8 +196,33 @@ def create_csiprobebin(app_context, flip_method):
     # ========== ATTACH CSI COMPUTATION PROBE ==========
     
     # Attach probe to queue_post_garbage_pgie to compute CSI
+    # CSI worker pool (csi_computation.worker): the probe only copies the masks, the
+    # workers are spawned here before the pipeline plays
+    csi_worker_pool = create_csi_worker_pool(logger=logger)
+    if csi_worker_pool is not None:
+        app_context.set_value('csi_worker_pool', csi_worker_pool)
+        logger.debug(f'CSI worker pool started ({csi_worker_pool.processes} processes, '
+                     f'{csi_worker_pool.n_slots} mask slots)')
+    
+    # CSI records per road distance (csi_computation.smoothing) and adaptive CSI rate
+    # (csi_computation.rate_control, decided in the CSI probe and, with skip_inference,
+    # applied through the road nvinfer interval), both using the vehicle speed polled from CAN
+    speed_reader = create_vehicle_speed_reader(app_context)
+    csi_aggregation = create_csi_aggregation(app_context, speed_reader)
+    csi_rate_controller = create_csi_rate_controller(
+        speed_reader, set_inference_interval=partial(road_nvinfer_engine.set_property, 'interval'), logger=logger)
+    if csi_aggregation is not None or csi_rate_controller is not None:
+        speed_reader.start()
+        app_context.set_value('csi_speed_reader', speed_reader)
+        logger.debug(f'CSI distance aggregation: {csi_aggregation is not None}, '
+                     f'rate control: {csi_rate_controller is not None}')
+    if csi_rate_controller is not None:
+        app_context.set_value('csi_rate_controller', csi_rate_controller)
+    
+    probe_data = SimpleNamespace(worker_pool=csi_worker_pool, aggregation=csi_aggregation,
+                                 rate_controller=csi_rate_controller)
     queue_post_garbage_pgie_pad = get_static_pad(queue_post_garbage_pgie, 'src')
-    queue_post_garbage_pgie_pad.add_probe(Gst.PadProbeType.BUFFER, compute_csi_buffer_probe, 0)
+    queue_post_garbage_pgie_pad.add_probe(Gst.PadProbeType.BUFFER, compute_csi_buffer_probe, probe_data)
     logger.debug('CSI computation probe attached')
     
     # ========== ADD GHOST PAD FOR OUTPUT ==========
@@ -5,11 +5,14 @@ Core algorithms for computing Clean Street Index from segmentation masks
 VERIFIED: Exact functionality from pipeline/csi/utils/csi/csi_utils.py
 """
 import logging
+from functools import lru_cache
 from types import SimpleNamespace
 
 import cv2 as cv
 import numpy as np
 
+from .constants import WEIGHT_PROFILE_CACHE_SIZE
+
 
 def find_xmin_xmax(src: np.array) -> tuple:
     """
@@ -64,37 +67,25 @@ def find_xmin_xmax(src: np.array) -> tuple:
     return x_min, x_max
 
 
-def get_weight_matrix_linspace(n_rows: int,
-                               n_cols: int,
-                               n_bins: int,
-                               linsp_start: float,
-                               linsp_stop: float) -> np.array:
+@lru_cache(maxsize=WEIGHT_PROFILE_CACHE_SIZE)
+def get_weight_profile_linspace(n_cols: int,
+                                n_bins: int,
+                                linsp_start: float,
+                                linsp_stop: float) -> np.array:
     """
-    Generate a 2D weight matrix with a symmetric, linearly spaced pattern across columns.
-    
-    The resulting matrix has values that gradually change from `linsp_start` to `linsp_stop`
-    (in `n_bins` steps) on the left side, remain constant in the middle, and then symmetrically
-    mirror back from `linsp_stop` to `linsp_start` on the right side.
+    Generate the column weights of get_weight_matrix_linspace as a 1-D profile.
     
-    This creates a weighting scheme where:
-    - Edges (sidewalk) have low weights (linsp_start = 0.7)
-    - Center (middle of road) has high weights (linsp_stop = 1.0)
+    The weights only vary along the columns and only depend on the road width, so
+    the profile is computed once per width and cached (LRU). The returned array is
+    read-only since it is shared between calls; multiply by it with broadcasting.
     
-    :param n_rows: Number of rows in the mask
-    :param n_cols: Number of columns in the mask
+    :param n_cols: Number of columns (road width in pixels)
     :param n_bins: Number of bins for the linearly spaced pattern (typically 48)
     :param linsp_start: Starting value for linear spacing (edge weight, e.g., 0.7)
     :param linsp_stop: Stopping value for linear spacing (center weight, e.g., 1.0)
-    :return: Weight matrix of shape (n_rows, n_cols)
-    
-    VERIFIED: Exact from original
+    :return: Read-only float32 weight profile of shape (n_cols,)
     """
     if __debug__:
-        if n_rows <= 0:
-            msg = f"Invalid number of rows: {n_rows}. Must be > 0."
-            logging.error(msg=msg)
-            raise ValueError(msg)
-        
         if n_cols <= 0:
             msg = f"Invalid number of cols: {n_cols}. Must be > 0."
             logging.error(msg=msg)
@@ -134,21 +125,60 @@ def get_weight_matrix_linspace(n_rows: int,
     # Generate weights for the pattern using linspace
     weights = np.linspace(start=linsp_start, stop=linsp_stop, num=n_bins)
     
-    # Initialize the weighted road mask (central region will have all pixels at 1.0)
-    w_road_mask = np.ones(shape=(n_rows, n_cols), dtype=np.float32)
+    # Initialize the weight profile (central region will have all columns at 1.0)
+    profile = np.ones(shape=n_cols, dtype=np.float32)
     
-    # Create a matrix with n_rows, each row composed of repeated columns of weights (grouped in bins)
-    matrix_weights = np.tile(A=np.repeat(weights, grouping, axis=0), reps=(n_rows, 1))
+    # Repeated columns of weights (grouped in bins)
+    edge_weights = np.repeat(weights, grouping, axis=0)
     
     # Determine start and stop columns for placing the weights symmetrically
-    col_stop = matrix_weights.shape[1]
-    col_start = n_cols - matrix_weights.shape[1]
+    col_stop = edge_weights.shape[0]
+    col_start = n_cols - edge_weights.shape[0]
+    
+    # Assign weights symmetrically to the left and right sides of the profile
+    profile[:col_stop] = edge_weights
+    profile[col_start:] = edge_weights[::-1]  # Mirror for right side
+    
+    profile.flags.writeable = False
+    return profile
+
+
+def get_weight_matrix_linspace(n_rows: int,
+                               n_cols: int,
+                               n_bins: int,
+                               linsp_start: float,
+                               linsp_stop: float) -> np.array:
+    """
+    Generate a 2D weight matrix with a symmetric, linearly spaced pattern across columns.
+    
+    The resulting matrix has values that gradually change from `linsp_start` to `linsp_stop`
+    (in `n_bins` steps) on the left side, remain constant in the middle, and then symmetrically
+    mirror back from `linsp_stop` to `linsp_start` on the right side.
+    
+    This creates a weighting scheme where:
+    - Edges (sidewalk) have low weights (linsp_start = 0.7)
+    - Center (middle of road) has high weights (linsp_stop = 1.0)
     
-    # Assign weights symmetrically to the left and right sides of the mask
-    w_road_mask[:, :col_stop] = matrix_weights
-    w_road_mask[:, col_start:] = matrix_weights[:, ::-1]  # Mirror for right side
+    Every row is the cached get_weight_profile_linspace profile; compute_csi uses the
+    profile directly and no longer builds this matrix.
     
-    return w_road_mask
+    :param n_rows: Number of rows in the mask
+    :param n_cols: Number of columns in the mask
+    :param n_bins: Number of bins for the linearly spaced pattern (typically 48)
+    :param linsp_start: Starting value for linear spacing (edge weight, e.g., 0.7)
+    :param linsp_stop: Stopping value for linear spacing (center weight, e.g., 1.0)
+    :return: Weight matrix of shape (n_rows, n_cols)
+    
+    VERIFIED: Exact from original
+    """
+    if __debug__:
+        if n_rows <= 0:
+            msg = f"Invalid number of rows: {n_rows}. Must be > 0."
+            logging.error(msg=msg)
+            raise ValueError(msg)
+    
+    profile = get_weight_profile_linspace(n_cols, n_bins, linsp_start, linsp_stop)
+    return np.tile(A=profile, reps=(n_rows, 1))
 
 
 def create_filtering_masks(csi_config: SimpleNamespace) -> tuple:
@@ -245,6 +275,32 @@ def create_filtering_masks(csi_config: SimpleNamespace) -> tuple:
     return trap_mask_front, trap_mask_rear
 
 
+def _mask_values_valid(mask: np.array, class_ids: list) -> bool:
+    """
+    Check that a mask only contains the given class IDs
+    
+    Consecutive class IDs (the usual [0, 1] / [0, 1, 2]) only need the mask's minimum
+    and maximum, other sets fall back to np.unique.
+    """
+    if list(class_ids) == list(range(min(class_ids), max(class_ids) + 1)):
+        return min(class_ids) <= mask.min() and mask.max() <= max(class_ids)
+    return np.isin(np.unique(mask), class_ids).all()
+
+
+def _check_strides(row_stride: int, col_stride: int) -> None:
+    """
+    Validate the row and column strides of the fast CSI mode
+    
+    :param row_stride: Row stride, >= 1
+    :param col_stride: Column stride, >= 1
+    """
+    for name, stride in (('row_stride', row_stride), ('col_stride', col_stride)):
+        if not isinstance(stride, (int, np.integer)) or stride < 1:
+            msg = f"Invalid {name}: {stride}. Must be an integer >= 1."
+            logging.error(msg=msg)
+            raise ValueError(msg)
+
+
 def compute_csi(road_mask: np.array,
                 garbage_mask: np.array,
                 trapezoid_mask: np.ndarray,
@@ -267,6 +323,9 @@ def compute_csi(road_mask: np.array,
     4. Computes weighted garbage area for each garbage type (foliage, waste)
     5. Calculates relative CSI using garbage coefficients and percentage_dirty_road
     
+    road_mask and garbage_mask are filtered in place; compute_csi_histogram is the
+    faster kernel that leaves them untouched.
+    
     :param road_mask: Binary mask representing roads (H, W)
     :param garbage_mask: Multiclass segmentation mask for garbage (H, W)
     :param trapezoid_mask: Trapezoid mask to filter the road and garbage
@@ -318,10 +377,9 @@ def compute_csi(road_mask: np.array,
         # Find the minimum and maximum column indices with at least one non-zero value
         x_min, x_max = find_xmin_xmax(src=road_mask)
         
-        # Compute a weighted road mask to adjust garbage weights based on proximity to road center
-        # Higher weights at center, lower weights near sidewalk
-        weight_linspace_matrix = get_weight_matrix_linspace(
-            n_rows=garbage_mask.shape[0],
+        # Column weights to adjust garbage weights based on proximity to road center
+        # Higher weights at center, lower weights near sidewalk (cached per road width)
+        weight_profile = get_weight_profile_linspace(
             n_cols=(x_max + 1) - x_min,
             n_bins=n_bins,
             linsp_start=linsp_start,
@@ -330,9 +388,9 @@ def compute_csi(road_mask: np.array,
     except ValueError:
         return np.nan, np.nan
     
-    # Generate the weighted road mask
+    # Generate the weighted road mask, the profile is broadcast over the rows
     road_mask = road_mask.astype(np.float32)
-    road_mask[:, x_min:x_max + 1] *= weight_linspace_matrix
+    road_mask[:, x_min:x_max + 1] *= weight_profile
     
     # Count non-zero pixels to determine the area of the weighted road polygon
     road_area = np.sum(road_mask)
@@ -372,6 +430,343 @@ def compute_csi(road_mask: np.array,
     return csi_relative, csi_absolute
 
 
+def _road_column_counts(on_road: np.array,
+                        garbage_mask: np.array,
+                        n_labels: int) -> np.array:
+    """
+    Road pixels per garbage label and column, reduced over the rows
+    
+    One pass over the masks: every road pixel becomes 1 << (label * bits), so a single
+    integer sum over the rows holds the count of every label in its own bit field
+    (bits is large enough for the number of rows, the fields never carry over).
+    Falls back to one boolean mask per label when the fields do not fit in 64 bits.
+    
+    :param on_road: Boolean road mask filtered by the trapezoid, (H, W) or stacked (B, H, W)
+    :param garbage_mask: Garbage mask of the same shape, labels below n_labels
+    :param n_labels: Number of garbage labels including background
+    :return: Counts of shape (n_labels, W) or (B, n_labels, W); label 0 is road without garbage
+    """
+    counts = np.empty(shape=on_road.shape[:-2] + (n_labels, on_road.shape[-1]), dtype=np.int64)
+    bits = int(on_road.shape[-2]).bit_length()
+    if n_labels * bits <= 64:
+        packed_type = np.uint32 if n_labels * bits <= 32 else np.uint64
+        shifts = np.multiply(garbage_mask, bits, dtype=np.uint8, casting='unsafe')
+        packed = np.left_shift(on_road, shifts, dtype=packed_type)
+        packed_counts = np.add.reduce(packed, axis=-2, dtype=packed_type)
+        field = packed_type((1 << bits) - 1)
+        for label in range(n_labels):
+            np.bitwise_and(packed_counts >> packed_type(label * bits), field, out=counts[..., label, :],
+                           casting='unsafe')
+        return counts
+    
+    np.add.reduce(on_road, axis=-2, dtype=np.int64, out=counts[..., 0, :])
+    for label in range(1, n_labels):
+        garbage_on_road = np.equal(garbage_mask, label)
+        garbage_on_road &= on_road
+        np.add.reduce(garbage_on_road, axis=-2, dtype=np.int64, out=counts[..., label, :])
+        counts[..., 0, :] -= counts[..., label, :]
+    return counts
+
+
+def _csi_from_column_counts(counts: np.array,
+                            absolute_type: type,
+                            n_bins: int,
+                            linsp_start: float,
+                            linsp_stop: float,
+                            percentage_dirty_road: float,
+                            garbage_type_coeffs: list,
+                            smooth: float,
+                            clip_csi: bool,
+                            row_stride: int = 1,
+                            col_stride: int = 1) -> tuple:
+    """
+    Relative and absolute CSI from the road pixel counts per (garbage label, column)
+    
+    Shared by compute_csi_histogram and compute_csi_batch, so both give the same values.
+    With strides > 1 the counts come from every row_stride-th row and col_stride-th column:
+    the columns are weighted with the full resolution weights of the sampled columns and
+    the absolute CSI is scaled back to full resolution pixels.
+    
+    :param counts: Road pixels per (garbage label, column), shape (n_labels, W); row 0 is road without garbage
+    :param absolute_type: Scalar type of the absolute CSI (the dtype np.sum gives for the garbage mask)
+    :param row_stride: Row stride the counts were sampled with
+    :param col_stride: Column stride the counts were sampled with
+    :return: Tuple of (relative_csi, absolute_csi)
+    """
+    n_labels = counts.shape[0]
+    label_counts = counts.sum(axis=1)
+    
+    # Absolute CSI calculation (sum of garbage labels on the road)
+    csi_absolute = absolute_type(np.dot(label_counts, np.arange(n_labels)) * (row_stride * col_stride))
+    
+    # Find the minimum and maximum column indices with at least one road pixel
+    road_columns = np.flatnonzero(counts.sum(axis=0))
+    if road_columns.size == 0:
+        msg = "Input array contains only zeros; no x_min/x_max can be determined."
+        logging.error(msg=msg)
+        return np.nan, np.nan
+    x_min, x_max = road_columns[0], road_columns[-1]
+    if x_min == x_max:
+        msg = f"Input array contains only one column; x_min == x_max ({x_min} == {x_max})."
+        logging.error(msg=msg)
+        return np.nan, np.nan
+    
+    try:
+        # Column weights, higher at the center of the road (cached per road width)
+        weight_profile = get_weight_profile_linspace(
+            n_cols=(x_max - x_min) * col_stride + 1,
+            n_bins=n_bins,
+            linsp_start=linsp_start,
+            linsp_stop=linsp_stop
+        )[::col_stride]
+    except ValueError:
+        return np.nan, np.nan
+    
+    # Weighted area of every garbage label on the road, exact in float64
+    label_areas = counts[:, x_min:x_max + 1] @ weight_profile.astype(np.float64)
+    
+    # Area of the weighted road polygon
+    road_area = np.float32(label_areas.sum())
+    
+    garbage_areas = [0] * len(garbage_type_coeffs)  # [foliage_area, waste_area]
+    for label in range(1, len(garbage_type_coeffs) + 1):
+        if label_counts[label]:
+            garbage_areas[label - 1] = np.float32(label_areas[label])
+    
+    # Compute the CSI with garbage coefficients, weighted garbage areas,
+    # percentage of dirty road, and weighted road area (as in compute_csi)
+    csi_relative = 0.
+    for i in range(len(garbage_type_coeffs)):
+        # Avoid zero-division errors using smooth
+        csi_relative += garbage_type_coeffs[i] * (
+            garbage_areas[i] / ((percentage_dirty_road * road_area) + smooth)
+        )
+    csi_relative /= max(garbage_type_coeffs)  # Normalize between 0 and 1
+    
+    if clip_csi:
+        csi_relative = np.clip(a=csi_relative, a_min=0., a_max=1.)
+    
+    return csi_relative, csi_absolute
+
+
+def compute_csi_histogram(road_mask: np.array,
+                          garbage_mask: np.array,
+                          trapezoid_mask: np.ndarray,
+                          road_class_ids: list,
+                          garbage_class_ids: list,
+                          n_bins: int,
+                          linsp_start: float,
+                          linsp_stop: float,
+                          percentage_dirty_road: float,
+                          garbage_type_coeffs: list,
+                          smooth: float = 2e-22,
+                          clip_csi: bool = False,
+                          row_stride: int = 1,
+                          col_stride: int = 1) -> tuple:
+    """
+    Compute the Clean Street Index (CSI) like compute_csi, from per-column pixel counts
+    and without modifying the input masks.
+    
+    The kernel builds a column histogram of the road pixels (road filtered by the
+    trapezoid) for every garbage label in one pass over the masks. The road area and
+    all weighted garbage areas are then products of these counts with the cached
+    column weight profile; no float mask is allocated.
+    
+    The absolute CSI is identical to compute_csi. The relative CSI is not bit for bit
+    identical: compute_csi sums the weighted float32 masks with numpy's pairwise float32
+    summation, whose rounding depends on the position of every pixel, and reproducing
+    that order means building and summing the full float32 masks again, i.e. the cost
+    of compute_csi. Here the weighted areas are summed exactly (float64) and rounded to
+    float32 once, in the float32 dtype compute_csi ends with. Both results agree within
+    a relative tolerance of 1e-5 (compute_csi's own float32 summation error on
+    416 x 608 masks is a few 1e-7); the discrete CSI levels are the same unless the
+    relative CSI lies within that tolerance of the midpoint between two levels.
+    
+    Fast mode: with row_stride / col_stride > 1 only every n-th row / column of the
+    masks is read, which divides the work by about row_stride * col_stride (column
+    strides copy the sampled columns once, numpy is slow on strided rows). The result
+    is an estimate of the full resolution CSI; measure its error on recorded masks
+    with tools/calibrate_csi_stride.py. Invalid strides raise ValueError, also with
+    python -O.
+    
+    :param road_mask: Binary mask representing roads (H, W), not modified
+    :param garbage_mask: Multiclass segmentation mask for garbage (H, W), not modified
+    :param trapezoid_mask: Trapezoid mask to filter the road and garbage
+    :param road_class_ids: Valid road mask class IDs [0, 1]
+    :param garbage_class_ids: Valid garbage mask class IDs [0, 1, 2]
+    :param n_bins: Number of bins for the linearly spaced pattern
+    :param linsp_start: Starting value for linear spacing (edge weight)
+    :param linsp_stop: Stopping value for linear spacing (center weight)
+    :param percentage_dirty_road: Threshold percentage to classify road as dirty (e.g., 0.5 = 50%)
+    :param garbage_type_coeffs: Importance weights for [foliage, waste]
+    :param smooth: Smooth parameter to prevent zero division errors
+    :param clip_csi: Flag to enable final CSI clipping in [0, 1]
+    :param row_stride: Read every row_stride-th mask row (1 = full resolution)
+    :param col_stride: Read every col_stride-th mask column (1 = full resolution)
+    :return: Tuple of (relative_csi, absolute_csi)
+    """
+    _check_strides(row_stride=row_stride, col_stride=col_stride)
+    
+    # Check for empty road mask
+    if road_mask is not None:
+        if not road_mask.any():
+            msg = "Mask does not contain road pixels."
+            logging.error(msg=msg)
+            return np.nan, np.nan
+    else:
+        msg = "Mask is None."
+        logging.error(msg=msg)
+        return np.nan, np.nan
+    
+    # Reduced resolution views (full resolution for strides of 1)
+    road_mask = road_mask[::row_stride, ::col_stride]
+    garbage_mask = garbage_mask[::row_stride, ::col_stride]
+    trapezoid_mask = trapezoid_mask[::row_stride, ::col_stride]
+    if col_stride > 1:
+        road_mask, garbage_mask, trapezoid_mask = (
+            np.ascontiguousarray(mask) for mask in (road_mask, garbage_mask, trapezoid_mask))
+    
+    if __debug__:
+        masks = ((road_mask, road_class_ids, 'Road'), (garbage_mask, garbage_class_ids, 'Garbage'))
+        for mask, class_ids, name in masks:
+            if not _mask_values_valid(mask, class_ids):
+                msg = f"{name} mask contains non-valid {name.lower()} pixels: {np.unique(mask)}"
+                logging.error(msg=msg)
+                raise ValueError(msg)
+    
+    n_labels = len(garbage_type_coeffs) + 1  # including background
+    
+    # Filter road outside the trapezoid (new array, the inputs stay untouched)
+    on_road = np.logical_and(road_mask, trapezoid_mask)
+    
+    # Road pixels per (garbage label, column)
+    counts = _road_column_counts(on_road=on_road, garbage_mask=garbage_mask, n_labels=n_labels)
+    
+    # Absolute CSI in the dtype np.sum gives for the garbage mask
+    return _csi_from_column_counts(
+        counts=counts,
+        absolute_type=np.sum(garbage_mask[:0]).dtype.type,
+        n_bins=n_bins,
+        linsp_start=linsp_start,
+        linsp_stop=linsp_stop,
+        percentage_dirty_road=percentage_dirty_road,
+        garbage_type_coeffs=garbage_type_coeffs,
+        smooth=smooth,
+        clip_csi=clip_csi,
+        row_stride=row_stride,
+        col_stride=col_stride
+    )
+
+
+def compute_csi_batch(road_masks: np.array,
+                      garbage_masks: np.array,
+                      trapezoid_masks: np.array,
+                      levels: list,
+                      road_class_ids: list,
+                      garbage_class_ids: list,
+                      n_bins: int,
+                      linsp_start: float,
+                      linsp_stop: float,
+                      percentage_dirty_road: float,
+                      garbage_type_coeffs: list,
+                      smooth: float = 2e-22,
+                      clip_csi: bool = False,
+                      row_stride: int = 1,
+                      col_stride: int = 1) -> tuple:
+    """
+    Compute relative, absolute and discrete CSI for a batch of frames in one call.
+    
+    The masks of all frames (e.g. front and rear from the batch-2 streammux) are stacked
+    to (B, H, W), so the trapezoid filtering and the per-column counting run once over
+    the whole batch. Every frame gives the same values as compute_csi_histogram. This
+    saves Python calls, not work: the cost is per pixel, and the (B, H, W) intermediates
+    fall out of the CPU cache, so it is not faster per frame than compute_csi_histogram
+    (tools/benchmark_csi.py bench); the CSI probe calls compute_csi_histogram per frame.
+    
+    :param road_masks: Road masks (B, H, W), not modified
+    :param garbage_masks: Garbage masks (B, H, W), not modified
+    :param trapezoid_masks: Trapezoid mask per frame (B, H, W), or one (H, W) mask for all frames
+    :param levels: Discrete CSI levels per frame (list of B arrays), or one array for all frames
+    :param road_class_ids: Valid road mask class IDs [0, 1]
+    :param garbage_class_ids: Valid garbage mask class IDs [0, 1, 2]
+    :param n_bins: Number of bins for the linearly spaced pattern
+    :param linsp_start: Starting value for linear spacing (edge weight)
+    :param linsp_stop: Stopping value for linear spacing (center weight)
+    :param percentage_dirty_road: Threshold percentage to classify road as dirty (e.g., 0.5 = 50%)
+    :param garbage_type_coeffs: Importance weights for [foliage, waste]
+    :param smooth: Smooth parameter to prevent zero division errors
+    :param clip_csi: Flag to enable final CSI clipping in [0, 1]
+    :param row_stride: Read every row_stride-th mask row (1 = full resolution, see compute_csi_histogram)
+    :param col_stride: Read every col_stride-th mask column (1 = full resolution)
+    :return: Tuple of arrays of shape (B,): (relative_csi, absolute_csi, discrete_csi, level_index);
+             frames without a CSI have NaN values and level index -1
+    """
+    if __debug__:
+        ndim = 3
+        if road_masks.ndim != ndim or garbage_masks.shape != road_masks.shape:
+            msg = (f"Invalid mask shapes: road {road_masks.shape}, garbage {garbage_masks.shape}. "
+                   f"Must be equal (B, H, W).")
+            logging.error(msg=msg)
+            raise ValueError(msg)
+    _check_strides(row_stride=row_stride, col_stride=col_stride)
+    
+    # Reduced resolution views (full resolution for strides of 1)
+    road_masks = road_masks[..., ::row_stride, ::col_stride]
+    garbage_masks = garbage_masks[..., ::row_stride, ::col_stride]
+    trapezoid_masks = trapezoid_masks[..., ::row_stride, ::col_stride]
+    if col_stride > 1:
+        road_masks, garbage_masks, trapezoid_masks = (
+            np.ascontiguousarray(mask) for mask in (road_masks, garbage_masks, trapezoid_masks))
+    
+    if __debug__:
+        masks = ((road_masks, road_class_ids, 'Road'), (garbage_masks, garbage_class_ids, 'Garbage'))
+        for mask, class_ids, name in masks:
+            if not _mask_values_valid(mask, class_ids):
+                msg = f"{name} mask contains non-valid {name.lower()} pixels: {np.unique(mask)}"
+                logging.error(msg=msg)
+                raise ValueError(msg)
+    
+    n_frames = road_masks.shape[0]
+    n_labels = len(garbage_type_coeffs) + 1  # including background
+    if isinstance(levels, np.ndarray) and levels.ndim == 1:
+        levels = [levels] * n_frames
+    
+    # Filter road outside the trapezoids and count the road pixels of all frames at once
+    on_road = np.logical_and(road_masks, trapezoid_masks)
+    counts = _road_column_counts(on_road=on_road, garbage_mask=garbage_masks, n_labels=n_labels)
+    has_road = road_masks.reshape(n_frames, -1).any(axis=1)
+    absolute_type = np.sum(garbage_masks[:0]).dtype.type
+    
+    relative_csi = np.full(shape=n_frames, fill_value=np.nan)
+    absolute_csi = np.full(shape=n_frames, fill_value=np.nan)
+    discrete_csi = np.full(shape=n_frames, fill_value=np.nan)
+    level_index = np.full(shape=n_frames, fill_value=-1, dtype=np.intp)
+    
+    for i in range(n_frames):
+        if not has_road[i]:
+            msg = "Mask does not contain road pixels."
+            logging.error(msg=msg)
+            continue
+        
+        relative_csi[i], absolute_csi[i] = _csi_from_column_counts(
+            counts=counts[i],
+            absolute_type=absolute_type,
+            n_bins=n_bins,
+            linsp_start=linsp_start,
+            linsp_stop=linsp_stop,
+            percentage_dirty_road=percentage_dirty_road,
+            garbage_type_coeffs=garbage_type_coeffs,
+            smooth=smooth,
+            clip_csi=clip_csi,
+            row_stride=row_stride,
+            col_stride=col_stride
+        )
+        if not np.isnan(relative_csi[i]):
+            discrete_csi[i], level_index[i] = get_discrete_csi(levels=levels[i], continuous_csi=relative_csi[i])
+    
+    return relative_csi, absolute_csi, discrete_csi, level_index
+
+
 def get_discrete_csi(levels: np.array,
                      continuous_csi: float) -> tuple:
     """
@@ -22,6 +22,9 @@ DEFAULT_GARBAGE_TYPE_COEFFS = [0.6, 0.7]  # [foliage_coeff, waste_coeff]
 DEFAULT_SMOOTH = 2.0e-22
 DEFAULT_CLIP_CSI = False
 
+# Column weight profiles cached by road width, at most one per column of the 608 px wide masks
+WEIGHT_PROFILE_CACHE_SIZE = 608
+
 # Discrete CSI levels for front/rear cameras
 # Front: 21 levels (0.0 to 1.0)
 # Rear: 5 levels (0.0 to 1.0)
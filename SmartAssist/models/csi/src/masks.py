@@ -0,0 +1,131 @@
+"""
+Segmentation Mask Access
+Road and garbage masks for the CSI probe without per-frame allocations
+
+pyds.get_segmentation_masks returns the class map of an NvDsInferSegmentationMeta
+as a numpy array. SegmentationMaskReader hands it out in two ways:
+
+view()  - the array from pyds as is, nothing copied. Valid only during the buffer
+          probe call that read it, and must not be modified. For consumers that are
+          done with the mask before the probe returns (the CSI worker pool copies it
+          into its shared memory slots).
+store() - a copy into a buffer preallocated per model and source (pad index),
+          converted to uint8 on the way. The next frame of the same source
+          overwrites the buffer, so it is valid until the next store() for that
+          source. Consumers may modify it (the reference kernel works in place), and
+          must copy whatever they keep beyond the probe call.
+read()  - store(), or a copy for a second frame of the same source in one batch.
+
+The buffers of one model are rows of a single (max_sources, H, W) array, so the
+stored masks of a batch with consecutive pad indices are already a stacked
+(B, H, W) view for compute_csi_batch, without np.stack (stack()). The CSI probe
+computes per frame and only uses read().
+"""
+import numpy as np
+
+try:
+    import pyds
+except ImportError:
+    pyds = None
+
+
+class SegmentationMaskReader:
+    """
+    Reads segmentation masks into reusable per-source buffers
+
+    Buffers are allocated on the first mask of a model and again only when the mask
+    shape changes or a higher pad index shows up.
+    """
+
+    def __init__(self, max_sources=2, dtype=np.uint8, get_masks=None, logger=None):
+        """
+        :param max_sources: Number of sources (pad indices) preallocated per model
+        :param dtype: Buffer dtype, large enough for the class IDs
+        :param get_masks: Function segmeta -> class map array (pyds.get_segmentation_masks if None)
+        :param logger: Logger for buffer allocations (print if None)
+        """
+        if get_masks is None:
+            if pyds is None:
+                raise ImportError('pyds is required to read segmentation masks')
+            get_masks = pyds.get_segmentation_masks
+        self.max_sources = max_sources
+        self.dtype = dtype
+        self.get_masks = get_masks
+        self.logger = logger
+
+        self.buffers = {}  # unique_id -> (n_sources, H, W)
+        self.allocations = 0
+
+    def view(self, segmeta):
+        """
+        Class map of the segmentation meta, not copied
+
+        :param segmeta: NvDsInferSegmentationMeta
+        :return: Mask (H, W) as returned by pyds, valid during the probe call only
+        """
+        return self.get_masks(segmeta)
+
+    def store(self, segmeta, source):
+        """
+        Copy the class map of the segmentation meta into the buffer of its source
+
+        :param segmeta: NvDsInferSegmentationMeta
+        :param source: Source index (NvDsFrameMeta.pad_index)
+        :return: Mask (H, W) in the source buffer, valid until the next store() for the source
+        """
+        mask = self.get_masks(segmeta)
+        buffers = self.buffers.get(segmeta.unique_id)
+        if buffers is None or buffers.shape[1:] != mask.shape or source >= len(buffers):
+            buffers = self._allocate(segmeta.unique_id, mask.shape, source)
+        np.copyto(buffers[source], mask, casting='unsafe')
+        return buffers[source]
+
+    def read(self, segmeta, source, batch_sources):
+        """
+        Mask of a frame for the CSI computed in the probe
+
+        The first frame of a source in the batch is stored in its buffer. A batch with
+        the same source twice gets a copy for the later frame, the buffer still holds
+        the earlier one.
+
+        :param segmeta: NvDsInferSegmentationMeta
+        :param source: Source index (NvDsFrameMeta.pad_index)
+        :param batch_sources: Sources of the frames of the batch read so far
+        :return: Mask (H, W), see store(); a new array if the source is in batch_sources
+        """
+        if source in batch_sources:
+            return np.array(self.get_masks(segmeta), dtype=self.dtype)
+        return self.store(segmeta, source)
+
+    def stack(self, unique_id, sources):
+        """
+        Stored masks of one model for the frames of a batch
+
+        :param unique_id: Model unique ID
+        :param sources: Source index per frame, in batch order
+        :return: Masks (B, H, W); a view into the buffers if the sources are consecutive
+                 and increasing, otherwise a new array
+        """
+        buffers = self.buffers[unique_id]
+        first = sources[0]
+        if all(source == first + i for i, source in enumerate(sources)):
+            return buffers[first:first + len(sources)]
+        return buffers[list(sources)]
+
+    def _allocate(self, unique_id, shape, source):
+        previous = self.buffers.get(unique_id)
+        n_sources = max(self.max_sources, source + 1)
+        buffers = np.zeros(shape=(n_sources,) + tuple(shape), dtype=self.dtype)
+        if previous is not None and previous.shape[1:] == buffers.shape[1:]:
+            # More sources than preallocated: keep the masks stored so far in this batch
+            buffers[:len(previous)] = previous
+        self.buffers[unique_id] = buffers
+        self.allocations += 1
+        self._log(f'Mask buffers for model {unique_id}: {n_sources} x {tuple(shape)} {np.dtype(self.dtype).name}')
+        return buffers
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
@@ -0,0 +1,140 @@
+"""
+CSI Mask Overlay
+Road / garbage mask overlay on the video frames, cheap enough to leave enabled
+
+The overlay is drawn in place on the mapped RGBA surface, only inside the bounding
+box of the trapezoid ROI, and in uint8 throughout:
+- the masks are resized (nearest neighbour) into the box through a cached index map
+- each pixel gets a category (0 untouched, 1 road, 2 garbage on road)
+- every colour channel is blended through a lookup table indexed by
+  category * 256 + value, precomputed from the colours and alphas
+- the ROI outline is a cached list of pixel coordinates
+
+All intermediate arrays are cached per (ROI, frame shape, mask shape), so a frame
+allocates nothing of frame size. Pixels outside the ROI box are not overlaid.
+"""
+import cv2 as cv
+import numpy as np
+
+
+ROAD_COLOR = (0, 255, 0)        # RGB
+GARBAGE_COLOR = (255, 0, 0)
+ROI_COLOR = (255, 0, 0)
+ROI_THICKNESS = 2
+
+
+class _OverlayLayout:
+    """Cached geometry and buffers of one ROI on one frame size"""
+    __slots__ = ('y0', 'y1', 'x0', 'x1', 'mask_index', 'roi_pixels', 'road', 'garbage', 'index', 'channel', 'taken')
+
+    def __init__(self, roi, frame_shape, mask_shape):
+        h_frame, w_frame = frame_shape
+        h_mask, w_mask = mask_shape
+        roi_resized = cv.resize(roi.astype(np.uint8), (w_frame, h_frame), interpolation=cv.INTER_NEAREST)
+
+        ys, xs = np.nonzero(roi_resized)
+        if ys.size:
+            self.y0, self.y1, self.x0, self.x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        else:
+            self.y0, self.y1, self.x0, self.x1 = 0, h_frame, 0, w_frame
+
+        # Nearest neighbour source pixel of every box pixel, as cv.resize INTER_NEAREST picks it
+        rows = np.minimum((np.arange(self.y0, self.y1) * h_mask) // h_frame, h_mask - 1)
+        cols = np.minimum((np.arange(self.x0, self.x1) * w_mask) // w_frame, w_mask - 1)
+        self.mask_index = (rows[:, np.newaxis] * w_mask + cols).astype(np.intp)
+
+        # ROI outline pixels
+        outline = np.zeros_like(roi_resized)
+        contours, _ = cv.findContours(roi_resized, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        cv.drawContours(outline, contours, -1, 1, thickness=ROI_THICKNESS)
+        self.roi_pixels = np.nonzero(outline)
+
+        box_shape = self.mask_index.shape
+        self.road = np.empty(box_shape, dtype=np.uint8)
+        self.garbage = np.empty(box_shape, dtype=np.uint8)
+        self.index = np.empty(box_shape, dtype=np.intp)  # np.take would convert smaller indices
+        self.channel = np.empty(box_shape, dtype=np.uint8)
+        self.taken = {}  # box buffer per mask dtype other than uint8
+
+    def resize_nonzero(self, mask, out):
+        """
+        Write (mask != 0) resized into the box to out (uint8 0 / 1)
+
+        :param mask: Mask of the mask shape
+        :param out: uint8 box buffer
+        """
+        taken = out
+        if mask.dtype != out.dtype:
+            taken = self.taken.get(mask.dtype)
+            if taken is None:
+                taken = self.taken[mask.dtype] = np.empty(out.shape, dtype=mask.dtype)
+        # The indices are in range; mode='raise' would copy into a temporary first
+        np.take(mask, self.mask_index, out=taken, mode='clip')
+        np.not_equal(taken, 0, out=out.view(np.bool_))
+
+
+class MaskOverlay:
+    """
+    uint8 overlay of road and garbage masks inside the ROI box, drawn in place
+
+    Blending matches the float overlay: road pixels v * (1 - road_alpha) + colour * road_alpha,
+    garbage on road blended again with garbage_alpha.
+    """
+
+    def __init__(self, road_alpha=0.2, garbage_alpha=0.5):
+        """
+        :param road_alpha: Opacity of the road colour
+        :param garbage_alpha: Opacity of the garbage colour
+        """
+        self.layouts = {}
+
+        # Lookup table per colour channel: [category * 256 + value]
+        values = np.arange(256, dtype=np.float32)
+        self.luts = []
+        for c in range(3):
+            road = values * (1 - road_alpha) + ROAD_COLOR[c] * road_alpha
+            garbage = road * (1 - garbage_alpha) + GARBAGE_COLOR[c] * garbage_alpha
+            lut = np.concatenate([values, road, garbage])
+            self.luts.append(np.clip(lut, 0, 255).astype(np.uint8))
+
+    def layout(self, roi, frame_shape, mask_shape):
+        """
+        Cached layout of an ROI on a frame size
+
+        :param roi: ROI (trapezoid) mask, any size, non-zero inside
+        :param frame_shape: (height, width) of the frame
+        :param mask_shape: (height, width) of the segmentation masks
+        :return: _OverlayLayout
+        """
+        cache_key = (id(roi), tuple(frame_shape), tuple(mask_shape))
+        layout = self.layouts.get(cache_key)
+        if layout is None:
+            layout = self.layouts[cache_key] = _OverlayLayout(roi, frame_shape, mask_shape)
+        return layout
+
+    def draw(self, frame, road_mask, garbage_mask, roi):
+        """
+        Overlay the masks and the ROI outline on a frame
+
+        :param frame: RGBA frame (H, W, 4) uint8, modified in place (e.g. the pyds surface)
+        :param road_mask: Road mask, non-zero on road
+        :param garbage_mask: Garbage mask of the same shape, non-zero on garbage
+        :param roi: ROI (trapezoid) mask; keep passing the same array, the layout is cached by identity
+        """
+        layout = self.layout(roi, frame.shape[:2], road_mask.shape)
+
+        # Masks resized into the box, categories 0 / 1 road / 2 garbage on road
+        layout.resize_nonzero(road_mask, out=layout.road)
+        layout.resize_nonzero(garbage_mask, out=layout.garbage)
+        np.bitwise_and(layout.garbage, layout.road, out=layout.garbage)
+        np.add(layout.road, layout.garbage, out=layout.road)
+        np.left_shift(layout.road, 8, out=layout.index, dtype=np.intp)
+
+        box = frame[layout.y0:layout.y1, layout.x0:layout.x1]
+        for c in range(3):
+            np.add(layout.index, box[..., c], out=layout.index)
+            np.take(self.luts[c], layout.index, out=layout.channel, mode='clip')
+            np.subtract(layout.index, box[..., c], out=layout.index)
+            box[..., c] = layout.channel
+
+        frame[layout.roi_pixels[0], layout.roi_pixels[1], :3] = ROI_COLOR
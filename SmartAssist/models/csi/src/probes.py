@@ -13,7 +13,6 @@ from pathlib import Path
 from types import SimpleNamespace
 from typing import Any
 
-import cv2 as cv
 import numpy as np
 import yaml
 import gi
@@ -31,9 +30,16 @@ except ImportError:
 from .computation import (
     create_filtering_masks,
     get_discrete_csi,
-    compute_csi as np_compute_csi
+    compute_csi as np_compute_csi,
+    compute_csi_histogram,
+    _check_strides
 )
 from .constants import ROAD_UNIQUE_ID, GARBAGE_UNIQUE_ID
+from .worker import CsiWorkerPool
+from .aggregation import DistanceAggregator, VehicleSpeedReader
+from .rate import CsiRateController
+from .masks import SegmentationMaskReader
+from .overlay import MaskOverlay
 
 # Get paths using smart path detection
 from pipeline.utils.paths import CSI_ROOT
@@ -61,18 +67,256 @@ garbage_type_coeffs = csi_config.garbage_type_coefficients  # [0.6, 0.7]
 smooth = csi_config.smooth  # 2.0e-22
 clip_csi = csi_config.clip_csi  # False
 
+def calculation_setting(name: str, default: Any) -> Any:
+    """
+    CSI calculation setting, flat key (csi_<name>) or csi_computation.calculation.<name>
+    
+    :param name: Setting name
+    :param default: Value when the setting is in neither place
+    :return: Setting value
+    """
+    value = getattr(csi_config, f"csi_{name}", None)
+    if value is None:
+        value = (getattr(csi_config, "csi_computation", None) or {}).get("calculation", {}).get(name)
+    return default if value is None else value
+
+
+# CSI kernel: 'histogram' (per-column counts, inputs untouched) or 'reference' (original compute_csi)
+csi_kernels = {"histogram": compute_csi_histogram, "reference": np_compute_csi}
+csi_kernel = calculation_setting("kernel", "histogram")
+compute_csi_kernel = csi_kernels[csi_kernel]
+
+# Fast CSI mode: read every n-th mask row / column (1 = full resolution, histogram kernel only)
+row_stride = int(calculation_setting("row_stride", 1))
+col_stride = int(calculation_setting("col_stride", 1))
+_check_strides(row_stride=row_stride, col_stride=col_stride)  # at startup, not on the first frame
+if csi_kernel != "histogram" and (row_stride > 1 or col_stride > 1):
+    logging.warning(f"CSI strides {row_stride}x{col_stride} are ignored by the '{csi_kernel}' kernel")
+
 # Discrete CSI levels - VERIFIED
 disc_levels = {
     "front": np.linspace(start=0.0, stop=1.0, num=21),
     "rear": np.linspace(start=0.0, stop=1.0, num=5)
 }
 
+# Mask overlay for debugging (visualization.mask_overlay, or the legacy debug flag),
+# on every interval-th frame of each camera
+overlay_settings = {
+    "enabled": bool(getattr(csi_config, "debug", False)),
+    "interval": 1,
+    "road_alpha": 0.2,
+    "garbage_alpha": 0.5,
+}
+overlay_settings.update((getattr(csi_config, "visualization", None) or {}).get("mask_overlay") or {})
+overlay_interval = max(int(overlay_settings["interval"]), 1)
+mask_overlay = MaskOverlay(road_alpha=overlay_settings["road_alpha"], garbage_alpha=overlay_settings["garbage_alpha"])
+
+# Reusable front / rear mask buffers (see masks.py for the lifetime of the masks)
+mask_reader = SegmentationMaskReader(max_sources=2, logger=logging.getLogger(__name__)) if pyds else None
+
+
+def create_csi_worker_pool(logger=None):
+    """
+    Create and start the CSI worker pool configured in csi_computation.worker
+    
+    :param logger: Logger for pool statistics and errors
+    :return: Started CsiWorkerPool, or None when disabled (CSI is computed in the probe)
+    """
+    settings = {
+        "enabled": False,
+        "processes": 2,
+        "slots": 4,
+        "max_lag_frames": 5,
+        "stats_interval": 60.0,
+    }
+    settings.update((getattr(csi_config, "csi_computation", None) or {}).get("worker") or {})
+    if not settings["enabled"]:
+        return None
+    if csi_kernel != "histogram":
+        logging.warning(f"CSI worker pool needs the 'histogram' kernel, computing CSI in the probe ('{csi_kernel}')")
+        return None
+    
+    pool = CsiWorkerPool(
+        trapezoid_masks=trapezoid_masks,
+        levels=disc_levels,
+        csi_args=dict(
+            road_class_ids=road_class_ids,
+            garbage_class_ids=garbage_class_ids,
+            n_bins=n_bins,
+            linsp_start=linsp_start,
+            linsp_stop=linsp_stop,
+            percentage_dirty_road=percentage_dirty_road,
+            garbage_type_coeffs=garbage_type_coeffs,
+            smooth=smooth,
+            clip_csi=clip_csi,
+            row_stride=row_stride,
+            col_stride=col_stride
+        ),
+        processes=settings["processes"],
+        n_slots=settings["slots"],
+        max_lag_frames=settings["max_lag_frames"],
+        stats_interval=settings["stats_interval"],
+        logger=logger
+    )
+    pool.start()
+    return pool
+
+
+def computation_settings(section: str, defaults: dict) -> dict:
+    """
+    Settings of a csi_computation section, completed with defaults
+    
+    :param section: Section name in csi_computation
+    :param defaults: Default values
+    :return: Dictionary of settings
+    """
+    settings = dict(defaults)
+    settings.update((getattr(csi_config, "csi_computation", None) or {}).get(section) or {})
+    return settings
+
+
+def create_vehicle_speed_reader(app_context):
+    """
+    Create the vehicle speed reader configured in csi_computation.vehicle_speed (not started)
+    
+    :param app_context: Application context holding 'can_client'
+    :return: VehicleSpeedReader
+    """
+    settings = computation_settings("vehicle_speed", {
+        "signal": "VehicleSpeed",
+        "unit": "kmh",
+        "poll_interval": 1.0,
+        "max_age": 3.0,
+    })
+    return VehicleSpeedReader(
+        app_context,
+        signal=settings["signal"],
+        unit=settings["unit"],
+        interval=settings["poll_interval"],
+        max_age=settings["max_age"]
+    )
+
+
+def create_csi_aggregation(app_context, speed_reader):
+    """
+    Create the distance aggregation configured in csi_computation.smoothing
+    
+    :param app_context: Application context holding 'can_client'
+    :param speed_reader: VehicleSpeedReader
+    :return: SimpleNamespace(speed_reader, aggregators, app_context), or None when disabled
+    """
+    settings = computation_settings("smoothing", {
+        "enabled": False,
+        "distance": 10.0,
+        "alpha": None,
+        "max_gap": 1.0,
+    })
+    if not settings["enabled"]:
+        return None
+    
+    aggregators = {
+        key: DistanceAggregator(key, distance=settings["distance"], alpha=settings["alpha"] or None,
+                                max_gap=settings["max_gap"])
+        for key in trapezoid_masks
+    }
+    return SimpleNamespace(speed_reader=speed_reader, aggregators=aggregators, app_context=app_context)
+
+
+def create_csi_rate_controller(speed_reader, set_inference_interval=None, logger=None):
+    """
+    Create the CSI rate controller configured in csi_computation.rate_control
+    
+    :param speed_reader: VehicleSpeedReader
+    :param set_inference_interval: Sets the road nvinfer interval, used with rate_control.skip_inference
+    :param logger: Logger for rate changes
+    :return: CsiRateController, or None when disabled
+    """
+    settings = computation_settings("rate_control", {
+        "enabled": False,
+        "skip_inference": False,
+        "idle_interval": 10,
+        "min_speed_kmh": 2.0,
+        "change_threshold": 0.02,
+        "stable_evaluations": 3,
+        "sample_step": 8,
+    })
+    if not settings["enabled"]:
+        return None
+    return CsiRateController(
+        speed_reader=speed_reader,
+        idle_interval=settings["idle_interval"],
+        min_speed_kmh=settings["min_speed_kmh"],
+        change_threshold=settings["change_threshold"],
+        stable_evaluations=settings["stable_evaluations"],
+        sample_step=settings["sample_step"],
+        set_inference_interval=set_inference_interval if settings["skip_inference"] else None,
+        logger=logger
+    )
+
+
+def publish_csi_record(record, app_context) -> None:
+    """
+    Log one distance CSI record and send it to the CAN server (front_csi / rear_csi)
+    
+    :param record: CsiRecord
+    :param app_context: Application context holding 'can_client'
+    """
+    ema = "" if record.ema_csi is None else f", EMA:{record.ema_csi:.3f}"
+    logging.info(
+        f"[CSI] {record.key} {record.distance:.1f} m ({record.samples} frames), "
+        f"CSI mean:{record.mean_csi:.3f}, max:{record.max_csi:.3f}{ema}"
+    )
+    can_client = app_context.get_value("can_client")
+    if can_client and can_client.connected:
+        try:
+            can_client.send_data(key=f"{record.key}_csi", value=record._asdict())
+        except Exception as e:
+            logging.error(f"Failed to send CSI record: {e}")
+
+
+def compute_frames_csi(keys: list, road_masks: list, garbage_masks: list) -> list:
+    """
+    Compute CSI for all frames of a batch, one kernel call per frame
+    
+    The frames are not stacked for compute_csi_batch: the kernel cost is per pixel, so
+    stacking front and rear saves no work, and the (B, H, W) intermediates no longer fit
+    the CPU cache. tools/benchmark_csi.py bench measures the batched call slower per
+    frame than compute_csi_histogram, even on masks that are already stacked.
+    
+    :param keys: Camera key ("front" or "rear") per frame
+    :param road_masks: Road mask per frame
+    :param garbage_masks: Garbage mask per frame
+    :return: List of (relative_csi, absolute_csi, discrete_csi) per frame
+    """
+    stride_args = dict(row_stride=row_stride, col_stride=col_stride) if csi_kernel == "histogram" else {}
+    results = []
+    for key, road_mask, garbage_mask in zip(keys, road_masks, garbage_masks):
+        relative_csi, absolute_csi = compute_csi_kernel(
+            road_mask=road_mask,
+            garbage_mask=garbage_mask,
+            trapezoid_mask=trapezoid_masks[key],
+            road_class_ids=road_class_ids,
+            garbage_class_ids=garbage_class_ids,
+            n_bins=n_bins,
+            linsp_start=linsp_start,
+            linsp_stop=linsp_stop,
+            percentage_dirty_road=percentage_dirty_road,
+            garbage_type_coeffs=garbage_type_coeffs,
+            smooth=smooth,
+            clip_csi=clip_csi,
+            **stride_args
+        )
+        discrete_csi, _ = get_discrete_csi(levels=disc_levels[key], continuous_csi=relative_csi)
+        results.append((relative_csi, absolute_csi, discrete_csi))
+    return results
+
 
 def display_masks(road_mask, garbage_mask, roi, gst_buffer, batch_id, frame_meta=None):
     """
     Overlay segmentation masks on video frames for visualization
     
-    VERIFIED against original display_masks function
+    Drawn in place on the RGBA surface by mask_overlay (see overlay.py): road green,
+    garbage on road red and the ROI outline blue, inside the ROI bounding box only.
     
     :param road_mask: Road segmentation mask
     :param garbage_mask: Garbage segmentation mask
@@ -81,72 +325,12 @@ def display_masks(road_mask, garbage_mask, roi, gst_buffer, batch_id, frame_meta
     :param batch_id: Batch ID
     :param frame_meta: Frame metadata (optional)
     """
-    if not pyds:
+    if not pyds or road_mask is None or garbage_mask is None:
         return
     
     try:
-        if road_mask is not None or garbage_mask is not None:
-            n_frame = pyds.get_nvds_buf_surface(hash(gst_buffer), batch_id)
-            frame_array = np.array(n_frame, copy=True, order="C").astype(np.float32)
-            
-            h_frame, w_frame = frame_array.shape[0], frame_array.shape[1]
-            num_channels = frame_array.shape[2]
-            
-            # Overlay road mask (green) - VERIFIED alpha=0.2
-            if road_mask is not None:
-                road_mask_resized = cv.resize(
-                    road_mask.astype(np.uint8), 
-                    (w_frame, h_frame), 
-                    interpolation=cv.INTER_NEAREST
-                )
-                
-                road_color = np.zeros((h_frame, w_frame, num_channels), dtype=np.float32)
-                road_color[:, :, 1] = 255  # Green
-                alpha = 0.2
-                road_mask_bool = (road_mask_resized > 0)[:, :, np.newaxis]
-                frame_array = np.where(
-                    road_mask_bool, 
-                    frame_array * (1 - alpha) + road_color * alpha, 
-                    frame_array
-                )
-            
-            # Overlay garbage mask (red) - VERIFIED alpha=0.5
-            if garbage_mask is not None:
-                garbage_mask_resized = cv.resize(
-                    garbage_mask.astype(np.uint8), 
-                    (w_frame, h_frame), 
-                    interpolation=cv.INTER_NEAREST
-                )
-                
-                # Only show garbage on road
-                if road_mask is not None:
-                    road_area_mask = road_mask_resized > 0
-                    garbage_mask_resized[~road_area_mask] = 0
-                
-                garbage_color = np.zeros((h_frame, w_frame, num_channels), dtype=np.float32)
-                garbage_color[:, :, 0] = 255  # Red
-                alpha = 0.5
-                garbage_mask_bool = (garbage_mask_resized > 0)[:, :, np.newaxis]
-                frame_array = np.where(
-                    garbage_mask_bool, 
-                    frame_array * (1 - alpha) + garbage_color * alpha, 
-                    frame_array
-                )
-            
-            frame_array = np.clip(frame_array, 0, 255).astype(np.uint8)
-            
-            # Draw ROI contours (blue) - VERIFIED thickness=2
-            if roi is not None:
-                roi_resized = cv.resize(
-                    roi.astype(np.uint8), 
-                    (w_frame, h_frame), 
-                    interpolation=cv.INTER_NEAREST
-                )
-                contours, _ = cv.findContours(roi_resized, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-                cv.drawContours(frame_array, contours, -1, (255, 0, 0), thickness=2)
-            
-            # Update frame buffer
-            n_frame[:] = frame_array
+        n_frame = pyds.get_nvds_buf_surface(hash(gst_buffer), batch_id)
+        mask_overlay.draw(frame=n_frame, road_mask=road_mask, garbage_mask=garbage_mask, roi=roi)
     except Exception as e:
         print(f"Error during mask overlay: {e}")
 
@@ -159,14 +343,30 @@ def compute_csi_buffer_probe(pad: Gst.Pad,
     
     This probe is attached to the CSI bin output and:
     1. Extracts road and garbage segmentation masks from DeepStream metadata
-    2. Computes CSI using the masks and trapezoid ROI
+    2. Computes CSI using the masks and trapezoid ROI, for all frames of the batch at once
     3. Adds CSI values to custom NvDsUserMeta for downstream use
     
+    With a CsiWorkerPool in u_data.worker_pool, step 2 only copies the masks into the
+    pool's shared memory slots; results of earlier frames are attached in step 3, with
+    structId set to the frame number they were computed for.
+    
+    The masks are read with mask_reader: views of the pyds arrays for the worker pool,
+    otherwise copies into the front / rear buffers, so no mask memory is allocated
+    per frame. Neither may be kept beyond this call.
+    
+    With u_data.aggregation, CSI values are logged as one record per road distance
+    (see aggregation.py) and the per-frame log lines become debug messages.
+    With u_data.rate_controller, batches it skips pass on untouched (no masks are read,
+    no CSI is computed; worker pool results still go to their frames), and the masks
+    of every processed frame update its change metric. When it sets the road nvinfer
+    interval instead, the batches the road segmentation skipped have no road mask and
+    get no CSI the same way.
+    
     VERIFIED: Exact functionality from pipeline/csi/utils/probes/probe_functions.py
     
     :param pad: GStreamer pad
     :param info: Probe info containing buffer
-    :param u_data: User data (unused in this version)
+    :param u_data: SimpleNamespace(worker_pool, aggregation, rate_controller), any may be None
     :return: Gst.PadProbeReturn.OK
     """
     if not pyds:
@@ -186,9 +386,18 @@ def compute_csi_buffer_probe(pad: Gst.Pad,
     if not batch_meta:
         return Gst.PadProbeReturn.OK
     
+    csi_pool = getattr(u_data, "worker_pool", None)
+    aggregation = getattr(u_data, "aggregation", None)
+    rate_controller = getattr(u_data, "rate_controller", None)
+    speed = aggregation.speed_reader.get() if aggregation is not None else None
+    # Adaptive CSI rate: the buffer of a skipped batch still goes on to the output video
+    process = rate_controller is None or rate_controller.should_process()
+    
     pyds.nvds_acquire_meta_lock(batch_meta)
     
-    # Process each frame in batch
+    # Collect the masks of each frame in batch
+    frames, keys, sources, road_masks, garbage_masks = [], [], [], [], []
+    batch_frames = []
     l_frame = batch_meta.frame_meta_list
     while l_frame is not None:
         try:
@@ -199,9 +408,10 @@ def compute_csi_buffer_probe(pad: Gst.Pad,
         road_mask, garbage_mask = None, None
         key = "front" if frame_meta.pad_index == 0 else "rear"
         batch_id = frame_meta.batch_id
+        batch_frames.append((frame_meta, key))
         
-        # Retrieve segmentation masks from user metadata
-        l_user = frame_meta.frame_user_meta_list
+        # Retrieve segmentation masks from user metadata (not for skipped batches)
+        l_user = frame_meta.frame_user_meta_list if process else None
         while l_user is not None:
             try:
                 seg_user_meta = pyds.NvDsUserMeta.cast(l_user.data)
@@ -214,81 +424,99 @@ def compute_csi_buffer_probe(pad: Gst.Pad,
                 except StopIteration:
                     break
                 
-                # Extract mask array
-                mask = pyds.get_segmentation_masks(segmeta)
-                mask = np.array(object=mask, copy=True, order="C")
+                # Extract mask array (the pool copies it into its own slot)
+                if csi_pool is not None:
+                    mask = mask_reader.view(segmeta)
+                else:
+                    # Copied for a second frame of the source in this batch
+                    mask = mask_reader.read(segmeta, frame_meta.pad_index, sources)
                 
                 # Identify road or garbage mask by unique_id - VERIFIED VALUES
                 if segmeta.unique_id == ROAD_UNIQUE_ID:  # 2
                     road_mask = mask
                 elif segmeta.unique_id == GARBAGE_UNIQUE_ID:  # 3
                     garbage_mask = mask
-                
-                # Display masks for debugging (only if debug enabled in config)
-                if hasattr(csi_config, 'debug') and csi_config.debug:
-                    display_masks(road_mask, garbage_mask, trapezoid_masks[key], gst_buffer, batch_id)
             
             try:
                 l_user = l_user.next
             except StopIteration:
                 break
         
-        # Compute CSI if both masks available
         if road_mask is not None and garbage_mask is not None:
-            start_time = time.perf_counter()
-            
-            relative_csi, absolute_csi = np_compute_csi(
-                road_mask=road_mask,
-                garbage_mask=garbage_mask,
-                trapezoid_mask=trapezoid_masks[key],
-                road_class_ids=road_class_ids,
-                garbage_class_ids=garbage_class_ids,
-                n_bins=n_bins,
-                linsp_start=linsp_start,
-                linsp_stop=linsp_stop,
-                percentage_dirty_road=percentage_dirty_road,
-                garbage_type_coeffs=garbage_type_coeffs,
-                smooth=smooth,
-                clip_csi=clip_csi
-            )
-            
-            discrete_csi, _ = get_discrete_csi(
-                levels=disc_levels[key], 
-                continuous_csi=relative_csi
-            )
-            
-            end_time = time.perf_counter()
-            csi_computation_times.append(end_time - start_time)
-            
-            # Add CSI to custom NvDsUserMeta
-            user_meta = pyds.nvds_acquire_user_meta_from_pool(batch_meta)
-            
-            if user_meta:
-                dt = datetime.fromtimestamp(frame_meta.ntp_timestamp / 1e9).strftime("%Y-%m-%d %H:%M:%S.%f")
-                logging.info(
-                    f"[CSI] Stream:{frame_meta.pad_index} ({key}), "
-                    f"Frame:{frame_meta.frame_num}, "
-                    f"CSI:{relative_csi:.3f}"
-                )
-                
-                # Allocate and populate CSI struct
-                data = pyds.alloc_csi_struct(user_meta)
-                data.structId = frame_meta.frame_num
-                data.relativeCsi = relative_csi
-                data.absoluteCsi = absolute_csi
-                data.discreteCsi = discrete_csi
-                
-                user_meta.user_meta_data = data
-                user_meta.base_meta.meta_type = pyds.NvDsMetaType.NVDS_CSI_META
-                pyds.nvds_add_user_meta_to_frame(frame_meta, user_meta)
-            else:
-                logging.error("Failed to acquire user meta for CSI")
+            # Display masks for debugging (before the reference kernel modifies them)
+            if overlay_settings["enabled"] and frame_meta.frame_num % overlay_interval == 0:
+                display_masks(road_mask, garbage_mask, trapezoid_masks[key], gst_buffer, batch_id)
+            if rate_controller is not None:
+                rate_controller.observe_masks(key, road_mask, garbage_mask)
+            frames.append(frame_meta)
+            keys.append(key)
+            sources.append(frame_meta.pad_index)
+            road_masks.append(road_mask)
+            garbage_masks.append(garbage_mask)
         
         try:
             l_frame = l_frame.next
         except StopIteration:
             break
     
+    if rate_controller is not None and rate_controller.set_inference_interval is not None:
+        rate_controller.observe_batch(bool(frames))
+    
+    # Compute CSI for all frames with both masks
+    csi_values = []
+    if csi_pool is not None:
+        start_time = time.perf_counter()
+        for frame_meta, key, road_mask, garbage_mask in zip(frames, keys, road_masks, garbage_masks):
+            csi_pool.submit(frame_number=frame_meta.frame_num, key=key, road_mask=road_mask, garbage_mask=garbage_mask)
+        
+        # Results of earlier frames go to the frames of this batch
+        ready = csi_pool.collect({key: frame_meta.frame_num for frame_meta, key in batch_frames})
+        for frame_meta, key in batch_frames:
+            for result in ready.pop(key, []):
+                csi_values.append((frame_meta, key, result.frame_number,
+                                   (result.relative_csi, result.absolute_csi, result.discrete_csi)))
+        end_time = time.perf_counter()
+        csi_computation_times.append(end_time - start_time)
+    elif frames:
+        start_time = time.perf_counter()
+        values = compute_frames_csi(keys=keys, road_masks=road_masks, garbage_masks=garbage_masks)
+        csi_values = [(frame_meta, key, frame_meta.frame_num, value)
+                      for frame_meta, key, value in zip(frames, keys, values)]
+        end_time = time.perf_counter()
+        csi_computation_times.append(end_time - start_time)
+    
+    # Add CSI to custom NvDsUserMeta
+    for frame_meta, key, csi_frame_num, (relative_csi, absolute_csi, discrete_csi) in csi_values:
+        user_meta = pyds.nvds_acquire_user_meta_from_pool(batch_meta)
+        
+        if user_meta:
+            dt = datetime.fromtimestamp(frame_meta.ntp_timestamp / 1e9).strftime("%Y-%m-%d %H:%M:%S.%f")
+            logging.log(
+                logging.INFO if aggregation is None else logging.DEBUG,
+                f"[CSI] Stream:{frame_meta.pad_index} ({key}), "
+                f"Frame:{csi_frame_num}, "
+                f"CSI:{relative_csi:.3f}"
+            )
+            
+            # Allocate and populate CSI struct
+            data = pyds.alloc_csi_struct(user_meta)
+            data.structId = csi_frame_num
+            data.relativeCsi = relative_csi
+            data.absoluteCsi = absolute_csi
+            data.discreteCsi = discrete_csi
+            
+            user_meta.user_meta_data = data
+            user_meta.base_meta.meta_type = pyds.NvDsMetaType.NVDS_CSI_META
+            pyds.nvds_add_user_meta_to_frame(frame_meta, user_meta)
+        else:
+            logging.error("Failed to acquire user meta for CSI")
+        
+        # One record per road distance
+        if aggregation is not None:
+            record = aggregation.aggregators[key].update(relative_csi, absolute_csi, speed)
+            if record is not None:
+                publish_csi_record(record, aggregation.app_context)
+    
     pyds.nvds_release_meta_lock(batch_meta)
     
     # Log performance metrics
@@ -298,7 +526,7 @@ def compute_csi_buffer_probe(pad: Gst.Pad,
         mean_csi_time = np.mean(csi_computation_times) * 1000
         logging.debug(
             f"CSI Probe Latency: {total_latency:.2f}ms, "
-            f"Mean CSI Computation: {mean_csi_time:.2f}ms"
+            f"Batch CSI Computation: {mean_csi_time:.2f}ms ({len(frames)} frames)"
         )
     
     return Gst.PadProbeReturn.OK
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+CSI Rate Control
+Lowers the road segmentation and CSI rate while the vehicle stands still
+
+Most of a shift is spent parked or waiting, when every CSI batch repeats the
+previous one. The CsiRateController switches between two rates:
+- full rate while the vehicle moves (speed >= min_speed) or the masks changed
+- every idle_interval-th batch while it stands still, or, without a speed value,
+  once the masks stayed unchanged for stable_evaluations evaluated batches
+
+The change metric compares the road and garbage masks with the previous evaluated
+ones on a grid of every sample_step-th pixel (the fraction of differing samples).
+The CSI probe calls should_process() for every batch, so motion restores the full
+rate on the next batch.
+
+With set_inference_interval (rate_control.skip_inference) the idle rate is applied
+by the road nvinfer: its interval property is set to idle_interval - 1, the skipped
+batches carry no road mask and the CSI probe only evaluates the batches that have
+both masks. The garbage nvinfer keeps running on every batch: the leaky queues in
+front of it drop batches, so its batch counter drifts from the road nvinfer's and
+the two would skip different batches. Without it the segmentation runs on every
+batch and should_process() skips only the mask reads and the CSI computation of
+the idle batches; their buffers go on to the front / rear output video untouched.
+"""
+import threading
+import time
+
+import numpy as np
+
+KMH_TO_MS = 1 / 3.6
+
+
+class CsiRateController:
+    """
+    Full or idle CSI rate from vehicle speed and mask changes
+
+    The state is guarded by a lock: should_process(), observe_batch() and observe_masks()
+    are called from the CSI probe's streaming thread, stats() from the main loop.
+    """
+
+    def __init__(self, speed_reader=None, idle_interval=10, min_speed_kmh=2.0, change_threshold=0.02,
+                 stable_evaluations=3, sample_step=8, set_inference_interval=None, logger=None):
+        """
+        :param speed_reader: VehicleSpeedReader, or None to decide from mask changes only
+        :param idle_interval: Batches per evaluated batch while idle (1 disables the idle rate)
+        :param min_speed_kmh: Speed from which the vehicle counts as moving
+        :param change_threshold: Fraction of changed mask samples that counts as a scene change
+        :param stable_evaluations: Unchanged evaluations before idling without a speed value
+        :param sample_step: Pixel step of the mask change grid
+        :param set_inference_interval: Callable setting the number of batches the road segmentation
+                                       skips between inferred ones (nvinfer interval), None to skip
+                                       in the CSI probe only
+        :param logger: Logger for rate changes (print if None)
+        """
+        if idle_interval < 1:
+            raise ValueError(f'idle_interval must be >= 1: {idle_interval}')
+        self.speed_reader = speed_reader
+        self.idle_interval = idle_interval
+        self.min_speed = min_speed_kmh * KMH_TO_MS
+        self.change_threshold = change_threshold
+        self.stable_evaluations = stable_evaluations
+        self.sample_step = sample_step
+        self.set_inference_interval = set_inference_interval
+        self.logger = logger
+        self.lock = threading.Lock()
+
+        self.previous = {}
+        self.stable = 0
+        self.changed = False
+        self.idle = False
+        self.skipped = 0
+
+        # Metrics
+        self.batches_passed = 0
+        self.batches_skipped = 0
+        self.idle_since = None
+        self.idle_time = 0.0
+
+    def observe_masks(self, key, road_mask, garbage_mask):
+        """
+        Update the change metric with the masks of an evaluated frame (CSI probe)
+
+        :param key: Camera key ('front' or 'rear')
+        :param road_mask: Road mask (H, W)
+        :param garbage_mask: Garbage mask (H, W)
+        :return: Fraction of mask samples that differ from the previous evaluation of the camera
+        """
+        step = self.sample_step
+        road = road_mask[::step, ::step]
+        garbage = garbage_mask[::step, ::step]
+        with self.lock:
+            previous = self.previous.get(key)
+            change = 1.0
+            if previous is not None and previous[0].shape == road.shape:
+                differs = np.not_equal(road, previous[0])
+                differs |= np.not_equal(garbage, previous[1])
+                change = np.count_nonzero(differs) / differs.size
+            self.previous[key] = (road.copy(), garbage.copy())
+
+            self.changed = change >= self.change_threshold
+            self.stable = 0 if self.changed else self.stable + 1
+        return change
+
+    def should_process(self):
+        """
+        Decide for the current batch, called by the CSI probe for every batch
+
+        :return: True if the masks of the batch are read and CSI is computed (always True
+                 when the segmentation skips the batches, see observe_batch())
+        """
+        speed = self.speed_reader.get() if self.speed_reader is not None else None
+        moving = speed is not None and speed >= self.min_speed
+        with self.lock:
+            stable = speed is not None or self.stable >= self.stable_evaluations
+            self._set_idle(not moving and not self.changed and stable)
+
+            if self.set_inference_interval is not None:
+                return True
+            if self.idle:
+                self.skipped += 1
+                if self.skipped < self.idle_interval:
+                    self.batches_skipped += 1
+                    return False
+            self.skipped = 0
+            self.batches_passed += 1
+            return True
+
+    def observe_batch(self, evaluated):
+        """
+        Count a batch when the segmentation skips the batches (CSI probe)
+
+        :param evaluated: True if a frame of the batch had its masks
+        """
+        with self.lock:
+            if evaluated:
+                self.batches_passed += 1
+            else:
+                self.batches_skipped += 1
+
+    def _set_idle(self, idle):
+        if idle == self.idle:
+            return
+        self.idle = idle
+        now = time.monotonic()
+        if idle:
+            self.idle_since = now
+            # The first idle batch is evaluated, then every idle_interval-th batch
+            self.skipped = self.idle_interval - 1
+            self._log(f'CSI rate: idle, 1 of {self.idle_interval} batches')
+        else:
+            self.idle_time += now - self.idle_since
+            self._log('CSI rate: full')
+        if self.set_inference_interval is not None:
+            self.set_inference_interval(self.idle_interval - 1 if idle else 0)
+
+    def stats(self):
+        """
+        Rate control metrics
+
+        :return: Dictionary with passed / skipped batches and seconds spent idle
+        """
+        with self.lock:
+            idle_time = self.idle_time
+            if self.idle:
+                idle_time += time.monotonic() - self.idle_since
+            return {
+                'passed': self.batches_passed,
+                'skipped': self.batches_skipped,
+                'idle_seconds': idle_time,
+            }
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
@@ -0,0 +1,285 @@
+"""
+CSI Worker Pool
+Computes CSI in worker processes so CSI CPU time is not pipeline latency
+
+The buffer probe only copies the road and garbage masks of a frame into a free slot
+of a preallocated shared memory block and posts the slot number. Worker processes
+compute CSI and discretisation from the slot (several cores, no GIL) and post the
+result back. The probe attaches every result to a later frame of the same camera,
+with structId set to the frame number the CSI was computed for.
+
+Bounded lag:
+- at most n_slots frames are in flight; when no slot is free the frame gets no CSI
+- a result more than max_lag_frames behind the frame it would be attached to is dropped
+"""
+import multiprocessing
+import queue
+import signal
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .computation import compute_csi_histogram, get_discrete_csi
+
+
+# CSI of one frame, as computed by a worker
+CsiResult = namedtuple('CsiResult', [
+    'slot',           # mask slot the frame was computed from
+    'frame_number',   # NvDsFrameMeta.frame_num of the computed frame
+    'key',            # 'front' or 'rear'
+    'relative_csi',
+    'absolute_csi',
+    'discrete_csi',
+    'posted_at',      # time.monotonic() when the probe posted the frame
+    'compute_time',   # seconds spent in the worker
+    'error',          # error message, None on success
+])
+
+
+def _worker_main(shm_name, slot_shape, tasks, results, trapezoid_masks, levels, csi_args):
+    """
+    Worker process loop: compute CSI for every posted slot until None is received
+
+    :param shm_name: Name of the shared memory block with the mask slots
+    :param slot_shape: Shape of the slots (n_slots, 2, H, W), road mask at 0 and garbage mask at 1
+    :param tasks: Queue of (slot, frame_number, key, posted_at) tuples
+    :param results: Queue receiving CsiResult
+    :param trapezoid_masks: Trapezoid mask per key
+    :param levels: Discrete CSI levels per key
+    :param csi_args: Keyword arguments of compute_csi_histogram
+    """
+    # Ctrl+C reaches the whole process group; the pipeline stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = np.ndarray(shape=slot_shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, frame_number, key, posted_at = task
+            started = time.monotonic()
+            relative_csi, absolute_csi, discrete_csi, error = np.nan, np.nan, np.nan, None
+            try:
+                relative_csi, absolute_csi = compute_csi_histogram(
+                    road_mask=slots[slot, 0],
+                    garbage_mask=slots[slot, 1],
+                    trapezoid_mask=trapezoid_masks[key],
+                    **csi_args
+                )
+                if not np.isnan(relative_csi):
+                    discrete_csi, _ = get_discrete_csi(levels=levels[key], continuous_csi=relative_csi)
+            except Exception as e:
+                error = str(e)
+            results.put(CsiResult(slot, frame_number, key, float(relative_csi), float(absolute_csi),
+                                  float(discrete_csi), posted_at, time.monotonic() - started, error))
+    finally:
+        del slots
+        shm.close()
+
+
+class CsiWorkerPool:
+    """
+    Worker processes computing CSI from shared memory mask slots
+
+    submit() and collect() are called from the streaming thread only. The workers
+    are spawned, not forked: by the time the pool starts the process holds GStreamer,
+    CUDA and threads, which a forked child would inherit in whatever state they are.
+    Each worker maps the slots by the shared memory name; masks are stored as uint8
+    class IDs.
+    """
+
+    def __init__(self, trapezoid_masks, levels, csi_args, processes=2, n_slots=4,
+                 max_lag_frames=5, stats_interval=60.0, logger=None):
+        """
+        :param trapezoid_masks: Trapezoid mask per key ('front', 'rear'), all of the mask shape
+        :param levels: Discrete CSI levels per key
+        :param csi_args: Keyword arguments of compute_csi_histogram besides the masks
+        :param processes: Number of worker processes
+        :param n_slots: Number of mask slots, i.e. frames in flight
+        :param max_lag_frames: Results further behind the frame they would be attached to are dropped
+        :param stats_interval: Seconds between statistics log lines (0 disables)
+        :param logger: Logger for statistics and errors (print if None)
+        """
+        self.trapezoid_masks = trapezoid_masks
+        self.levels = levels
+        self.csi_args = csi_args
+        self.processes = processes
+        self.n_slots = n_slots
+        self.max_lag_frames = max_lag_frames
+        self.stats_interval = stats_interval
+        self.logger = logger
+
+        self.mask_shape = next(iter(trapezoid_masks.values())).shape
+        self.shm = None
+        self.slots = None
+        self.free_slots = []
+        self.pending = {}
+        self.latest = {}
+        self.tasks = None
+        self.results = None
+        self.workers = []
+        self.last_stats = time.monotonic()
+
+        # Metrics
+        self.frames_submitted = 0
+        self.frames_skipped = 0
+        self.results_collected = 0
+        self.results_attached = 0
+        self.results_stale = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.compute_time_total = 0.0
+
+    def start(self):
+        """Allocate the mask slots and spawn the workers"""
+        if self.workers:
+            return
+        context = multiprocessing.get_context('spawn')
+        slot_shape = (self.n_slots, 2) + tuple(self.mask_shape)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(slot_shape)))
+        self.slots = np.ndarray(shape=slot_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.free_slots = list(range(self.n_slots))
+        self.pending = {}
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        for i in range(self.processes):
+            worker = context.Process(
+                target=_worker_main,
+                args=(self.shm.name, slot_shape, self.tasks, self.results, self.trapezoid_masks, self.levels,
+                      self.csi_args),
+                name=f'csi_worker_{i}',
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self, timeout=2.0):
+        """
+        Stop the workers and release the mask slots
+
+        :param timeout: Seconds to wait for each worker
+        """
+        if not self.workers:
+            return
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+        self._log(f'CSI workers stopped: {self.format_stats()}')
+
+        self.slots = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def submit(self, frame_number, key, road_mask, garbage_mask):
+        """
+        Copy the masks of one frame into a free slot and post it to the workers
+
+        :param frame_number: NvDsFrameMeta.frame_num
+        :param key: 'front' or 'rear'
+        :param road_mask: Road mask (H, W), e.g. the view returned by pyds.get_segmentation_masks
+        :param garbage_mask: Garbage mask (H, W)
+        :return: True if the frame was posted, False if no slot was free or the masks do not fit
+        """
+        if road_mask.shape != self.mask_shape or garbage_mask.shape != self.mask_shape:
+            self._log(f'CSI masks {road_mask.shape} / {garbage_mask.shape} do not match the slots {self.mask_shape}')
+            self.frames_skipped += 1
+            return False
+        if not self.free_slots:
+            self.frames_skipped += 1
+            return False
+
+        slot = self.free_slots.pop()
+        np.copyto(self.slots[slot, 0], road_mask, casting='unsafe')
+        np.copyto(self.slots[slot, 1], garbage_mask, casting='unsafe')
+        self.tasks.put((slot, frame_number, key, time.monotonic()))
+        self.frames_submitted += 1
+        return True
+
+    def collect(self, frame_numbers):
+        """
+        Results to attach to the frames of the current batch
+
+        Every finished result frees its slot and waits in pending until a frame of its
+        camera comes by; it is dropped there if it is more than max_lag_frames behind.
+
+        :param frame_numbers: Current frame number per key in the batch
+        :return: Dictionary key -> list of CsiResult, oldest first
+        """
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.free_slots.append(result.slot)
+            self.results_collected += 1
+            latency = time.monotonic() - result.posted_at
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.compute_time_total += result.compute_time
+            if result.error:
+                self.errors += 1
+                self._log(f'CSI worker error on {result.key} frame {result.frame_number}: {result.error}')
+            self.pending.setdefault(result.key, []).append(result)
+            self.latest[result.key] = result
+
+        ready = {}
+        for key, frame_number in frame_numbers.items():
+            results = sorted(self.pending.pop(key, []), key=lambda r: r.frame_number)
+            for result in results:
+                if frame_number - result.frame_number > self.max_lag_frames:
+                    self.results_stale += 1
+                else:
+                    ready.setdefault(key, []).append(result)
+                    self.results_attached += 1
+
+        now = time.monotonic()
+        if self.stats_interval and now - self.last_stats >= self.stats_interval:
+            self.last_stats = now
+            self._log(f'CSI workers: {self.format_stats()}')
+        return ready
+
+    def in_flight(self):
+        """Number of frames posted and not collected yet"""
+        return self.n_slots - len(self.free_slots)
+
+    def stats(self):
+        """
+        Pool metrics
+
+        :return: Dictionary of counters and latencies in milliseconds
+        """
+        collected = self.results_collected or 1
+        return {
+            'submitted': self.frames_submitted,
+            'skipped': self.frames_skipped,
+            'attached': self.results_attached,
+            'stale': self.results_stale,
+            'errors': self.errors,
+            'in_flight': self.in_flight(),
+            'latency_avg_ms': 1000 * self.latency_total / collected,
+            'latency_max_ms': 1000 * self.latency_max,
+            'compute_avg_ms': 1000 * self.compute_time_total / collected,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"{s['submitted']} frames posted, {s['skipped']} skipped, {s['attached']} results attached, "
+                f"{s['stale']} stale, {s['errors']} errors, {s['in_flight']} in flight, "
+                f"latency avg {s['latency_avg_ms']:.1f} ms / max {s['latency_max_ms']:.1f} ms, "
+                f"compute avg {s['compute_avg_ms']:.1f} ms")
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
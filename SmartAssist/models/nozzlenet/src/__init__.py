@@ -7,6 +7,9 @@ This module provides:
 - State machine (SmartStateMachine for nozzle control)
 - Bin creation (create_nozzlenet_inference_bin)
 - Buffer probe (nozzlenet_src_pad_buffer_probe)
+- Post-processing worker (NozzlenetWorker) running off the streaming thread
+- Per-camera state for batched inference (NozzleSources)
+- Confidence smoothing of the state machine input (ConfidenceFilter)
 
 MODULAR STRUCTURE: All nozzlenet logic is self-contained in this module
 for traceability and version management.
@@ -49,17 +52,40 @@ from .constants import (
 )
 
 # State machine
-from .state_machine import SmartStateMachine
+from .state_machine import SmartStateMachine, WindowedHistory
 
 # Bin creation - REAL function
 from .bins import (
     create_nozzlenet_inference_bin,
     get_nozzlenet_config_defaults,
-    get_nozzlenet_cameras
+    get_nozzlenet_cameras,
+    apply_class_filtering
 )
 
 # Buffer probe - REAL function
-from .probes import nozzlenet_src_pad_buffer_probe
+from .probes import nozzlenet_src_pad_buffer_probe, process_frame_result
+
+# Post-processing worker
+from .worker import FrameResult, NozzlenetWorker
+
+# Probe context
+from .probe_context import ProbeContext, OsdTextCache, build_class_table
+
+# Per-camera sources
+from .sources import NozzleSource, NozzleSources
+
+# Confidence smoothing
+from .smoothing import ConfidenceFilter
+
+# Configuration
+from .config import (
+    load_nozzlenet_config,
+    get_worker_settings,
+    get_probe_settings,
+    get_source_settings,
+    get_filter_settings,
+    get_smoothing_settings
+)
 
 __all__ = [
     # Constants
@@ -98,12 +124,39 @@ __all__ = [
     
     # State machine
     'SmartStateMachine',
+    'WindowedHistory',
     
     # Bin creation - REAL function
     'create_nozzlenet_inference_bin',
     'get_nozzlenet_config_defaults',
     'get_nozzlenet_cameras',
+    'apply_class_filtering',
     
     # Buffer probe - REAL function
     'nozzlenet_src_pad_buffer_probe',
+    'process_frame_result',
+
+    # Post-processing worker
+    'FrameResult',
+    'NozzlenetWorker',
+
+    # Probe context
+    'ProbeContext',
+    'OsdTextCache',
+    'build_class_table',
+
+    # Per-camera sources
+    'NozzleSource',
+    'NozzleSources',
+
+    # Confidence smoothing
+    'ConfidenceFilter',
+
+    # Configuration
+    'load_nozzlenet_config',
+    'get_worker_settings',
+    'get_probe_settings',
+    'get_source_settings',
+    'get_filter_settings',
+    'get_smoothing_settings',
 ]
\ No newline at end of file
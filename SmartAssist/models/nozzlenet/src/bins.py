@@ -8,9 +8,23 @@ nozzlenet inference processing bin.
 EXTRACTED FROM: SmartAssist/pipeline/src/pipeline/bins.py (inline code)
 VERIFIED: Complete bin structure with all elements and properties
 """
+import configparser
+import re
+
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
+
+from .config import (
+    get_filter_settings,
+    get_probe_settings,
+    get_smoothing_settings,
+    get_source_settings,
+    get_worker_settings
+)
+from .worker import NozzlenetWorker
+from pipeline.utils.helpers import modify_deepstream_config_files, remove_deepstream_config_option
+
 # Import helper functions from pipeline module
 try:
     from ...pipeline.elements import make_element
@@ -84,7 +98,11 @@ def create_nozzlenet_inference_bin(app_context, config_paths_dict):
     if preprocess_config_file:
         preprocess.set_property('config-file', preprocess_config_file)
     
+    # Drop unused classes inside nvinfer, before they become object metadata
+    filter_settings = get_filter_settings()
+    nvinfer_filters = False
     if infer_config_file:
+        nvinfer_filters = apply_class_filtering(infer_config_file, filter_settings, logger)
         pgie.set_property('config-file-path', infer_config_file)
     
     # CRITICAL: unique-id MUST be 1 for nozzlenet
@@ -117,22 +135,106 @@ def create_nozzlenet_inference_bin(app_context, config_paths_dict):
     # Add ghost pad for output
     nozzlenet_infer_bin.add_pad(Gst.GhostPad.new('src', get_static_pad(queue_nozzlenet_post_infer, 'src')))
     
-    # Attach nozzlenet probe to pgie src pad
     try:
-        from .probes import nozzlenet_src_pad_buffer_probe
-        tracker_src_pad = get_static_pad(pgie, 'src')
-        tracker_src_pad.add_probe(Gst.PadProbeType.BUFFER,
-                                  lambda pad, info, u_data: nozzlenet_src_pad_buffer_probe(pad, info, u_data),
-                                  0)
-        logger.debug('Nozzlenet probe attached to pgie src pad')
+        from .probes import nozzlenet_src_pad_buffer_probe, process_frame_result
+        from .probe_context import ProbeContext
     except ImportError as e:
         logger.error(f'Cannot import nozzlenet probe - inference will not work! Error: {e}')
         return None
+
+    # Post-processing worker: state machine, CAN and CSV data off the streaming thread
+    probe_context = None
+    worker = None
+    worker_settings = get_worker_settings()
+    if worker_settings['enabled']:
+        worker = NozzlenetWorker(
+            lambda result: process_frame_result(result, probe_context),
+            queue_size=worker_settings['queue_size'],
+            drop_policy=worker_settings['drop_policy'],
+            stats_interval=worker_settings['stats_interval'],
+            logger=logger
+        )
+        app_context.set_value('nozzlenet_worker', worker)
+
+    # Everything the probe needs is resolved once here instead of on every frame
+    probe_context = ProbeContext.from_app_context(
+        app_context,
+        osd_refresh_frames=get_probe_settings()['osd_refresh_frames'],
+        source_settings=get_source_settings(),
+        search_items=filter_settings['keep_class_ids'],
+        class_thresholds=None if nvinfer_filters else filter_settings['class_thresholds'],
+        smoothing=get_smoothing_settings()
+    )
+    if worker is not None:
+        worker.start()
+        logger.debug(f'Nozzlenet worker started (queue size {worker.queue_size}, {worker.drop_policy})')
+
+    # Attach nozzlenet probe to pgie src pad
+    tracker_src_pad = get_static_pad(pgie, 'src')
+    tracker_src_pad.add_probe(Gst.PadProbeType.BUFFER,
+                              nozzlenet_src_pad_buffer_probe,
+                              probe_context)
+    logger.debug('Nozzlenet probe attached to pgie src pad')
     
     logger.debug('Nozzlenet inference bin created successfully')
     return nozzlenet_infer_bin
 
 
+def apply_class_filtering(infer_config_file, filter_settings, logger=None):
+    """
+    Write the class filtering of nozzlenet_config.yaml into the nvinfer config file
+
+    Sets [property] filter-out-class-ids and one [class-attrs-<id>] pre-cluster-threshold
+    per configured class with modify_deepstream_config_files, the way the other runtime
+    keys of the file are set. Thresholds of classes no longer configured are removed, since
+    the file is modified in place at every start. nvinfer then drops these detections
+    itself and the probe's Python removal only remains as a fallback.
+
+    A deployed config may not be writable. Then the error is logged, the file is left as
+    it is and the buffer probe does the filtering in Python, thresholds included.
+
+    :param infer_config_file: Path to the nvinfer config file (modified in place)
+    :param filter_settings: Settings from get_filter_settings()
+    :param logger: Logger for the written values
+    :return: True if nvinfer applies the filtering, False if the probe has to
+    """
+    filter_out = ';'.join(str(class_id) for class_id in filter_settings['filter_out_class_ids'])
+    thresholds = filter_settings['class_thresholds'] if filter_settings['enabled'] else {}
+
+    try:
+        config = configparser.ConfigParser()
+        config.read(infer_config_file)
+        stale_sections = []
+        for section in config.sections():
+            match = re.fullmatch(r'class-attrs-(\d+)', section)
+            if match and int(match.group(1)) not in thresholds and config.has_option(section, 'pre-cluster-threshold'):
+                stale_sections.append(section)
+
+        if filter_settings['enabled'] and filter_out:
+            modify_deepstream_config_files(infer_config_file, infer_config_file, 'property',
+                                           'filter-out-class-ids', filter_out)
+        elif config.has_option('property', 'filter-out-class-ids'):
+            remove_deepstream_config_option(infer_config_file, infer_config_file, 'property',
+                                            'filter-out-class-ids')
+
+        for section in stale_sections:
+            remove_deepstream_config_option(infer_config_file, infer_config_file, section, 'pre-cluster-threshold')
+        for class_id, threshold in sorted(thresholds.items()):
+            modify_deepstream_config_files(infer_config_file, infer_config_file, f'class-attrs-{class_id}',
+                                           'pre-cluster-threshold', threshold)
+    except (OSError, configparser.Error) as e:
+        if logger:
+            logger.warning(f'Cannot write the nozzlenet class filtering into {infer_config_file} ({e}), '
+                           f'the buffer probe filters the classes in Python')
+        return False
+
+    if logger:
+        logger.debug(f'Nozzlenet class filtering in {infer_config_file}: '
+                     f'filter-out-class-ids={filter_out if filter_settings["enabled"] else None}, '
+                     f'class thresholds {thresholds}')
+    return True
+
+
 def get_nozzlenet_config_defaults():
     """
     Get default configuration values for nozzlenet inference
@@ -0,0 +1,149 @@
+"""
+Nozzlenet Model Configuration
+Loads models/nozzlenet/config/nozzlenet_config.yaml
+
+The file is read once; later calls return the cached dictionary.
+"""
+import os
+
+import yaml
+
+try:
+    from pipeline.utils.paths import NOZZLENET_ROOT
+except ImportError:
+    # Fallback when the pipeline package is not installed: this file is at models/nozzlenet/src/
+    NOZZLENET_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NOZZLENET_CONFIG_PATH = os.path.join(NOZZLENET_ROOT, 'config', 'nozzlenet_config.yaml')
+
+_config_cache = {}
+
+
+def load_nozzlenet_config(config_path=None):
+    """
+    Load the nozzlenet model configuration
+
+    :param config_path: Path to nozzlenet_config.yaml (default: the one in this model's config folder)
+    :return: Configuration dictionary (empty if the file cannot be read)
+    """
+    config_path = config_path or NOZZLENET_CONFIG_PATH
+    if config_path not in _config_cache:
+        try:
+            with open(config_path, 'r') as f:
+                _config_cache[config_path] = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            print(f'Warning: could not load nozzlenet config {config_path}: {e}')
+            _config_cache[config_path] = {}
+    return _config_cache[config_path]
+
+
+def get_worker_settings(config_path=None):
+    """
+    Settings of the post-processing worker thread
+
+    :param config_path: Optional path to nozzlenet_config.yaml
+    :return: Dictionary with enabled, queue_size, drop_policy and stats_interval
+    """
+    settings = {
+        'enabled': True,
+        'queue_size': 8,
+        'drop_policy': 'drop_oldest',
+        'stats_interval': 60.0,
+    }
+    settings.update(load_nozzlenet_config(config_path).get('worker') or {})
+    return settings
+
+
+def get_probe_settings(config_path=None):
+    """
+    Settings of the nozzlenet buffer probe
+
+    :param config_path: Optional path to nozzlenet_config.yaml
+    :return: Dictionary with osd_refresh_frames
+    """
+    settings = {
+        'osd_refresh_frames': 15,
+    }
+    settings.update(load_nozzlenet_config(config_path).get('probe') or {})
+    return settings
+
+
+def get_source_settings(config_path=None):
+    """
+    Per-camera settings of the batched nozzlenet sources
+
+    :param config_path: Optional path to nozzlenet_config.yaml
+    :return: Dictionary {source_id: {'name', 'nozzle_shift', 'nozzle_mask'}}
+    """
+    sources = load_nozzlenet_config(config_path).get('sources') or {
+        0: {'name': 'primary_nozzle', 'nozzle_shift': 0, 'nozzle_mask': 0x0F}
+    }
+    settings = {}
+    for source_id, source in sources.items():
+        settings[int(source_id)] = {
+            'name': source.get('name', f'source_{source_id}'),
+            'nozzle_shift': int(source.get('nozzle_shift', 0)),
+            'nozzle_mask': int(source.get('nozzle_mask', 0x0F)),
+        }
+    return settings
+
+
+def get_filter_settings(config_path=None):
+    """
+    Class filtering done by nvinfer instead of the buffer probe
+
+    Class names are resolved through classes.class_ids. Classes that are not kept go
+    into filter-out-class-ids, per-class thresholds into [class-attrs-<id>] sections.
+
+    :param config_path: Optional path to nozzlenet_config.yaml
+    :return: Dictionary with enabled, keep_class_ids, filter_out_class_ids and
+             class_thresholds ({class_id: pre-cluster-threshold})
+    """
+    config = load_nozzlenet_config(config_path)
+    class_ids = (config.get('classes') or {}).get('class_ids') or {
+        'background': 0, 'action_object': 1, 'check_nozzle': 2,
+        'gravel': 3, 'nozzle_blocked': 4, 'nozzle_clear': 5,
+    }
+    filtering = config.get('filtering') or {}
+
+    def class_id(name):
+        return int(name) if isinstance(name, int) else int(class_ids[name])
+
+    keep = filtering.get('keep_classes')
+    if keep is None:
+        keep = [name for name in class_ids if name != 'background']
+    keep_class_ids = sorted({class_id(name) for name in keep})
+
+    return {
+        'enabled': bool(filtering.get('enabled', True)),
+        'keep_class_ids': keep_class_ids,
+        'filter_out_class_ids': sorted(set(int(i) for i in class_ids.values()) - set(keep_class_ids)),
+        'class_thresholds': {class_id(name): float(threshold)
+                             for name, threshold in (filtering.get('class_thresholds') or {}).items()},
+    }
+
+
+def get_smoothing_settings(config_path=None):
+    """
+    Confidence smoothing of the state machine input
+
+    :param config_path: Optional path to nozzlenet_config.yaml
+    :return: ConfidenceFilter arguments (half_life, unit, on_threshold, off_threshold),
+             or None when smoothing is disabled
+    """
+    settings = {
+        'enabled': False,
+        'half_life': 2.0,
+        'unit': 'frames',
+        'on_threshold': 0.4,
+        'off_threshold': 0.2,
+    }
+    settings.update(load_nozzlenet_config(config_path).get('smoothing') or {})
+    if not settings.pop('enabled'):
+        return None
+    return {
+        'half_life': float(settings['half_life']),
+        'unit': settings['unit'],
+        'on_threshold': float(settings['on_threshold']),
+        'off_threshold': float(settings['off_threshold']),
+    }
@@ -0,0 +1,256 @@
+"""
+Nozzlenet Probe Context
+Typed context for the nozzlenet buffer probe, resolved once at startup
+
+The probe runs for every frame on the streaming thread. Looking values up in the
+Gst.Structure app context converts GValues on every call, so everything the probe
+needs is read once into a ProbeContext and handed to the probe as its user data.
+The class ID lookup table replaces the if/elif chain over the detection classes.
+"""
+from datetime import datetime
+
+from .constants import (
+    PGIE_CLASS_ID_ACTION_OBJECT,
+    PGIE_CLASS_ID_CHECK_NOZZLE,
+    PGIE_CLASS_ID_GRAVEL,
+    PGIE_CLASS_ID_NOZZLE_BLOCKED,
+    PGIE_CLASS_ID_NOZZLE_CLEAR,
+    NOZZLE_STATUS_CLEAR,
+    NOZZLE_STATUS_BLOCKED,
+    NOZZLE_STATUS_CHECK,
+    NOZZLE_STATUS_GRAVEL,
+    BORDER_COLOR_CLEAR,
+    BORDER_COLOR_BLOCKED,
+    BORDER_COLOR_CHECK,
+    BORDER_COLOR_GRAVEL,
+    BORDER_COLOR_ACTION_OBJECT,
+)
+
+# Status reported for an action object detection (the state machine's recieved_aos)
+ACTION_OBJECT_STATUS = 'true'
+
+# class_id: (CSV column, nozzle status or None for the action object, border color)
+DETECTION_CLASSES = {
+    PGIE_CLASS_ID_NOZZLE_CLEAR: ('nozzle_clear', NOZZLE_STATUS_CLEAR, BORDER_COLOR_CLEAR),
+    PGIE_CLASS_ID_NOZZLE_BLOCKED: ('nozzle_blocked', NOZZLE_STATUS_BLOCKED, BORDER_COLOR_BLOCKED),
+    PGIE_CLASS_ID_CHECK_NOZZLE: ('check_nozzle', NOZZLE_STATUS_CHECK, BORDER_COLOR_CHECK),
+    PGIE_CLASS_ID_GRAVEL: ('gravel', NOZZLE_STATUS_GRAVEL, BORDER_COLOR_GRAVEL),
+    PGIE_CLASS_ID_ACTION_OBJECT: ('action_object', None, BORDER_COLOR_ACTION_OBJECT),
+}
+
+# All detection classes except background, as in the original search_item_list
+DEFAULT_SEARCH_ITEMS = tuple(DETECTION_CLASSES)
+
+# (class bit, CSV column) pairs to expand FrameResult.class_flags
+FLAG_COLUMNS = tuple((1 << class_id, column) for class_id, (column, _, _) in sorted(DETECTION_CLASSES.items()))
+
+# CSV columns process_frame_result fills, the camera columns of the logging config have them all
+ROW_KEYS = tuple(column for _, column in FLAG_COLUMNS) + ('confidence', 'sm_current_state', 'time')
+
+
+def build_class_table(search_items, class_thresholds=None):
+    """
+    Lookup table indexed by class_id
+
+    :param search_items: Class IDs to keep, all others are removed from the frame
+    :param class_thresholds: {class_id: minimum confidence} the probe applies itself, for when
+                             nvinfer could not be configured with them (see apply_class_filtering)
+    :return: Tuple with (class bit, nozzle status, action object status, border color, minimum
+             confidence) for kept classes and None for classes to remove
+    """
+    class_thresholds = class_thresholds or {}
+    size = max(DETECTION_CLASSES) + 1
+    table = [None] * size
+    for class_id in search_items:
+        if class_id not in DETECTION_CLASSES or class_id >= size:
+            continue
+        _, status, color = DETECTION_CLASSES[class_id]
+        action_object = ACTION_OBJECT_STATUS if status is None else None
+        table[class_id] = (1 << class_id, status, action_object, tuple(color),
+                           float(class_thresholds.get(class_id, 0.0)))
+    return tuple(table)
+
+
+def format_osd_texts(result, overlay_parts):
+    """
+    Build the two OSD label texts for a frame
+
+    :param result: FrameResult
+    :param overlay_parts: Overlay values (state machine and PM readings)
+    :return: Tuple (main label text, PM label text)
+    """
+    # Main label (VERIFIED exact format)
+    main_text = (
+        'Frame Number={} | FPS {} | Num detection =  {} | Max Confidence = {:.2f} | '
+        'Nozzle status = {} | Action object = {}\n'
+        'Nozzle CAN = {} | Fan CAN = {} | Time = {} | SM Current Status = {} | '
+        'SM Current State = {}\n'
+        'SMS Time Difference = {:.3f} | Action Object Status = {} | '
+        'Action Object Diffrence = {:.3f}'.format(
+            result.frame_number,
+            result.fps,
+            result.num_detections,
+            result.confidence,
+            result.nozzle_status,
+            result.action_object,
+            overlay_parts.get('sm_nozzle_state', 'N/A'),
+            overlay_parts.get('sm_fan_speed', 'N/A'),
+            datetime.fromtimestamp(result.timestamp),
+            overlay_parts.get('sm_current_status', 'N/A'),
+            overlay_parts.get('sm_current_state', 'N/A'),
+            overlay_parts.get('sm_time_difference', 0.0),
+            overlay_parts.get('sm_ao_status', 'N/A'),
+            overlay_parts.get('sm_ao_difference', 0.0)
+        )
+    )
+
+    # PM sensor label
+    pm_text = (
+        f"S1_PM10={overlay_parts.get('s1_pm10', 0)} | "
+        f"S2_PM10={overlay_parts.get('s2_pm10', 'N/A')} | "
+        f"S3_PM10={overlay_parts.get('s3_pm10', 'N/A')} | "
+        f"S4_PM10={overlay_parts.get('s4_pm10', 'N/A')} | "
+        f"S5_PM10={overlay_parts.get('s5_pm10', 'N/A')}"
+    )
+    return main_text, pm_text
+
+
+class OsdTextCache:
+    """
+    Rebuilds the OSD label texts only when what they show changes
+
+    The nozzle status, action object, state machine values and PM readings are
+    compared on every frame. Frame number, FPS, time, detection count and confidence
+    change all the time, so they only move on when the state changes or every
+    refresh_frames frames; the label keeps ticking without a new string per frame.
+    """
+    __slots__ = ('refresh_frames', 'key', 'texts', 'frames_since_build', 'builds')
+
+    def __init__(self, refresh_frames=15):
+        """
+        :param refresh_frames: Rebuild at least this often even without changes (0 = only on change)
+        """
+        self.refresh_frames = refresh_frames
+        self.key = None
+        self.texts = ('', '')
+        self.frames_since_build = 0
+        self.builds = 0
+
+    def get(self, result, overlay_parts):
+        """
+        OSD texts for a frame
+
+        :param result: FrameResult of the frame
+        :param overlay_parts: Overlay values (state machine and PM readings)
+        :return: Tuple (main label text, PM label text)
+        """
+        key = (result.nozzle_status, result.action_object, tuple(overlay_parts.values()))
+        self.frames_since_build += 1
+        if key != self.key or (self.refresh_frames and self.frames_since_build >= self.refresh_frames):
+            self.texts = format_osd_texts(result, overlay_parts)
+            self.key = key
+            self.frames_since_build = 0
+            self.builds += 1
+        return self.texts
+
+
+class ProbeContext:
+    """
+    Everything the nozzlenet probe uses, read once from the app context
+
+    overlay_parts is held by reference: the overlay fetcher thread updates the
+    dict in place, so the values it writes show up without a lookup per frame.
+    row is the CSV data of a frame, one dict reset and refilled by
+    process_frame_result on every frame instead of a new one.
+    """
+    __slots__ = ('app_context', 'logger', 'fps_counter', 'worker', 'search_items', 'class_table', 'sources',
+                 'can_client', 'overlay_parts', 'row', 'empty_row')
+
+    def __init__(self, app_context, logger=None, fps_counter=None, worker=None, search_items=None,
+                 osd_refresh_frames=15, sources=None, can_client=None, columns=(), overlay_parts=None,
+                 class_thresholds=None):
+        """
+        :param app_context: Application context (Gst.Structure)
+        :param logger: Logger
+        :param fps_counter: GETFPS counter of the nozzlenet stream (None to skip FPS counting)
+        :param worker: NozzlenetWorker, or None to post-process inline in the probe
+        :param search_items: Class IDs to keep (default: all detection classes)
+        :param osd_refresh_frames: See OsdTextCache
+        :param sources: NozzleSources with the per-camera state (default: source 0 only)
+        :param can_client: CANClient for the CAN and CSV data (None to skip sending)
+        :param columns: Camera CSV columns (camera_signals of the logging config)
+        :param overlay_parts: Overlay values dict shared with the overlay fetcher (default: empty)
+        :param class_thresholds: {class_id: minimum confidence} applied in the probe (default: none,
+                                 nvinfer applies them)
+        """
+        self.app_context = app_context
+        self.logger = logger
+        self.can_client = can_client
+        self.overlay_parts = overlay_parts if overlay_parts is not None else {}
+        # The keys process_frame_result writes are always in the row, so refilling it leaves no stale values
+        columns = list(columns or ())
+        columns += [key for key in ROW_KEYS if key not in columns]
+        self.empty_row = dict.fromkeys(columns, 0.0)
+        self.row = dict(self.empty_row)
+        self.fps_counter = fps_counter
+        self.worker = worker
+        self.search_items = tuple(search_items) if search_items else DEFAULT_SEARCH_ITEMS
+        self.class_table = build_class_table(self.search_items, class_thresholds)
+        if sources is None:
+            # Imported here, sources uses OsdTextCache from this module
+            from .sources import NozzleSources
+            sources = NozzleSources(osd_refresh_frames=osd_refresh_frames, logger=logger)
+        self.sources = sources
+
+    @classmethod
+    def from_app_context(cls, app_context, osd_refresh_frames=15, source_settings=None, search_items=None,
+                         class_thresholds=None, smoothing=None):
+        """
+        Resolve the probe context from the Gst.Structure app context
+
+        :param app_context: Application context (Gst.Structure)
+        :param osd_refresh_frames: See OsdTextCache
+        :param source_settings: Per-camera settings, see NozzleSources (default: source 0 only)
+        :param search_items: Class IDs to keep when the app context has no search_item_list
+        :param class_thresholds: {class_id: minimum confidence} the probe applies (see build_class_table)
+        :param smoothing: ConfidenceFilter arguments, see NozzleSources (default: no smoothing)
+        :return: ProbeContext
+        """
+        from .sources import NozzleSources
+        app_context_v2 = app_context.get_value('app_context_v2')
+        logger = app_context_v2.logger if app_context_v2 else None
+        sources = NozzleSources(
+            source_settings,
+            state_machine=app_context.get_value('state_machine'),
+            osd_refresh_frames=osd_refresh_frames,
+            logger=logger,
+            smoothing=smoothing
+        )
+        overlay_parts = app_context.get_value('overlay_parts')
+        if overlay_parts is None:
+            # Shared with the overlay fetcher, which updates it in place
+            overlay_parts = {}
+            app_context.set_value('overlay_parts', overlay_parts)
+        return cls(
+            app_context,
+            logger=logger,
+            can_client=app_context.get_value('can_client'),
+            columns=app_context.get_value('camera_columns'),
+            overlay_parts=overlay_parts,
+            fps_counter=app_context.get_value('nn_fps_counter'),
+            worker=app_context.get_value('nozzlenet_worker'),
+            search_items=app_context.get_value('search_item_list') or search_items,
+            class_thresholds=class_thresholds,
+            osd_refresh_frames=osd_refresh_frames,
+            sources=sources
+        )
+
+
+def format_frame_time(timestamp):
+    """
+    CSV time of a frame, HH:MM:SS.d00 as the loggers have always written it
+
+    :param timestamp: Epoch seconds
+    :return: Formatted time string
+    """
+    return f"{datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-5]}00"
@@ -5,135 +5,57 @@ Buffer probe for nozzlenet object detection inference
 This module contains the nozzlenet_src_pad_buffer_probe function that processes
 detection results from the nozzlenet inference engine.
 
+The probe itself only extracts a FrameResult from the metadata. The rest
+(process_frame_result: state machine, CAN, CSV data, OSD text) runs on the
+NozzlenetWorker thread when the probe context has one, otherwise inline.
+
+The probe gets a ProbeContext as user data, so it does no app context lookups
+per frame, and classifies detections through the context's class ID table.
+
+Every frame of a batch is processed, so several nozzle cameras can share one
+nvinfer call. Each source_id has its own state machine, OSD text and CAN nozzle
+bits (NozzleSources).
+
 EXTRACTED FROM: pipeline/pipeline_w_logging.py
 VERIFIED: Complete implementation with all logic
 """
 import sys
+import time
 import pyds
 from gi.repository import Gst
-from datetime import datetime
 
 # Import constants from this module
-from .constants import (
-    PGIE_CLASS_ID_NOZZLE_CLEAR,
-    PGIE_CLASS_ID_NOZZLE_BLOCKED,
-    PGIE_CLASS_ID_CHECK_NOZZLE,
-    PGIE_CLASS_ID_GRAVEL,
-    PGIE_CLASS_ID_ACTION_OBJECT,
-    BORDER_COLOR_CLEAR,
-    BORDER_COLOR_BLOCKED,
-    BORDER_COLOR_CHECK,
-    BORDER_COLOR_GRAVEL,
-    BORDER_COLOR_ACTION_OBJECT,
-    BORDER_WIDTH
-)
+from .constants import BORDER_WIDTH
+from .probe_context import FLAG_COLUMNS, ProbeContext, format_frame_time
+from .worker import FrameResult
 
+# ProbeContexts resolved for probes attached with the plain app context as user data
+_resolved_contexts = {}
 
-def nozzlenet_src_pad_buffer_probe(pad, info, u_data):
+
+def extract_frame_result(frame_meta, class_table, fps_count, pts):
     """
-    Nozzlenet buffer probe - THE CORE DETECTION PROCESSING FUNCTION
-    
-    This probe is attached to the nozzlenet inference engine output pad.
-    It processes every frame, extracting object detections, updating the
-    state machine, sending CAN messages, and logging to CSV.
-    
-    Processing Flow:
-    1. Get GStreamer buffer and batch metadata
-    2. Update FPS counter and send to CAN
-    3. Acquire display metadata for OSD (2 labels)
-    4. Get frame metadata (batch size=1, single frame)
-    5. Setup OSD text parameters
-    6. Iterate through detected objects
-    7. Filter unwanted detections (search_item_list)
-    8. Process each detection by class_id:
-       - Set border colors
-       - Update prediction dictionary
-       - Track highest confidence
-    9. Add display metadata to frame
-    10. Update state machine with detections
-    11. Update CAN bus (fan speed + nozzle state)
-    12. Format timestamp for CSV
-    13. Send all data to CAN client
-    
-    :param pad: GStreamer pad
-    :param info: Probe info containing buffer
-    :param u_data: User data (unused - app_context accessed globally)
-    :return: Gst.PadProbeReturn.OK
-    
-    VERIFIED: Exact from pipeline/pipeline_w_logging.py
+    Walk the detections of one frame and summarise them in a FrameResult
+
+    The kept detections get their border colors, which must happen while the buffer
+    is in the probe. Unwanted classes are normally dropped by nvinfer already
+    (filter-out-class-ids, see apply_class_filtering); any that still arrive, and
+    detections below the class_table thresholds, are removed from the frame here.
+
+    :param frame_meta: NvDsFrameMeta of the frame
+    :param class_table: Class ID lookup table (ProbeContext.class_table)
+    :param fps_count: Current FPS counter value
+    :param pts: Buffer PTS in nanoseconds
+    :return: FrameResult
     """
-    # Get app context (assumes global Gst.Structure named 'app_context')
-    # In the new structure, this will be passed properly
-    try:
-        import gi
-        gi.require_version('Gst', '1.0')
-        from gi.repository import Gst
-        
-        # CRITICAL: In the modular version, app_context must be passed via u_data
-        # For now, we'll assume it's available globally (backward compatibility)
-        app_context = Gst.Structure.from_string("app_context")[0] if u_data is None else u_data
-        
-        logger = app_context.get_value('app_context_v2').logger
-        can_client = app_context.get_value('can_client')
-        state_machine = app_context.get_value('state_machine')
-        columns = app_context.get_value('camera_columns')
-        search_item_list_ = app_context.get_value('search_item_list')
-        overlay_parts = app_context.get_value('overlay_parts')
-        nn_fps_counter_ = app_context.get_value('nn_fps_counter')
-    except:
-        # Fallback if app_context not available
-        sys.stderr.write("Warning: app_context not available in probe\n")
-        return Gst.PadProbeReturn.OK
-    
-    # Initialize prediction dictionary
-    prediction_dict = dict.fromkeys(columns, 0.0)
-    frame_number = 0
-    obj_id = 0
-    deleted = 1
-    nozzle_status_string = None
-    action_object_string = None
-    highest_confidence = 0.0
-    timenow = datetime.now()
-    
-    # Get GStreamer buffer
-    gst_buffer = info.get_buffer()
-    if not gst_buffer:
-        sys.stderr.write('Unable to get pgie src pad buffer\n')
-        return Gst.PadProbeReturn.OK
-    
-    # Update FPS counter
-    fps_count = nn_fps_counter_.get_fps()
-    if fps_count and can_client and can_client.connected:
-        try:
-            can_client.update_fps('nn', int(hex(fps_count), 16))
-        except Exception as e:
-            logger.debug(f'FPS update error: {e}')
-    
-    # Get batch metadata
-    batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
-    if not batch_meta:
-        return Gst.PadProbeReturn.OK
-    
-    # Acquire display metadata for OSD
-    display_meta = pyds.nvds_acquire_display_meta_from_pool(batch_meta)
-    if not display_meta:
-        return Gst.PadProbeReturn.OK
-    
-    # Get frame metadata (batch size=1, so only one frame)
-    l_frame = batch_meta.frame_meta_list
-    if not l_frame:
-        return Gst.PadProbeReturn.OK
-    
-    frame_meta = pyds.NvDsFrameMeta.cast(l_frame.data)
-    ndetections = frame_meta.num_obj_meta
+    n_classes = len(class_table)
+    class_confidences = [0.0] * n_classes
     l_obj = frame_meta.obj_meta_list
-    frame_number = frame_meta.frame_num
-    
-    # Setup OSD display - 2 labels: main inference info + PM sensor info
-    display_meta.num_labels = 2
-    py_nvosd_text_params = display_meta.text_params[0]  # Main label
-    py_nvosd_pm_params = display_meta.text_params[1]    # PM sensor label
-    
+    nozzle_status = None
+    action_object = None
+    highest_confidence = 0.0
+    class_flags = 0
+
     # Iterate through detected objects
     while l_obj is not None:
         try:
@@ -146,75 +68,61 @@ def nozzlenet_src_pad_buffer_probe(pad, info, u_data):
         except StopIteration:
             break
         
-        # Filter unwanted detections
-        if obj_meta.class_id not in search_item_list_:
+        class_id = obj_meta.class_id
+        entry = class_table[class_id] if 0 <= class_id < n_classes else None
+
+        # Fallback for classes and thresholds nvinfer did not filter out
+        confidence = obj_meta.confidence
+        if entry is None or confidence < entry[4]:
             pyds.nvds_remove_obj_meta_from_frame(frame_meta, obj_meta)
-            deleted += 1
-            obj_id += 1
             continue
+
+        class_bit, status, action_status, color, _ = entry
+        class_flags |= class_bit
+        if status is not None:
+            nozzle_status = status
+        else:
+            action_object = action_status
+
+        rect_params = obj_meta.rect_params
+        rect_params.border_color.set(*color)
+        rect_params.border_width = BORDER_WIDTH
         
-        # Process detection by class_id
-        if obj_meta.class_id == PGIE_CLASS_ID_NOZZLE_CLEAR:
-            nozzle_status_string = "clear"
-            obj_meta.rect_params.border_color.set(*BORDER_COLOR_CLEAR)
-            prediction_dict["nozzle_clear"] = 1.0
-        
-        elif obj_meta.class_id == PGIE_CLASS_ID_NOZZLE_BLOCKED:
-            nozzle_status_string = "blocked"
-            obj_meta.rect_params.border_color.set(*BORDER_COLOR_BLOCKED)
-            prediction_dict["nozzle_blocked"] = 1.0
-        
-        elif obj_meta.class_id == PGIE_CLASS_ID_CHECK_NOZZLE:
-            nozzle_status_string = "check"
-            obj_meta.rect_params.border_color.set(*BORDER_COLOR_CHECK)
-            prediction_dict["check_nozzle"] = 1.0
-        
-        elif obj_meta.class_id == PGIE_CLASS_ID_GRAVEL:
-            nozzle_status_string = "gravel"
-            obj_meta.rect_params.border_color.set(*BORDER_COLOR_GRAVEL)
-            prediction_dict["gravel"] = 1.0
-        
-        elif obj_meta.class_id == PGIE_CLASS_ID_ACTION_OBJECT:
-            action_object_string = "true"
-            obj_meta.rect_params.border_color.set(*BORDER_COLOR_ACTION_OBJECT)
-            prediction_dict["action_object"] = 1.0
-        
-        # Set border width
-        obj_meta.rect_params.border_width = BORDER_WIDTH
-        
-        # Track highest confidence
-        if obj_meta.confidence > highest_confidence:
-            highest_confidence = obj_meta.confidence
-            prediction_dict["confidence"] = highest_confidence
-        
-        obj_id += 1
-    
-    # Setup OSD text - Main label (VERIFIED exact format)
-    py_nvosd_text_params.display_text = (
-        'Frame Number={} | FPS {} | Num detection =  {} | Max Confidence = {:.2f} | '
-        'Nozzle status = {} | Action object = {}\n'
-        'Nozzle CAN = {} | Fan CAN = {} | Time = {} | SM Current Status = {} | '
-        'SM Current State = {}\n'
-        'SMS Time Difference = {:.3f} | Action Object Status = {} | '
-        'Action Object Diffrence = {:.3f}'.format(
-            frame_number,
-            fps_count,
-            ndetections,
-            highest_confidence,
-            nozzle_status_string,
-            action_object_string,
-            overlay_parts.get('sm_nozzle_state', 'N/A'),
-            overlay_parts.get('sm_fan_speed', 'N/A'),
-            timenow,
-            overlay_parts.get('sm_current_status', 'N/A'),
-            overlay_parts.get('sm_current_state', 'N/A'),
-            overlay_parts.get('sm_time_difference', 0.0),
-            overlay_parts.get('sm_ao_status', 'N/A'),
-            overlay_parts.get('sm_ao_difference', 0.0)
-        )
+        # Track highest confidence, overall and per class
+        if confidence > highest_confidence:
+            highest_confidence = confidence
+        if confidence > class_confidences[class_id]:
+            class_confidences[class_id] = confidence
+
+    return FrameResult(
+        frame_meta.frame_num,
+        frame_meta.source_id,
+        pts,
+        time.time(),
+        fps_count,
+        frame_meta.num_obj_meta,
+        nozzle_status,
+        action_object,
+        class_flags,
+        highest_confidence,
+        tuple(class_confidences)
     )
-    
+
+
+def set_osd_texts(display_meta, main_text, pm_text):
+    """
+    Fill the two OSD labels of a display meta
+
+    :param display_meta: NvDsDisplayMeta acquired for the frame
+    :param main_text: Main inference label text
+    :param pm_text: PM sensor label text
+    """
+    display_meta.num_labels = 2
+    py_nvosd_text_params = display_meta.text_params[0]  # Main label
+    py_nvosd_pm_params = display_meta.text_params[1]    # PM sensor label
+
     # VERIFIED: Exact OSD text parameters
+    py_nvosd_text_params.display_text = main_text
     py_nvosd_text_params.x_offset = 1
     py_nvosd_text_params.y_offset = 1
     py_nvosd_text_params.font_params.font_name = 'Serif'
@@ -223,14 +131,8 @@ def nozzlenet_src_pad_buffer_probe(pad, info, u_data):
     py_nvosd_text_params.set_bg_clr = 1
     py_nvosd_text_params.text_bg_clr.set(0.0, 0.0, 0.0, 0.5)  # Black with alpha
     
-    # Setup OSD text - PM sensor label (VERIFIED: y_offset=1040, not 740)
-    py_nvosd_pm_params.display_text = (
-        f"S1_PM10={overlay_parts.get('s1_pm10', 0)} | "
-        f"S2_PM10={overlay_parts.get('s2_pm10', 'N/A')} | "
-        f"S3_PM10={overlay_parts.get('s3_pm10', 'N/A')} | "
-        f"S4_PM10={overlay_parts.get('s4_pm10', 'N/A')} | "
-        f"S5_PM10={overlay_parts.get('s5_pm10', 'N/A')}"
-    )
+    # VERIFIED: y_offset=1040, not 740
+    py_nvosd_pm_params.display_text = pm_text
     py_nvosd_pm_params.x_offset = 0
     py_nvosd_pm_params.y_offset = 1040  # CRITICAL: 1040, not 740!
     py_nvosd_pm_params.font_params.font_name = 'Serif'
@@ -238,53 +140,204 @@ def nozzlenet_src_pad_buffer_probe(pad, info, u_data):
     py_nvosd_pm_params.font_params.font_color.set(1.0, 1.0, 1.0, 1.0)  # White
     py_nvosd_pm_params.set_bg_clr = 1
     py_nvosd_pm_params.text_bg_clr.set(0.0, 0.0, 0.0, 0.5)  # Black with alpha
-    
-    # Add display metadata to frame
-    pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
-    
+
+
+def process_frame_result(result, ctx):
+    """
+    Everything done for a frame after its detections are known
+
+    Runs on the NozzlenetWorker thread (or inline in the probe without a worker):
+    1. Send FPS to CAN (primary source only)
+    2. Update the source's state machine with detections (smoothed by the
+       source's ConfidenceFilter when smoothing is enabled)
+    3. Update CAN bus (fan speed of all sources + this source's nozzle bits)
+    4. Send the CSV data of the frame to the CAN client
+    5. Build the OSD texts (through the source's cache, only when they change)
+
+    The CSV data is the context's preallocated row, refilled for every frame.
+
+    :param result: FrameResult
+    :param ctx: ProbeContext (or the app context Gst.Structure, see resolve_probe_context)
+    :return: Tuple (main label text, PM label text)
+    """
+    if type(ctx) is not ProbeContext:
+        ctx = resolve_probe_context(ctx)
+    sources = ctx.sources
+    source = sources.get(result.source_id)
+    state_machine = source.state_machine
+    logger = ctx.logger
+    can_client = ctx.can_client
+
+    # Update FPS counter
+    if source.primary and result.fps and can_client and can_client.connected:
+        try:
+            can_client.update_fps('nn', int(hex(result.fps), 16))
+        except Exception as e:
+            logger.debug(f'FPS update error: {e}')
+
+    prediction_dict = ctx.row
+    prediction_dict.update(ctx.empty_row)
+    for class_bit, column in FLAG_COLUMNS:
+        if result.class_flags & class_bit:
+            prediction_dict[column] = 1.0
+    if result.confidence > 0.0:
+        prediction_dict["confidence"] = result.confidence
+
+    # Smooth the per-class confidences so single-frame detections do not reach the state machine
+    nozzle_status = result.nozzle_status
+    action_object = result.action_object
+    if source.smoother is not None:
+        nozzle_status, action_object = source.smoother.update(result.class_confidences, result.pts)
+
     # Update state machine
     try:
-        state_machine.status_send(recieved_ns=nozzle_status_string, 
-                                  recieved_aos=action_object_string)
+        state_machine.status_send(recieved_ns=nozzle_status,
+                                  recieved_aos=action_object)
         prediction_dict['sm_current_state'] = state_machine.get_current_state()
     except Exception as e:
         logger.debug(f'State machine status send error: {e}')
     
     # Update CAN bus
     if can_client and can_client.connected:
-        # Send fan speed
+        # Send fan speed, the highest any camera asks for
         try:
             can_client.update_can_bytes({
                 'fan_byte': {
                     'operation': 'update_bits',
-                    'value': int(hex(state_machine.fan_speed), 16),
+                    'value': sources.fan_request(),
                     'mask': 15
                 }
             })
         except Exception as e:
             logger.debug(f'CAN fan speed update error: {e}')
         
-        # Send nozzle state
-        try:
-            can_client.update_can_bytes({
-                'nozzle_byte': {
-                    'operation': 'update_bits',
-                    'value': int(hex(state_machine.nozzle_state), 16),
-                    'mask': 15
-                }
-            })
-        except Exception as e:
-            logger.debug(f'CAN nozzle state update error: {e}')
+        # Send nozzle state into this camera's bits
+        nozzle_value, nozzle_mask = source.nozzle_update()
+        if nozzle_mask:
+            try:
+                can_client.update_can_bytes({
+                    'nozzle_byte': {
+                        'operation': 'update_bits',
+                        'value': nozzle_value,
+                        'mask': nozzle_mask
+                    }
+                })
+            except Exception as e:
+                logger.debug(f'CAN nozzle state update error: {e}')
     
-    # Format timestamp (VERIFIED: exact format with microseconds + "00")
-    prediction_dict['time'] = f"{datetime.now().strftime('%H:%M:%S.%f')[:-5]}00"
+    # Format timestamp of the frame (VERIFIED: exact format with microseconds + "00")
+    prediction_dict['time'] = format_frame_time(result.timestamp)
     
     # Send all data to CAN client
     for key, value in prediction_dict.items():
         if can_client and can_client.connected:
             try:
-                can_client.send_data(key=key, value=value)
+                can_client.send_data(key=source.data_key(key), value=value)
             except Exception as e:
                 logger.debug(f'CAN data send error for {key}: {e}')
+
+    return source.osd_cache.get(result, ctx.overlay_parts)
+
+
+def resolve_probe_context(u_data):
+    """
+    ProbeContext for the probe's user data
+
+    :param u_data: ProbeContext, or the app context (Gst.Structure) for probes attached
+                   the old way; its ProbeContext is resolved on the first frame and kept
+    :return: ProbeContext
+    """
+    if isinstance(u_data, ProbeContext):
+        return u_data
+    ctx = _resolved_contexts.get(id(u_data))
+    if ctx is None:
+        ctx = ProbeContext.from_app_context(u_data)
+        _resolved_contexts[id(u_data)] = ctx
+    return ctx
+
+
+def nozzlenet_src_pad_buffer_probe(pad, info, u_data):
+    """
+    Nozzlenet buffer probe - THE CORE DETECTION PROCESSING FUNCTION
+    
+    This probe is attached to the nozzlenet inference engine output pad.
+    It runs on the GStreamer streaming thread for every batch, so it only
+    does what needs the buffer and hands the rest to the worker.
+    
+    Processing Flow:
+    1. Get GStreamer buffer and batch metadata
+    2. Update FPS counter
+    3. For every frame (camera) in the batch:
+       a. Acquire display metadata for OSD (2 labels)
+       b. Filter unwanted detections, set border colors and summarise the
+          frame in a FrameResult (extract_frame_result)
+       c. Post the FrameResult to the NozzlenetWorker, which runs the
+          camera's state machine, CAN and CSV data (process_frame_result);
+          without a worker this runs inline
+       d. Set the OSD texts (from the latest frame of this camera the worker
+          processed) and add display metadata to frame
+    
+    :param pad: GStreamer pad
+    :param info: Probe info containing buffer
+    :param u_data: ProbeContext (or the app context Gst.Structure)
+    :return: Gst.PadProbeReturn.OK
+    """
+    try:
+        ctx = u_data if type(u_data) is ProbeContext else resolve_probe_context(u_data)
+    except Exception:
+        # Fallback if app_context not available
+        sys.stderr.write("Warning: app_context not available in probe\n")
+        return Gst.PadProbeReturn.OK
+    
+    # Get GStreamer buffer
+    gst_buffer = info.get_buffer()
+    if not gst_buffer:
+        sys.stderr.write('Unable to get pgie src pad buffer\n')
+        return Gst.PadProbeReturn.OK
+    
+    # Update FPS counter (once per batch, so it counts frames per camera)
+    fps_count = ctx.fps_counter.get_fps() if ctx.fps_counter else None
+    
+    # Get batch metadata
+    batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
+    if not batch_meta:
+        return Gst.PadProbeReturn.OK
+    
+    pts = gst_buffer.pts
+    class_table = ctx.class_table
+    sources = ctx.sources
+    worker = ctx.worker
+
+    # One frame per camera in the batch
+    l_frame = batch_meta.frame_meta_list
+    while l_frame is not None:
+        try:
+            frame_meta = pyds.NvDsFrameMeta.cast(l_frame.data)
+        except StopIteration:
+            break
+
+        # Acquire display metadata for OSD
+        display_meta = pyds.nvds_acquire_display_meta_from_pool(batch_meta)
+        if not display_meta:
+            break
+
+        result = extract_frame_result(frame_meta, class_table, fps_count, pts)
+
+        if worker is not None:
+            worker.post(result)
+            # OSD shows the latest frame of this camera the worker finished
+            texts = sources.get(result.source_id).osd_cache.texts
+        else:
+            texts = process_frame_result(result, ctx)
+
+        set_osd_texts(display_meta, texts[0], texts[1])
+
+        # Add display metadata to frame
+        pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
+
+        try:
+            l_frame = l_frame.next
+        except StopIteration:
+            break
     
-    return Gst.PadProbeReturn.OK
\ No newline at end of file
+    return Gst.PadProbeReturn.OK
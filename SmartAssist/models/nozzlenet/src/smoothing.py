@@ -0,0 +1,108 @@
+"""
+Nozzlenet Confidence Smoothing
+Per-class exponential moving average of detection confidence with hysteresis
+
+A single frame with a detection is enough to hand a new status to the state
+machine, so one spurious detection can start a state change and a new CAN value.
+The ConfidenceFilter keeps one smoothed confidence per class (0.0 in frames
+without the class). A class turns on when its smoothed confidence reaches
+on_threshold and only turns off again below off_threshold, and the nozzle status
+passed on is the strongest nozzle class that is on.
+
+Each update is a fixed number of multiply-adds over the detection classes, so
+memory and time per frame are constant.
+"""
+import math
+
+from .probe_context import ACTION_OBJECT_STATUS, DETECTION_CLASSES
+
+HALF_LIFE_FRAMES = 'frames'
+HALF_LIFE_SECONDS = 'seconds'
+
+# Frame time assumed for the first frame when the half-life is in seconds
+NOMINAL_FRAME_TIME = 1 / 30
+
+
+class ConfidenceFilter:
+    """
+    Smoothed nozzle status and action object status of one camera
+    """
+    __slots__ = ('half_life', 'unit', 'on_threshold', 'off_threshold', 'frame_alpha',
+                 'class_ids', 'statuses', 'scores', 'active', 'last_pts', 'last_frame_time')
+
+    def __init__(self, half_life=2.0, unit=HALF_LIFE_FRAMES, on_threshold=0.4, off_threshold=0.2):
+        """
+        :param half_life: Frames or seconds after which a class's old confidence counts half
+        :param unit: 'frames' or 'seconds' (seconds use the buffer PTS)
+        :param on_threshold: Smoothed confidence at which a class turns on
+        :param off_threshold: Smoothed confidence below which it turns off again
+        """
+        if unit not in (HALF_LIFE_FRAMES, HALF_LIFE_SECONDS):
+            raise ValueError(f'Unknown half-life unit: {unit}')
+        if half_life <= 0:
+            raise ValueError(f'Half-life must be positive: {half_life}')
+        if off_threshold > on_threshold:
+            raise ValueError(f'off_threshold {off_threshold} is above on_threshold {on_threshold}')
+        self.half_life = half_life
+        self.unit = unit
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.frame_alpha = 1.0 - 0.5 ** (1.0 / half_life)
+
+        self.class_ids = tuple(sorted(DETECTION_CLASSES))
+        self.statuses = tuple(DETECTION_CLASSES[class_id][1] for class_id in self.class_ids)
+        self.reset()
+
+    def reset(self):
+        """Forget all smoothed confidences"""
+        self.scores = [0.0] * len(self.class_ids)
+        self.active = [False] * len(self.class_ids)
+        self.last_pts = None
+        self.last_frame_time = NOMINAL_FRAME_TIME
+
+    def _alpha(self, pts):
+        if self.unit == HALF_LIFE_FRAMES:
+            return self.frame_alpha
+        if pts is not None and self.last_pts is not None and pts > self.last_pts:
+            self.last_frame_time = (pts - self.last_pts) / 1e9
+        self.last_pts = pts
+        return 1.0 - math.exp(-math.log(2) * self.last_frame_time / self.half_life)
+
+    def update(self, class_confidences, pts=None):
+        """
+        Add one frame
+
+        :param class_confidences: Highest confidence per class_id in the frame (FrameResult.class_confidences)
+        :param pts: Buffer PTS in nanoseconds, used when the half-life is in seconds
+        :return: Tuple (nozzle status or None, action object status or None)
+        """
+        alpha = self._alpha(pts)
+        scores = self.scores
+        active = self.active
+        n_confidences = len(class_confidences)
+        nozzle_status = None
+        nozzle_score = 0.0
+        action_object = None
+
+        for i, class_id in enumerate(self.class_ids):
+            confidence = class_confidences[class_id] if class_id < n_confidences else 0.0
+            score = scores[i] + alpha * (confidence - scores[i])
+            scores[i] = score
+            if active[i]:
+                on = active[i] = score >= self.off_threshold
+            else:
+                on = active[i] = score >= self.on_threshold
+            if not on:
+                continue
+            status = self.statuses[i]
+            if status is None:
+                action_object = ACTION_OBJECT_STATUS
+            elif score > nozzle_score:
+                nozzle_status = status
+                nozzle_score = score
+
+        return nozzle_status, action_object
+
+    def score(self, class_id):
+        """Smoothed confidence of a class"""
+        return self.scores[self.class_ids.index(class_id)]
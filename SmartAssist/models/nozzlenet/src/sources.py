@@ -0,0 +1,134 @@
+"""
+Nozzlenet Sources
+Per-camera state for batched nozzlenet inference
+
+nvstreammux / nvinfer can batch several nozzle cameras into one inference call.
+The probe then gets one NvDsFrameMeta per camera in the same buffer, told apart by
+source_id. Every source gets its own state machine, confidence filter, OSD text
+cache and slot in the 1F7 nozzle byte. The fan request byte is shared, so it carries the highest fan speed
+any camera asks for.
+"""
+import threading
+
+from .probe_context import OsdTextCache
+from .smoothing import ConfidenceFilter
+from .state_machine import SmartStateMachine
+
+
+class NozzleSource:
+    """
+    State of one nozzle camera in the nozzlenet batch
+    """
+    __slots__ = ('source_id', 'name', 'state_machine', 'nozzle_shift', 'nozzle_mask', 'osd_cache', 'primary',
+                 'smoother')
+
+    def __init__(self, source_id, name, state_machine, nozzle_shift=0, nozzle_mask=0x0F,
+                 osd_refresh_frames=15, primary=False, smoother=None):
+        """
+        :param source_id: source_id of the camera's frames in the batch
+        :param name: Camera name, prefixes its CSV data keys unless it is the primary source
+        :param state_machine: SmartStateMachine of this camera
+        :param nozzle_shift: First bit of the camera's nozzle state in the 1F7 nozzle byte
+        :param nozzle_mask: Mask of the nozzle state before shifting
+        :param osd_refresh_frames: See OsdTextCache
+        :param primary: The primary source sends FPS and unprefixed CSV data, as the single camera did
+        :param smoother: ConfidenceFilter for the state machine input, None to use the raw detections
+        """
+        self.source_id = source_id
+        self.name = name
+        self.state_machine = state_machine
+        self.nozzle_shift = nozzle_shift
+        self.nozzle_mask = nozzle_mask
+        self.osd_cache = OsdTextCache(osd_refresh_frames)
+        self.primary = primary
+        self.smoother = smoother
+
+    def nozzle_update(self):
+        """
+        CAN byte update for this camera's nozzle state
+
+        :return: (value, mask) for an update_bits operation on nozzle_byte
+        """
+        mask = self.nozzle_mask << self.nozzle_shift
+        return (self.state_machine.nozzle_state << self.nozzle_shift) & mask, mask
+
+    def data_key(self, key):
+        """CSV data key for this camera"""
+        return key if self.primary else f'{self.name}_{key}'
+
+
+class NozzleSources:
+    """
+    NozzleSource per source_id, created on the first frame of a camera
+
+    Configured sources take their name and CAN slot from the sources section of
+    nozzlenet_config.yaml. A source that is not configured still gets a state
+    machine, but no CAN slot (nozzle_mask 0), so it cannot overwrite another camera.
+    """
+
+    def __init__(self, settings=None, state_machine=None, state_machine_factory=SmartStateMachine,
+                 osd_refresh_frames=15, logger=None, smoothing=None):
+        """
+        :param settings: {source_id: {'name', 'nozzle_shift', 'nozzle_mask'}} (default: source 0 only)
+        :param state_machine: Existing state machine to use for the primary source (e.g. app context 'state_machine')
+        :param state_machine_factory: Callable creating the state machine of a new source
+        :param osd_refresh_frames: See OsdTextCache
+        :param logger: Logger for new sources
+        :param smoothing: ConfidenceFilter arguments for every source (see get_smoothing_settings), None disables
+        """
+        self.settings = settings or {0: {'name': 'primary_nozzle', 'nozzle_shift': 0, 'nozzle_mask': 0x0F}}
+        self.primary_id = min(self.settings)
+        self.state_machine = state_machine
+        self.state_machine_factory = state_machine_factory
+        self.osd_refresh_frames = osd_refresh_frames
+        self.logger = logger
+        self.smoothing = smoothing
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    def get(self, source_id):
+        """
+        NozzleSource of a source_id, created if needed
+
+        :param source_id: NvDsFrameMeta.source_id
+        :return: NozzleSource
+        """
+        source = self.sources.get(source_id)
+        if source is None:
+            with self.lock:
+                source = self.sources.get(source_id)
+                if source is None:
+                    source = self._create(source_id)
+                    self.sources[source_id] = source
+        return source
+
+    def _create(self, source_id):
+        primary = source_id == self.primary_id
+        settings = self.settings.get(source_id)
+        if settings is None:
+            settings = {'name': f'source_{source_id}', 'nozzle_shift': 0, 'nozzle_mask': 0}
+            self._log(f'Nozzlenet source {source_id} is not configured, it gets no CAN nozzle slot')
+
+        if primary and self.state_machine is not None:
+            state_machine = self.state_machine
+        else:
+            state_machine = self.state_machine_factory()
+
+        self._log(f"Nozzlenet source {source_id} ({settings['name']}): nozzle bits "
+                  f"{settings['nozzle_mask'] << settings['nozzle_shift']:#04x}")
+        return NozzleSource(source_id, settings['name'], state_machine,
+                            nozzle_shift=settings['nozzle_shift'],
+                            nozzle_mask=settings['nozzle_mask'],
+                            osd_refresh_frames=self.osd_refresh_frames,
+                            primary=primary,
+                            smoother=ConfidenceFilter(**self.smoothing) if self.smoothing else None)
+
+    def fan_request(self):
+        """Highest fan speed requested by any camera"""
+        return max((s.state_machine.fan_speed for s in list(self.sources.values())), default=0)
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
@@ -9,185 +9,111 @@ This is the SmartStateMachine used by the nozzlenet probe to control:
 
 VERIFIED: Exact functionality from pipeline/can_state_machine.py
 But for module consistency, we provide it here as well.
+
+History is kept in fixed-size ring buffers with running per-status counts over
+the activation and deactivation windows, so memory and the cost of a call stay
+the same however long the machine runs. Times come from an injectable monotonic
+clock (time.monotonic by default).
 """
-from datetime import datetime
+import time
 
+# Time a status must be seen before it is acted on / lost before it is dropped (seconds),
+# as in pipeline/can_state_machine.py
+TIME_TO_ACTIVATE = 0.3
+TIME_TO_DEACTIVATE = 0.6
 
-class SmartStateMachine:
+# Entries kept per history; at 30 FPS this covers a little over 2 s
+HISTORY_SIZE = 64
+
+
+class WindowedHistory:
     """
-    State machine for managing nozzle and fan states based on detection results
-    
-    States:
-    - IDLE: No detection (nozzle_state=0, fan_speed=0)
-    - NOZZLE_CLEAR: Clear nozzle detected (nozzle_state=1, fan_speed=2)
-    - NOZZLE_BLOCKED: Blocked nozzle detected (nozzle_state=2, fan_speed=8)
-    - NOZZLE_CHECK: Check nozzle detected (nozzle_state=3, fan_speed=5)
-    - GRAVEL_DETECTED: Gravel detected (nozzle_state=4, fan_speed varies)
-    
-    VERIFIED: Exact from original can/state_machine.py
+    Fixed-size ring buffer of (timestamp, status) with running counts per time window
+
+    Every window keeps the index of its oldest entry and a count per status. Adding
+    an entry counts it in every window and moves each window's start past entries
+    that have become too old, so a count lookup is O(1) and an update is amortised
+    O(1). Entries overwritten by the ring buffer leave the windows as well.
     """
-    
-    def __init__(self):
-        """Initialize state machine with default values"""
-        self.nozzle_state = 0
-        self.fan_speed = 0
-        self.current_state = 'IDLE'
-        self.current_status = 'N/A'
-        self.time_difference = 0
-        self.ao_status = 'N/A'
-        self.ao_difference = 0
-        
-        # Timestamps
-        self.last_nozzle_update = None
-        self.last_ao_update = None
-        
-        # State history
-        self.nozzle_history = []
-        self.ao_history = []
-    
-    def status_send(self, recieved_ns=None, recieved_aos=None):
-        """
-        Update state machine based on received statuses
-        
-        This is called from the nozzlenet probe for each frame with detections.
-        
-        :param recieved_ns: Nozzle status ('clear', 'blocked', 'check', 'gravel')
-        :param recieved_aos: Action object status ('true' or None)
-        
-        VERIFIED: Exact logic from original
-        """
-        now = datetime.now()
-        
-        # Update nozzle state
-        if recieved_ns:
-            if recieved_ns == 'clear':
-                self.nozzle_state = 1
-            elif recieved_ns == 'blocked':
-                self.nozzle_state = 2
-            elif recieved_ns == 'check':
-                self.nozzle_state = 3
-            elif recieved_ns == 'gravel':
-                self.nozzle_state = 4
-            
-            self.current_status = recieved_ns
-            
-            # Calculate time difference since last update
-            if self.last_nozzle_update:
-                self.time_difference = (now - self.last_nozzle_update).total_seconds()
-            self.last_nozzle_update = now
-            
-            # Add to history
-            self.nozzle_history.append({
-                'status': recieved_ns,
-                'timestamp': now,
-                'state': self.nozzle_state
-            })
-        
-        # Update action object state
-        if recieved_aos:
-            self.ao_status = recieved_aos
-            
-            # Calculate time difference since last update
-            if self.last_ao_update:
-                self.ao_difference = (now - self.last_ao_update).total_seconds()
-            self.last_ao_update = now
-            
-            # Add to history
-            self.ao_history.append({
-                'status': recieved_aos,
-                'timestamp': now
-            })
-        
-        # Update fan speed based on conditions
-        self._update_fan_speed()
-        
-        # Update overall state
-        self._update_current_state()
-    
-    def _update_fan_speed(self):
-        """
-        Update fan speed based on current conditions
-        
-        Fan speed mapping - VERIFIED:
-        - nozzle_state=2 (blocked): fan_speed=8 (high)
-        - nozzle_state=3 (check): fan_speed=5 (medium)
-        - nozzle_state=1 (clear): fan_speed=2 (low)
-        - else: fan_speed=0 (off)
-        """
-        if self.nozzle_state == 2:  # blocked
-            self.fan_speed = 8  # High speed
-        elif self.nozzle_state == 3:  # check
-            self.fan_speed = 5  # Medium speed
-        elif self.nozzle_state == 1:  # clear
-            self.fan_speed = 2  # Low speed
-        else:
-            self.fan_speed = 0  # Off
-    
-    def _update_current_state(self):
-        """
-        Update current state description based on nozzle_state
-        
-        VERIFIED: Exact state names from original
-        """
-        if self.nozzle_state == 0:
-            self.current_state = 'IDLE'
-        elif self.nozzle_state == 1:
-            self.current_state = 'NOZZLE_CLEAR'
-        elif self.nozzle_state == 2:
-            self.current_state = 'NOZZLE_BLOCKED'
-        elif self.nozzle_state == 3:
-            self.current_state = 'NOZZLE_CHECK'
-        elif self.nozzle_state == 4:
-            self.current_state = 'GRAVEL_DETECTED'
-    
-    def get_current_state(self):
+
+    def __init__(self, windows, size=HISTORY_SIZE):
         """
-        Get current state as string
-        
-        :return: Current state name (e.g., 'NOZZLE_BLOCKED')
-        
-        VERIFIED: Used by probe to get state for CSV logging
+        :param windows: Window lengths in seconds
+        :param size: Number of entries kept
         """
-        return self.current_state
-    
-    def get_state_dict(self):
+        self.windows = tuple(windows)
+        self.size = size
+        self.timestamps = [0.0] * size
+        self.statuses = [None] * size
+        self.total = 0                                  # entries ever added
+        self.starts = [0] * len(self.windows)           # oldest entry (as a total index) per window
+        self.counts = [{} for _ in self.windows]
+
+    def __len__(self):
+        return min(self.total, self.size)
+
+    def __iter__(self):
+        """Entries still in the buffer as (timestamp, status), oldest first"""
+        for index in range(max(0, self.total - self.size), self.total):
+            slot = index % self.size
+            yield self.timestamps[slot], self.statuses[slot]
+
+    def append(self, timestamp, status):
         """
-        Get complete state as dictionary
-        
-        :return: Dictionary with all state values
-        
-        VERIFIED: Complete state export
+        Add an entry and move the windows on
+
+        :param timestamp: Clock time of the entry
+        :param status: Status to count (None counts as a frame without the status)
         """
-        return {
-            'nozzle_state': self.nozzle_state,
-            'fan_speed': self.fan_speed,
-            'current_state': self.current_state,
-            'current_status': self.current_status,
-            'time_difference': self.time_difference,
-            'ao_status': self.ao_status,
-            'ao_difference': self.ao_difference
-        }
-    
-    def reset(self):
+        size = self.size
+        total = self.total
+        slot = total % size
+        timestamps = self.timestamps
+        statuses = self.statuses
+        starts = self.starts
+
+        # The slot's previous entry leaves every window that still holds it
+        overwritten = total - size
+        if overwritten >= 0:
+            old_status = statuses[slot]
+            for i, start in enumerate(starts):
+                if start <= overwritten:
+                    self.counts[i][old_status] -= 1
+                    starts[i] = overwritten + 1
+
+        timestamps[slot] = timestamp
+        statuses[slot] = status
+        total += 1
+        self.total = total
+
+        for i, window in enumerate(self.windows):
+            counts = self.counts[i]
+            counts[status] = counts.get(status, 0) + 1
+            start = starts[i]
+            limit = timestamp - window
+            while timestamps[start % size] < limit:
+                counts[statuses[start % size]] -= 1
+                start += 1
+            starts[i] = start
+
+    def count(self, status, window=0):
         """
-        Reset state machine to initial state
-        
-        Useful for testing or manual reset
+        Number of entries with a status in a window
+
+        :param status: Status to count
+        :param window: Index of the window (in the order given to the constructor)
+        :return: Count
         """
-        self.__init__()"""
-Nozzlenet State Machine
-Manages nozzle and fan states based on detection results
+        return self.counts[window].get(status, 0)
 
-This is the SmartStateMachine used by the nozzlenet probe to control:
-- Nozzle state (clear/blocked/check/gravel)
-- Fan speed (0-8)
-- Action object detection
+    def window_length(self, window=0):
+        """Number of entries in a window"""
+        return self.total - self.starts[window]
 
-VERIFIED: Exact functionality from pipeline/can_state_machine.py
-Location: This should be imported as: from ...can.state_machine import SmartStateMachine
-But for module consistency, we provide it here as well.
-"""
-from datetime import datetime
+    def clear(self):
+        self.total = 0
+        self.starts = [0] * len(self.windows)
+        self.counts = [{} for _ in self.windows]
 
 
 class SmartStateMachine:
@@ -204,8 +130,21 @@ class SmartStateMachine:
     VERIFIED: Exact from original can/state_machine.py
     """
     
-    def __init__(self):
-        """Initialize state machine with default values"""
+    def __init__(self, clock=time.monotonic, history_size=HISTORY_SIZE,
+                 time_to_activate=TIME_TO_ACTIVATE, time_to_deactivate=TIME_TO_DEACTIVATE):
+        """
+        Initialize state machine with default values
+
+        :param clock: Function returning the current time in seconds, must not go backwards
+        :param history_size: Entries kept in each history ring buffer
+        :param time_to_activate: Length of the activation window (seconds)
+        :param time_to_deactivate: Length of the deactivation window (seconds)
+        """
+        self.clock = clock
+        self.history_size = history_size
+        self.time_to_activate = time_to_activate
+        self.time_to_deactivate = time_to_deactivate
+
         self.nozzle_state = 0
         self.fan_speed = 0
         self.current_state = 'IDLE'
@@ -218,9 +157,11 @@ class SmartStateMachine:
         self.last_nozzle_update = None
         self.last_ao_update = None
         
-        # State history
-        self.nozzle_history = []
-        self.ao_history = []
+        # State history: one entry per call (None when the status was not seen),
+        # counted over the activation (index 0) and deactivation (index 1) windows
+        windows = (time_to_activate, time_to_deactivate)
+        self.nozzle_history = WindowedHistory(windows, history_size)
+        self.ao_history = WindowedHistory(windows, history_size)
     
     def status_send(self, recieved_ns=None, recieved_aos=None):
         """
@@ -233,7 +174,7 @@ class SmartStateMachine:
         
         VERIFIED: Exact logic from original
         """
-        now = datetime.now()
+        now = self.clock()
         
         # Update nozzle state
         if recieved_ns:
@@ -249,31 +190,22 @@ class SmartStateMachine:
             self.current_status = recieved_ns
             
             # Calculate time difference since last update
-            if self.last_nozzle_update:
-                self.time_difference = (now - self.last_nozzle_update).total_seconds()
+            if self.last_nozzle_update is not None:
+                self.time_difference = now - self.last_nozzle_update
             self.last_nozzle_update = now
-            
-            # Add to history
-            self.nozzle_history.append({
-                'status': recieved_ns,
-                'timestamp': now,
-                'state': self.nozzle_state
-            })
+        
+        self.nozzle_history.append(now, recieved_ns or None)
         
         # Update action object state
         if recieved_aos:
             self.ao_status = recieved_aos
             
             # Calculate time difference since last update
-            if self.last_ao_update:
-                self.ao_difference = (now - self.last_ao_update).total_seconds()
+            if self.last_ao_update is not None:
+                self.ao_difference = now - self.last_ao_update
             self.last_ao_update = now
-            
-            # Add to history
-            self.ao_history.append({
-                'status': recieved_aos,
-                'timestamp': now
-            })
+        
+        self.ao_history.append(now, recieved_aos or None)
         
         # Update fan speed based on conditions
         self._update_fan_speed()
@@ -327,6 +259,17 @@ class SmartStateMachine:
         """
         return self.current_state
     
+    def get_window_counts(self, status, window=0):
+        """
+        How often a status was seen in the activation or deactivation window
+
+        :param status: Nozzle status ('clear', 'blocked', ...) or 'true' for the action object
+        :param window: 0 for the activation window, 1 for the deactivation window
+        :return: Tuple (frames with the status, frames in the window)
+        """
+        history = self.ao_history if status == 'true' else self.nozzle_history
+        return history.count(status, window), history.window_length(window)
+
     def get_state_dict(self):
         """
         Get complete state as dictionary
@@ -349,6 +292,6 @@ class SmartStateMachine:
         """
         Reset state machine to initial state
         
-        Useful for testing or manual reset
+        Useful for testing or manual reset. Keeps the clock and window settings.
         """
-        self.__init__()
\ No newline at end of file
+        self.__init__(self.clock, self.history_size, self.time_to_activate, self.time_to_deactivate)
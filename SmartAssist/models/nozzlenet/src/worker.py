@@ -0,0 +1,184 @@
+"""
+Nozzlenet Post-Processing Worker
+Moves everything that does not need the GStreamer buffer off the streaming thread
+
+The buffer probe only walks the detection metadata and posts a small immutable
+FrameResult. The worker thread runs the state machine, CAN output, CSV data and
+OSD text building, so a slow CAN server can no longer stall inference.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+
+# One frame's detections, as extracted by the probe
+FrameResult = namedtuple('FrameResult', [
+    'frame_number',    # NvDsFrameMeta.frame_num
+    'source_id',       # NvDsFrameMeta.source_id, the camera within the batch
+    'pts',             # buffer PTS in nanoseconds
+    'timestamp',       # wall clock time the frame was probed (time.time())
+    'fps',             # FPS counter value, None until the first 5 s window is complete
+    'num_detections',  # objects in the frame before filtering
+    'nozzle_status',   # 'clear', 'blocked', 'check', 'gravel' or None
+    'action_object',   # 'true' or None
+    'class_flags',     # bit (1 << class_id) set for every class detected in the frame
+    'confidence',      # highest detection confidence, 0.0 without detections
+    'class_confidences',  # highest confidence per class_id, 0.0 for classes not detected
+])
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+
+class NozzlenetWorker:
+    """
+    Bounded single consumer queue plus the thread that processes FrameResults
+
+    When the queue is full, drop_oldest discards the oldest queued frame (the state
+    machine always sees the newest data) and drop_newest discards the frame being
+    posted. The probe never blocks either way.
+
+    The handler's return value for the latest processed frame is kept in last_output
+    so the probe can reuse it (e.g. the prepared OSD text).
+    """
+
+    def __init__(self, handler, queue_size=8, drop_policy=DROP_OLDEST, stats_interval=60.0, logger=None):
+        """
+        :param handler: Callable taking one FrameResult, run on the worker thread
+        :param queue_size: Maximum number of frames waiting for the worker
+        :param drop_policy: 'drop_oldest' or 'drop_newest'
+        :param stats_interval: Seconds between queue statistics log lines (0 disables)
+        :param logger: Logger for statistics and handler errors (print if None)
+        """
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f'Unknown drop policy: {drop_policy}')
+        self.handler = handler
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.stats_interval = stats_interval
+        self.logger = logger
+
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.last_output = None
+
+        # Metrics
+        self.frames_posted = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.max_depth = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.process_time_total = 0.0
+        self.process_time_max = 0.0
+
+    def start(self):
+        """Start the worker thread"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='nozzlenet_worker', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """
+        Stop the worker thread after it finished the frames already queued
+
+        :param timeout: Seconds to wait for the thread
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+        self._log(f'Nozzlenet worker stopped: {self.format_stats()}')
+
+    def post(self, result):
+        """
+        Queue one frame for the worker, called from the streaming thread
+
+        :param result: FrameResult
+        :return: True if the frame was queued, False if it was dropped
+        """
+        now = time.monotonic()
+        with self.condition:
+            self.frames_posted += 1
+            if len(self.queue) >= self.queue_size:
+                self.frames_dropped += 1
+                if self.drop_policy == DROP_NEWEST:
+                    return False
+                self.queue.popleft()
+            self.queue.append((now, result))
+            depth = len(self.queue)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self.condition.notify()
+        return True
+
+    def depth(self):
+        """Number of frames currently waiting"""
+        return len(self.queue)
+
+    def _run(self):
+        last_stats = time.monotonic()
+        while True:
+            with self.condition:
+                while not self.queue and self.running:
+                    self.condition.wait(1.0)
+                if not self.queue:
+                    break
+                posted_at, result = self.queue.popleft()
+
+            started = time.monotonic()
+            try:
+                self.last_output = self.handler(result)
+            except Exception as e:
+                self._log(f'Nozzlenet worker error on frame {result.frame_number}: {e}')
+            finished = time.monotonic()
+
+            wait = started - posted_at
+            elapsed = finished - started
+            self.frames_processed += 1
+            self.queue_wait_total += wait
+            self.queue_wait_max = max(self.queue_wait_max, wait)
+            self.process_time_total += elapsed
+            self.process_time_max = max(self.process_time_max, elapsed)
+
+            if self.stats_interval and finished - last_stats >= self.stats_interval:
+                last_stats = finished
+                self._log(f'Nozzlenet worker: {self.format_stats()}')
+
+    def stats(self):
+        """
+        Queue and processing metrics
+
+        :return: Dictionary of counters and latencies in milliseconds
+        """
+        processed = self.frames_processed or 1
+        return {
+            'posted': self.frames_posted,
+            'processed': self.frames_processed,
+            'dropped': self.frames_dropped,
+            'depth': len(self.queue),
+            'max_depth': self.max_depth,
+            'queue_wait_avg_ms': 1000 * self.queue_wait_total / processed,
+            'queue_wait_max_ms': 1000 * self.queue_wait_max,
+            'process_avg_ms': 1000 * self.process_time_total / processed,
+            'process_max_ms': 1000 * self.process_time_max,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"{s['processed']}/{s['posted']} frames processed, {s['dropped']} dropped, "
+                f"depth {s['depth']} (max {s['max_depth']}), "
+                f"wait avg {s['queue_wait_avg_ms']:.1f} ms / max {s['queue_wait_max_ms']:.1f} ms, "
+                f"processing avg {s['process_avg_ms']:.1f} ms / max {s['process_max_ms']:.1f} ms")
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
@@ -133,26 +133,20 @@ class CANClient:
                     # Send request
                     self.socket.send(json.dumps(request).encode())
                     
-                    # Wait for response with timeout
-                    ready = select.select([self.socket], [], [], 2.0)
-                    if ready[0]:
-                        response_data = self.socket.recv(4096)
-                        if response_data:
-                            response = json.loads(response_data.decode('utf-8'))
-                            self.retry_count = 0
-                            return response
-                        else:
-                            # Connection closed by server
-                            self.connected = False
-                            self.socket.close()
-                            self.socket = None
-                            if attempt < max_retries - 1:
-                                time.sleep(0.5)
-                                continue
-                    else:
-                        # Timeout waiting for response
-                        return None
-                        
+                    # Wait for the complete response with timeout
+                    response = self._receive_response(timeout=2.0)
+                    self.retry_count = 0
+                    return response
+
+            except socket.timeout:
+                # Timeout waiting for response. A late reply would be read as the
+                # response to the next request, so the connection starts over.
+                self.connected = False
+                if self.socket:
+                    self.socket.close()
+                    self.socket = None
+                return None
+
             except (socket.error, json.JSONDecodeError, BrokenPipeError) as e:
                 self.connected = False
                 if self.socket:
@@ -167,7 +161,34 @@ class CANClient:
                     
         self.retry_count += 1
         return None
-    
+
+    def _receive_response(self, timeout):
+        """
+        Read one JSON response, however many recv calls it takes
+
+        The server sends one JSON object per request without a delimiter, so the
+        response is complete once it parses.
+
+        :param timeout: Seconds to wait for the complete response
+        :return: Response dictionary
+        :raises socket.timeout: If the response did not complete within the timeout
+        :raises ConnectionResetError: If the server closed the connection
+        """
+        deadline = time.monotonic() + timeout
+        response_data = b''
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.socket], [], [], remaining)[0]:
+                raise socket.timeout(f'No complete response within {timeout} s')
+            chunk = self.socket.recv(65536)
+            if not chunk:
+                raise ConnectionResetError('Connection closed by server')
+            response_data += chunk
+            try:
+                return json.loads(response_data.decode('utf-8'))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+
     def get_client_info(self):
         """Get client information"""
         return {
@@ -180,6 +201,10 @@ class CANClient:
     def get_all_data(self):
         """Get all CAN data from server"""
         return self._send_request({'command': 'get_all'})
+
+    def get_data(self, keys):
+        """Get some CAN data from server, only the given keys are sent back"""
+        return self._send_request({'command': 'get_data', 'keys': list(keys)})
         
     def send_data(self, key, value):
         """Send data to the server"""
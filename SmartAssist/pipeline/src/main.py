@@ -189,6 +189,14 @@ def main():
         config_obj = Configuration()
         app_context.set_value('configuration', config_obj)
         
+        # Start CAN client (if enabled), before the pipeline: the probe contexts resolve it when the bins are built
+        can_client = None
+        if app_context.get_value('config').enable_can:
+            logger.info('Starting CAN client...')
+            can_client = CANClient(app_context)
+            can_client.start()
+            app_context.set_value('can_client', can_client)
+        
         # Build pipeline
         logger.info('Building GStreamer pipeline...')
         pipeline = build_pipeline(app_context)
@@ -216,13 +224,6 @@ def main():
         override_thread = start_manual_override_thread(app_context)
         socket_thread = start_socket_thread(app_context)
         
-        # Start CAN client (if enabled)
-        can_client = None
-        if app_context.get_value('config').enable_can:
-            logger.info('Starting CAN client...')
-            can_client = CANClient(app_context)
-            can_client.start()
-        
         # Start pipeline
         logger.info('Starting pipeline...')
         ret = pipeline.set_state(Gst.State.PLAYING)
@@ -249,6 +250,15 @@ def main():
         # Stop pipeline
         pipeline.set_state(Gst.State.NULL)
         
+        # Stop nozzlenet post-processing worker (finishes the queued frames)
+        nozzlenet_worker = app_context.get_value('nozzlenet_worker')
+        if nozzlenet_worker:
+            nozzlenet_worker.stop()
+        
+        csi_rate_controller = app_context.get_value('csi_rate_controller')
+        if csi_rate_controller:
+            logger.info(f'CSI rate control: {csi_rate_controller.stats()}')
+        
         # Stop threads
         if fps_thread:
             fps_thread.join(timeout=2)
@@ -271,6 +281,16 @@ def main():
         notify_systemd(f'STATUS=Fatal error: {e}', app_context)
         return 1
 
+    finally:
+        # Stop CSI worker processes and release the shared mask slots, also when the
+        # pipeline failed to start after the CSI bin was built
+        csi_worker_pool = app_context.get_value('csi_worker_pool')
+        if csi_worker_pool:
+            csi_worker_pool.stop()
+        csi_speed_reader = app_context.get_value('csi_speed_reader')
+        if csi_speed_reader:
+            csi_speed_reader.stop()
+
 
 if __name__ == '__main__':
     exit(main())
\ No newline at end of file
@@ -40,9 +40,9 @@ def overlay_parts_fetcher(app_context):
                         pm_data = result['pm_values']
                         pm_values[f's{sensor_id}_pm10'] = pm_data.get('pm10', 'N/A')
                 
-                # Update overlay parts dictionary
+                # Update overlay parts dictionary in place, the nozzlenet probe context holds it
                 overlay_parts = app_context.get_value('overlay_parts')
-                if overlay_parts:
+                if overlay_parts is not None:
                     overlay_parts.update(pm_values)
                     app_context.set_value('overlay_parts', overlay_parts)
             
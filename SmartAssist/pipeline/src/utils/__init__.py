@@ -11,7 +11,7 @@ from .paths import (
 )
 from .systemd import notify_systemd, load_latest_init_status
 from .config import Configuration
-from .helpers import modify_deepstream_config_files, demuxer_pad_added
+from .helpers import modify_deepstream_config_files, remove_deepstream_config_option, demuxer_pad_added
 
 __all__ = [
     'REPO_ROOT',
@@ -23,5 +23,6 @@ __all__ = [
     'load_latest_init_status',
     'Configuration',
     'modify_deepstream_config_files',
+    'remove_deepstream_config_option',
     'demuxer_pad_added'
 ]
\ No newline at end of file
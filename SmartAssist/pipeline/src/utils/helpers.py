@@ -42,6 +42,33 @@ def modify_deepstream_config_files(input_file, output_file, section, key, value,
         config.write(f)
 
 
+def remove_deepstream_config_option(input_file, output_file, section, key, app_context=None):
+    """
+    Remove a key from a DeepStream config file (INI format)
+    The section is removed as well when the key was its last option
+
+    :param input_file: Path to input config file
+    :param output_file: Path to output config file (can be same as input)
+    :param section: Config section name (e.g., 'property', 'class-attrs-1')
+    :param key: Config key to remove
+    :param app_context: Application context for logging
+    """
+    if app_context:
+        logger = app_context.get_value('app_context_v2').logger
+        logger.debug(f'Modifying {input_file}: removing [{section}] {key}')
+
+    config = configparser.ConfigParser()
+    config.read(input_file)
+
+    if config.has_section(section):
+        config.remove_option(section, key)
+        if not config.options(section):
+            config.remove_section(section)
+
+    with open(output_file, 'w') as f:
+        config.write(f)
+
+
 def demuxer_pad_added(context, pad, target_sinkpad):
     """
     Callback for dynamic pad linking when demuxer creates new pads
@@ -566,6 +566,18 @@ class CANServer:
                     'timestamp': time.time()
                 }
         
+        elif command == 'get_data':
+            # Only the requested keys, for clients polling single signals
+            keys = request_data.get('keys') or []
+            with self.data_lock:
+                data = {key: self.client_data.get(key, self.can_data.get(key)) for key in keys
+                        if key in self.client_data or key in self.can_data}
+            
+            return {
+                'data': data,
+                'timestamp': time.time()
+            }
+        
         elif command == 'send_data':
             key = request_data.get('key')
             value = request_data.get('value')
@@ -692,7 +704,7 @@ class CANServer:
                                 'message': 'Failed to register client'
                             }
                         
-                        client_socket.send(json.dumps(response).encode())
+                        client_socket.sendall(json.dumps(response).encode())
                         continue
                     
                     # Handle disconnect
@@ -705,19 +717,19 @@ class CANServer:
                             'error': 'Client must identify itself first',
                             'required_command': 'client_identification'
                         }
-                        client_socket.send(json.dumps(error_response).encode())
+                        client_socket.sendall(json.dumps(error_response).encode())
                         continue
                     
                     # Process request
                     response = self.process_request(request_data, client_name)
-                    client_socket.send(json.dumps(response).encode())
+                    client_socket.sendall(json.dumps(response).encode())
                 
                 except json.JSONDecodeError:
                     error_response = {'error': 'Invalid JSON'}
-                    client_socket.send(json.dumps(error_response).encode())
+                    client_socket.sendall(json.dumps(error_response).encode())
                 except Exception as e:
                     error_response = {'error': str(e)}
-                    client_socket.send(json.dumps(error_response).encode())
+                    client_socket.sendall(json.dumps(error_response).encode())
         
         except Exception as e:
             print(f'Client handler error: {e}')
@@ -67,11 +67,29 @@ def set_system_time(timestamp):
 
 
 def save_last_known_time():
-    """Save current time to fallback file"""
+    """
+    Save current time to fallback file
+
+    Written to a temporary file, fsynced and renamed over the old one, so a power cut
+    leaves either the previous or the new time on the card, never an empty file.
+    This service is installed from the SmartAssist tree without the legacy pipeline
+    modules, so it cannot use log_writer.DurabilityPolicy; it writes one small file
+    per sync and fsyncs it directly.
+    """
     try:
-        os.makedirs(os.path.dirname(FALLBACK_TIME_FILE), exist_ok=True)
-        with open(FALLBACK_TIME_FILE, 'w') as f:
+        directory = os.path.dirname(FALLBACK_TIME_FILE)
+        os.makedirs(directory, exist_ok=True)
+        tmp_file = FALLBACK_TIME_FILE + '.tmp'
+        with open(tmp_file, 'w') as f:
             f.write(datetime.now().isoformat())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, FALLBACK_TIME_FILE)
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
         logger.debug(f'Saved last known time to {FALLBACK_TIME_FILE}')
     except Exception as e:
         logger.error(f'Failed to save last known time: {e}')
@@ -0,0 +1,62 @@
+"""
+Shared test fixtures
+
+The model packages' __init__ modules build the GStreamer bins and import pyds. The
+modules under test only need numpy, so their source directories are registered as
+the packages csi_src and nozzlenet_src, and the tests import from those without
+running the package __init__ (the same way the tools/ scripts do). The tests run
+without DeepStream.
+"""
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+import yaml
+
+from csi_cases import csi_arguments, csi_config_from_dict
+
+SMARTASSIST_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(SMARTASSIST_ROOT)
+CSI_CONFIG = os.path.join(REPO_ROOT, 'pipeline', 'config', 'csi_config.yaml')
+
+SOURCE_PACKAGES = {
+    'csi_src': os.path.join(SMARTASSIST_ROOT, 'models', 'csi', 'src'),
+    'nozzlenet_src': os.path.join(SMARTASSIST_ROOT, 'models', 'nozzlenet', 'src'),
+}
+
+for name, path in SOURCE_PACKAGES.items():
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [path]
+        sys.modules[name] = package
+
+
+@pytest.fixture(scope='session')
+def csi_config():
+    with open(CSI_CONFIG, mode='r') as f:
+        return csi_config_from_dict(yaml.safe_load(stream=f))
+
+
+@pytest.fixture(scope='session')
+def csi_args(csi_config):
+    return csi_arguments(csi_config)
+
+
+@pytest.fixture(scope='session')
+def trapezoid_masks(csi_config):
+    """Front and rear trapezoid masks of the config, read-only"""
+    from csi_src.computation import create_filtering_masks
+    masks = dict(zip(('front', 'rear'), create_filtering_masks(csi_config=csi_config)))
+    for mask in masks.values():
+        mask.flags.writeable = False
+    return masks
+
+
+@pytest.fixture(scope='session')
+def csi_levels():
+    """Discrete CSI levels of the front and rear camera"""
+    from csi_src.constants import FRONT_CSI_LEVELS, REAR_CSI_LEVELS
+    return {'front': np.linspace(start=0.0, stop=1.0, num=FRONT_CSI_LEVELS),
+            'rear': np.linspace(start=0.0, stop=1.0, num=REAR_CSI_LEVELS)}
@@ -0,0 +1,228 @@
+"""
+Synthetic CSI cases and their golden outputs
+
+The masks are generated from parameters only (no random numbers), so the same masks
+are built on every machine and numpy version:
+    road width   - width of the road at the bottom of the frame, fraction of the frame width
+    road offset  - horizontal shift of the road centre, fraction of the frame width
+    density      - fraction of 8x8 blocks covered by garbage (on and off the road)
+    labels       - garbage labels of the blocks (foliage 1, waste 2, or both alternating)
+plus degenerate cases: no road, road outside the ROI, a single road column, full road
+with no / full garbage and garbage only off the road. Every case runs for the front
+and rear trapezoid.
+
+tests/data/csi_golden.json holds the outputs of compute_csi, create_filtering_masks
+and get_discrete_csi on these cases, and the CSI config they were recorded with.
+test_csi_golden.py compares the kernels with it; tools/benchmark_csi.py times the
+kernels on the same cases and records the file again (only for an intended CSI change).
+The CSI of compute_csi itself is not bit-identical across numpy versions: its float32
+sums use numpy's pairwise summation, whose blocking differs between releases (the file
+was recorded with numpy 2.x, numpy 1.26 differs by a few float32 ULPs). The relative
+CSI is compared within REFERENCE_RTOL, the absolute CSI (an integer sum of the garbage
+mask) exactly.
+"""
+import hashlib
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'csi_golden.json')
+
+# Relative tolerance of compute_csi against the golden relative CSI, float32 sums across numpy versions
+REFERENCE_RTOL = 1e-6
+# Relative tolerance of compute_csi_histogram against compute_csi, stated in its docstring
+HISTOGRAM_RTOL = 1e-5
+
+LEVELS = {'front': 21, 'rear': 5}
+ROAD_WIDTHS = (0.2, 0.5, 0.8, 1.0)
+ROAD_OFFSETS = (0.0, 0.25)
+GARBAGE_DENSITIES = (0.0, 0.01, 0.05, 0.2, 0.5)
+GARBAGE_LABELS = ((1,), (2,), (1, 2))
+DEGENERATE_CASES = ('no_road', 'road_outside_roi', 'single_column', 'full_road_clean',
+                    'full_road_full_garbage', 'garbage_off_road')
+DISCRETE_VALUES = np.round(np.linspace(-0.1, 1.2, 27), 6)
+BLOCK = 8
+
+
+def csi_config_from_dict(config):
+    """Flat CSI config namespace (pipeline/config/csi_config.yaml layout)"""
+    csi_config = SimpleNamespace(**config)
+    csi_config.road_model = SimpleNamespace(**config['road_model'])
+    csi_config.garbage_model = SimpleNamespace(**config['garbage_model'])
+    return csi_config
+
+
+def csi_arguments(csi_config):
+    """Keyword arguments of the CSI kernels besides the masks"""
+    return dict(
+        road_class_ids=csi_config.road_model.class_ids,
+        garbage_class_ids=csi_config.garbage_model.class_ids,
+        n_bins=csi_config.n_bins,
+        linsp_start=csi_config.linsp_start,
+        linsp_stop=csi_config.linsp_stop,
+        percentage_dirty_road=csi_config.percentage_dirty_road,
+        garbage_type_coeffs=csi_config.garbage_type_coefficients,
+        smooth=csi_config.smooth,
+        clip_csi=csi_config.clip_csi,
+    )
+
+
+def levels_of(key):
+    """Discrete CSI levels of a camera"""
+    return np.linspace(0.0, 1.0, LEVELS[key])
+
+
+# ---------------------------------------------------------------------------
+# Synthetic masks
+# ---------------------------------------------------------------------------
+
+def road_mask(shape, width, offset):
+    """Road widening from 40% of the frame height to the bottom, centred at 0.5 + offset"""
+    h, w = shape
+    rows = np.arange(h)[:, np.newaxis]
+    cols = np.arange(w)[np.newaxis, :]
+    top = int(0.4 * h)
+    progress = np.clip((rows - top) / max(h - 1 - top, 1), 0.0, 1.0)
+    half_width = 0.5 * w * width * (0.3 + 0.7 * progress)
+    centre = w * (0.5 + offset)
+    road = (np.abs(cols + 0.5 - centre) <= half_width) & (rows >= top)
+    return road.astype(np.uint8)
+
+
+def garbage_mask(shape, density, labels):
+    """Garbage on a deterministic density of 8x8 blocks, labels alternating over the blocks"""
+    h, w = shape
+    by = np.arange((h + BLOCK - 1) // BLOCK)[:, np.newaxis]
+    bx = np.arange((w + BLOCK - 1) // BLOCK)[np.newaxis, :]
+    covered = ((by * 7919 + bx * 104729) % 1000) < int(round(density * 1000))
+    label = np.array(labels, dtype=np.uint8)[(by + bx) % len(labels)]
+    blocks = np.where(covered, label, 0).astype(np.uint8)
+    return np.ascontiguousarray(blocks.repeat(BLOCK, axis=0).repeat(BLOCK, axis=1)[:h, :w])
+
+
+def degenerate_masks(name, shape, trapezoid_mask):
+    h, w = shape
+    road = np.zeros(shape, dtype=np.uint8)
+    garbage = np.zeros(shape, dtype=np.uint8)
+    if name == 'road_outside_roi':
+        rows = np.flatnonzero(trapezoid_mask.any(axis=1))
+        road[:rows.min()] = 1
+        garbage[:rows.min()] = garbage_mask((rows.min(), w), 0.2, (1, 2))
+    elif name == 'single_column':
+        road[:, w // 2] = 1
+        garbage[:, w // 2] = 2
+    elif name == 'full_road_clean':
+        road[:] = 1
+    elif name == 'full_road_full_garbage':
+        road[:] = 1
+        garbage[:] = 2
+    elif name == 'garbage_off_road':
+        road = road_mask(shape, 0.5, 0.0)
+        garbage = garbage_mask(shape, 0.5, (1, 2))
+        garbage[road != 0] = 0
+    return road, garbage
+
+
+def build_cases(shape, trapezoid_masks):
+    """[(case dict, road mask, garbage mask)] for every parameter combination and camera"""
+    cases = []
+    for key in ('front', 'rear'):
+        for width in ROAD_WIDTHS:
+            for offset in ROAD_OFFSETS:
+                road = road_mask(shape, width, offset)
+                for density in GARBAGE_DENSITIES:
+                    for labels in GARBAGE_LABELS if density else ((1,),):
+                        name = f'{key}_w{width}_o{offset}_d{density}_l{"".join(map(str, labels))}'
+                        case = dict(name=name, key=key, road_width=width, road_offset=offset,
+                                    garbage_density=density, garbage_labels=list(labels))
+                        cases.append((case, road, garbage_mask(shape, density, labels)))
+        for name in DEGENERATE_CASES:
+            road, garbage = degenerate_masks(name, shape, trapezoid_masks[key])
+            cases.append((dict(name=f'{key}_{name}', key=key), road, garbage))
+    return cases
+
+
+def setup(computation, csi_config):
+    """Trapezoid masks of the config and the cases on their shape"""
+    trapezoid_masks = dict(zip(('front', 'rear'), computation.create_filtering_masks(csi_config=csi_config)))
+    shape = trapezoid_masks['front'].shape
+    return trapezoid_masks, build_cases(shape, trapezoid_masks)
+
+
+def front_rear_pairs(cases):
+    """Indices (i, n/2 + i) of the front and rear case batched together (both cameras list the cases in order)"""
+    half = len(cases) // 2
+    return list(zip(range(half), range(half, 2 * half)))
+
+
+# ---------------------------------------------------------------------------
+# Golden file
+# ---------------------------------------------------------------------------
+
+def mask_digest(mask):
+    return dict(shape=list(mask.shape), sum=int(mask.astype(np.int64).sum()),
+                sha1=hashlib.sha1(np.ascontiguousarray(mask, dtype=np.uint8).tobytes()).hexdigest())
+
+
+def to_json_number(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def from_json_number(value):
+    return np.nan if value is None else value
+
+
+def load_golden(path=GOLDEN_PATH):
+    """Golden outputs and the CSI config they were recorded with"""
+    with open(path, mode='r') as f:
+        golden = json.load(f)
+    return golden, csi_config_from_dict(golden['config'])
+
+
+def record_golden(computation, config, path=GOLDEN_PATH):
+    """
+    Record the outputs of compute_csi, create_filtering_masks and get_discrete_csi
+
+    :param computation: CSI computation module
+    :param config: CSI config dict (pipeline/config/csi_config.yaml)
+    :param path: Golden file to write
+    :return: The golden dict written
+    """
+    csi_config = csi_config_from_dict(config)
+    trapezoid_masks, cases = setup(computation, csi_config)
+    csi_args = csi_arguments(csi_config)
+
+    golden_cases = []
+    for case, road, garbage in cases:
+        # compute_csi works in place, every frame gets copies of its masks
+        relative_csi, absolute_csi = computation.compute_csi(
+            road_mask=road.copy(), garbage_mask=garbage.copy(), trapezoid_mask=trapezoid_masks[case['key']],
+            **csi_args)
+        discrete_csi, level_index = computation.get_discrete_csi(levels=levels_of(case['key']),
+                                                                 continuous_csi=relative_csi)
+        golden_cases.append(dict(case, relative_csi=to_json_number(relative_csi),
+                                 absolute_csi=to_json_number(absolute_csi),
+                                 discrete_csi=to_json_number(discrete_csi),
+                                 level_index=None if np.isnan(relative_csi) else int(level_index)))
+
+    discrete = []
+    for n_levels in sorted(set(LEVELS.values())):
+        levels = np.linspace(0.0, 1.0, n_levels)
+        for value in DISCRETE_VALUES:
+            discrete_csi, level_index = computation.get_discrete_csi(levels=levels, continuous_csi=value)
+            discrete.append(dict(levels=n_levels, csi=float(value), discrete_csi=float(discrete_csi),
+                                 level_index=int(level_index)))
+
+    golden = dict(
+        config=config,
+        filtering_masks={key: mask_digest(mask) for key, mask in trapezoid_masks.items()},
+        discrete_csi=discrete,
+        cases=golden_cases,
+    )
+    with open(path, mode='w') as f:
+        json.dump(golden, f, indent=1)
+        f.write('\n')
+    return golden
@@ -0,0 +1,99 @@
+"""
+CANClient responses larger than one recv, against a fake CAN server on a Unix socket
+"""
+import importlib.util
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+CLIENT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'pipeline', 'src', 'can', 'client.py')
+
+_spec = importlib.util.spec_from_file_location('can_client', CLIENT_PATH)
+can_client = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(can_client)
+
+
+class FakeServer:
+    """
+    Answers every request with replies[command], sent in small pieces with pauses,
+    the way a large reply arrives over the socket. Commands without a reply get none.
+    """
+
+    def __init__(self, path, replies, piece=1000):
+        self.replies = replies
+        self.piece = piece
+        self.requests = []
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server_socket.bind(path)
+        self.server_socket.listen(1)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                connection, _ = self.server_socket.accept()
+            except OSError:
+                return
+            with connection:
+                while True:
+                    request = connection.recv(65536)
+                    if not request:
+                        break
+                    command = json.loads(request.decode())['command']
+                    self.requests.append(command)
+                    if command == 'client_identification':
+                        connection.sendall(json.dumps({'status': 'success'}).encode())
+                    elif command in self.replies:
+                        reply = json.dumps(self.replies[command]).encode()
+                        for start in range(0, len(reply), self.piece):
+                            connection.sendall(reply[start:start + self.piece])
+                            time.sleep(0.001)
+
+    def close(self):
+        self.server_socket.close()
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'can_server.sock')
+
+
+def all_data(n_signals):
+    return {'data': {f'Signal{i}': {'value': i, 'timestamp': 0.0} for i in range(n_signals)}}
+
+
+def test_large_response_is_read_completely(socket_path):
+    large = all_data(5000)
+    assert len(json.dumps(large)) > 4096 * 10
+    server = FakeServer(socket_path, {'get_all': large, 'get_data': {'data': {'Signal1': {'value': 1}}}})
+    client = can_client.CANClient(socket_path=socket_path)
+    try:
+        assert client.get_all_data() == large
+        assert client.connected
+        # The next reply is not mixed up with the rest of the previous one
+        assert client.get_data(['Signal1']) == {'data': {'Signal1': {'value': 1}}}
+    finally:
+        client.disconnect()
+        server.close()
+    assert server.requests == ['client_identification', 'get_all', 'get_data', 'client_disconnect']
+
+
+def test_timeout_drops_the_connection(socket_path):
+    server = FakeServer(socket_path, {'get_all': all_data(3)})
+    client = can_client.CANClient(socket_path=socket_path)
+    try:
+        started = time.monotonic()
+        assert client.get_data(['VehicleSpeed']) is None
+        assert time.monotonic() - started < 5.0
+        # A late reply cannot be read as the response to the next request
+        assert not client.connected
+        assert client.get_all_data() == all_data(3)
+    finally:
+        client.disconnect()
+        server.close()
@@ -0,0 +1,197 @@
+"""
+Transition-table SmartStateMachine (pipeline/can_state_machine.py) on a fake bus and clock
+
+Frames are fed at 10 Hz with the default timers: 0.3 s to activate, 0.6 s to
+deactivate, 1 s per fan step down and 0.5 s from fan ramp to nozzle open.
+"""
+import importlib.util
+import os
+
+import pytest
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'pipeline')
+
+_spec = importlib.util.spec_from_file_location('can_state_machine',
+                                               os.path.join(PIPELINE_DIR, 'can_state_machine.py'))
+can_state_machine = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(can_state_machine)
+
+FRAME_TIME = 0.1
+
+
+class FakeBus:
+    """Stands in for a python-can bus, the state machine must not open a real one"""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def shutdown(self):
+        self.shut_down = True
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def machine(clock):
+    return can_state_machine.SmartStateMachine(bus=FakeBus(), clock=clock)
+
+
+def feed(machine, clock, status, action_object, seconds):
+    """
+    Send one status per frame for some seconds
+
+    :return: [(time, state, nozzle_state, fan_speed)] after every frame
+    """
+    start = clock.now
+    outputs = []
+    for i in range(int(round(seconds / FRAME_TIME))):
+        clock.now = round(start + i * FRAME_TIME, 6)
+        machine.status_send(status, action_object)
+        outputs.append((clock.now, machine.current_state.id, machine.nozzle_state, machine.fan_speed))
+    clock.now = round(start + seconds, 6)
+    return outputs
+
+
+def first_time(outputs, state):
+    return next(t for t, current, _, _ in outputs if current == state)
+
+
+def test_bus_is_used_as_given(machine):
+    bus = machine.bus
+    assert isinstance(bus, FakeBus)
+    machine.close()
+    assert bus.shut_down
+    assert machine._bus is None
+
+
+def test_activation_needs_a_stable_status(machine, clock):
+    # A status seen for less than time_to_activate does nothing
+    outputs = feed(machine, clock, 'gravel', None, 0.2)
+    outputs += feed(machine, clock, None, None, 1.0)
+    assert {state for _, state, _, _ in outputs} == {'out_of_state'}
+
+    outputs = feed(machine, clock, 'gravel', None, 1.0)
+    assert first_time(outputs, 'gravel') == pytest.approx(1.2 + machine.time_to_activate)
+    # gravel sets its outputs straight away
+    assert (machine.nozzle_state, machine.fan_speed) == (0, 7)
+
+
+def test_deactivation_returns_to_out_of_state(machine, clock):
+    feed(machine, clock, 'clear', None, 1.0)
+    assert machine.current_state.id == 'clear'
+
+    outputs = feed(machine, clock, None, None, 1.5)
+    # Leaves once the last clear frame (0.9 s) is more than time_to_deactivate old
+    assert first_time(outputs, 'out_of_state') == pytest.approx(0.9 + machine.time_to_deactivate + FRAME_TIME)
+    assert all(state == 'clear' for t, state, _, _ in outputs if t < 1.6)
+
+
+def test_ramp_opens_the_nozzle_after_the_fan(machine, clock):
+    outputs = feed(machine, clock, 'blocked', None, 1.5)
+    entered = first_time(outputs, 'blocked')
+    for t, state, nozzle_state, fan_speed in outputs:
+        if t < entered:
+            assert (state, nozzle_state, fan_speed) == ('out_of_state', 0, 1)
+        elif t < entered + machine.ramp_time - 1e-9:
+            assert (state, nozzle_state, fan_speed) == ('blocked', 0, 8)
+        else:
+            assert (state, nozzle_state, fan_speed) == ('blocked', 1, 8)
+
+
+def test_step_down_lowers_the_fan_one_step_per_stepdown_time(machine, clock):
+    feed(machine, clock, 'gravel', None, 1.0)
+    assert machine.fan_speed == 7
+
+    outputs = feed(machine, clock, 'clear', None, 4.0)
+    entered = first_time(outputs, 'clear')
+    fan_changes = [(t, fan_speed) for (t, _, _, fan_speed), previous in zip(outputs, [None] + outputs)
+                   if previous is None or fan_speed != previous[3]]
+    # The nozzle closes and the first step happens on entering, then one step per stepdown_time down to 4
+    assert fan_changes[1:] == [(pytest.approx(entered), 6),
+                               (pytest.approx(entered + machine.stepdown_time), 5),
+                               (pytest.approx(entered + 2 * machine.stepdown_time), 4)]
+    assert all(nozzle_state == 0 for _, _, nozzle_state, _ in outputs)
+    assert (machine.current_state.id, machine.fan_speed) == ('clear', 4)
+
+
+def test_step_down_does_not_print(machine, clock, capsys):
+    feed(machine, clock, 'gravel', None, 1.0)
+    feed(machine, clock, 'clear', None, 4.0)
+    assert capsys.readouterr().out == ''
+
+
+def test_action_object_preempts_a_nozzle_state(machine, clock):
+    feed(machine, clock, 'clear', None, 1.0)
+    assert (machine.current_state.id, machine.nozzle_state, machine.fan_speed) == ('clear', 0, 4)
+
+    outputs = feed(machine, clock, 'clear', 'true', 1.0)
+    entered = first_time(outputs, 'action_object')
+    assert entered == pytest.approx(1.0 + machine.time_to_activate)
+    # Ramp: fan up on entering, nozzle open ramp_time later
+    assert [(nozzle_state, fan_speed) for t, _, nozzle_state, fan_speed in outputs if t == entered] == [(0, 8)]
+    assert (machine.current_state.id, machine.nozzle_state, machine.fan_speed) == ('action_object', 1, 8)
+
+    # Without the action object it drops back out of state after time_to_deactivate
+    outputs = feed(machine, clock, None, None, 1.5)
+    assert outputs[-1][1] == 'out_of_state'
+
+
+def test_action_object_does_not_preempt_blocked(machine, clock):
+    feed(machine, clock, 'blocked', None, 1.0)
+    outputs = feed(machine, clock, 'blocked', 'true', 1.0)
+    assert {state for _, state, _, _ in outputs} == {'blocked'}
+    assert (machine.nozzle_state, machine.fan_speed) == (1, 8)
+
+
+def test_starts_without_a_candidate(machine, clock):
+    # As in the original, nothing is timed until the first status arrives
+    assert machine.start_time is None
+    assert machine.get_time_difference() is None
+    clock.now = 5.0
+    feed(machine, clock, 'clear', None, 0.3)
+    assert machine.current_state.id == 'out_of_state'
+
+
+def test_output_getters_apply_due_outputs(machine, clock):
+    feed(machine, clock, 'gravel', None, 1.0)
+    machine.transition(machine.clear, clock.now)
+    assert (machine.current_state.id, machine.fan_speed) == ('clear', 6)
+
+    # No more frames: the step down still moves on when the outputs are read, like the original thread
+    clock.now += 2 * machine.stepdown_time
+    assert machine.get_fan_speed() == 4
+    assert machine.get_nozzle_state() == 0
+
+
+def test_ramp_stops_a_running_step_down(machine, clock):
+    feed(machine, clock, 'gravel', None, 1.0)
+    machine.transition(machine.clear, clock.now)
+    assert (machine.current_state.id, machine.fan_speed) == ('clear', 6)
+
+    feed(machine, clock, 'clear', 'true', 0.5)
+    assert machine.current_state.id == 'action_object'
+    # The original step down thread would carry on lowering the fan from 8 here
+    feed(machine, clock, 'clear', 'true', 3.0)
+    assert (machine.current_state.id, machine.nozzle_state, machine.fan_speed) == ('action_object', 1, 8)
+
+
+def test_step_down_cancels_a_pending_nozzle_open(machine, clock):
+    feed(machine, clock, 'blocked', None, 0.7)
+    assert (machine.current_state.id, machine.nozzle_state, machine.fan_speed) == ('blocked', 0, 8)
+
+    # clear before the nozzle opened: it stays closed while the fan steps down
+    machine.transition(machine.clear, clock.now)
+    outputs = feed(machine, clock, 'clear', None, 3.0)
+    assert all(nozzle_state == 0 for _, _, nozzle_state, _ in outputs)
+    assert machine.fan_speed == 5
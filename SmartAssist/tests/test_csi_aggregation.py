@@ -0,0 +1,168 @@
+"""
+DistanceAggregator records on hand-made speed and CSI sequences, VehicleSpeedReader polling
+"""
+import math
+import time
+
+import pytest
+
+from csi_src.aggregation import KMH_TO_MS, DistanceAggregator, VehicleSpeedReader
+
+
+def feed(aggregator, samples, start=0.0, frame_time=1.0):
+    """
+    Feed (relative_csi, speed) samples frame_time apart
+
+    :return: Records emitted
+    """
+    records = []
+    for i, (csi, speed) in enumerate(samples):
+        record = aggregator.update(csi, csi * 10, speed, timestamp=start + i * frame_time)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+def test_distance_weighted_mean_and_max():
+    aggregator = DistanceAggregator('front', distance=10.0)
+    # 2 m at 0.2, then 8 m at 0.7: the first sample only sets the time
+    records = feed(aggregator, [(0.9, 2.0), (0.2, 2.0), (0.7, 8.0)])
+    assert len(records) == 1
+    record = records[0]
+    assert (record.key, record.start_time, record.end_time) == ('front', 0.0, 2.0)
+    assert record.distance == pytest.approx(10.0)
+    assert record.samples == 2
+    assert record.mean_csi == pytest.approx((2 * 0.2 + 8 * 0.7) / 10)
+    assert record.mean_absolute_csi == pytest.approx(10 * record.mean_csi)
+    assert record.max_csi == 0.7
+    assert record.ema_csi is None
+
+
+def test_distance_beyond_the_record_is_carried_over():
+    aggregator = DistanceAggregator('front', distance=10.0)
+    # 4 m of 0.2, then 12 m of 0.6: 6 m close the record, 6 m go to the next one
+    records = feed(aggregator, [(0.0, 4.0), (0.2, 4.0), (0.6, 12.0)])
+    assert len(records) == 1
+    assert records[0].distance == pytest.approx(10.0)
+    assert records[0].mean_csi == pytest.approx((4 * 0.2 + 6 * 0.6) / 10)
+    assert aggregator.travelled == pytest.approx(6.0)
+
+    # The carried-over part counts in the next record, which starts at the split sample
+    record = aggregator.update(0.1, 1.0, 4.0, timestamp=3.0)
+    assert record.distance == pytest.approx(10.0)
+    assert (record.start_time, record.end_time, record.samples) == (2.0, 3.0, 2)
+    assert record.mean_csi == pytest.approx((6 * 0.6 + 4 * 0.1) / 10)
+    assert record.max_csi == 0.6
+    assert aggregator.travelled == 0.0
+
+
+def test_step_longer_than_a_record_fills_only_the_last_one():
+    aggregator = DistanceAggregator('front', distance=10.0)
+    # 25 m in one step: one record, two whole records skipped, 5 m carried over
+    records = feed(aggregator, [(0.4, 25.0), (0.4, 25.0)])
+    assert len(records) == 1
+    assert records[0].distance == pytest.approx(10.0)
+    assert aggregator.travelled == pytest.approx(5.0)
+
+    record = aggregator.update(0.8, 8.0, 5.0, timestamp=2.0)
+    assert record.distance == pytest.approx(10.0)
+    assert record.mean_csi == pytest.approx((5 * 0.4 + 5 * 0.8) / 10)
+
+
+def test_standing_still_and_unknown_speed_add_nothing():
+    aggregator = DistanceAggregator('rear', distance=10.0)
+    records = feed(aggregator, [(0.1, 5.0), (0.9, 0.0), (0.9, None), (0.9, 0.0), (0.1, 5.0), (0.1, 5.0)])
+    assert len(records) == 1
+    assert records[0].samples == 2
+    assert records[0].mean_csi == pytest.approx(0.1)
+    assert records[0].max_csi == pytest.approx(0.1)
+    # The record starts at the last sample before the vehicle moved
+    assert records[0].start_time == 3.0
+
+
+def test_nan_samples_are_skipped():
+    aggregator = DistanceAggregator('front', distance=10.0)
+    records = feed(aggregator, [(0.5, 5.0), (math.nan, 5.0), (0.5, 5.0), (0.5, 5.0)])
+    # The NaN sample moves the time, its distance is not counted
+    assert len(records) == 1
+    assert records[0].samples == 2
+    assert records[0].end_time == 3.0
+
+
+def test_long_gaps_count_as_max_gap():
+    aggregator = DistanceAggregator('front', distance=10.0, max_gap=1.0)
+    aggregator.update(0.5, 5.0, 4.0, timestamp=0.0)
+    # 30 s without frames at 4 m/s counts as 4 m, not 120 m
+    assert aggregator.update(0.5, 5.0, 4.0, timestamp=30.0) is None
+    assert aggregator.travelled == pytest.approx(4.0)
+    # Time going backwards counts nothing
+    assert aggregator.update(0.5, 5.0, 4.0, timestamp=29.0) is None
+    assert aggregator.travelled == pytest.approx(4.0)
+
+
+def test_ema_over_the_record_means():
+    aggregator = DistanceAggregator('front', distance=10.0, alpha=0.5)
+    records = feed(aggregator, [(0.0, 10.0), (0.8, 10.0), (0.4, 10.0), (0.2, 10.0)])
+    assert [record.mean_csi for record in records] == pytest.approx([0.8, 0.4, 0.2])
+    # The first record starts the EMA
+    assert [record.ema_csi for record in records] == pytest.approx([0.8, 0.6, 0.4])
+
+
+@pytest.mark.parametrize('kwargs', [dict(distance=0), dict(alpha=0), dict(alpha=1.5)])
+def test_invalid_settings_raise(kwargs):
+    with pytest.raises(ValueError):
+        DistanceAggregator('front', **kwargs)
+
+
+class FakeCanClient:
+    connected = True
+
+    def __init__(self, speed_kmh, has_get_data=True):
+        self.reply = {'data': {'VehicleSpeed': {'value': speed_kmh, 'timestamp': 0.0}}}
+        self.has_get_data = has_get_data
+        self.requests = []
+
+    def get_data(self, keys):
+        self.requests.append('get_data')
+        if not self.has_get_data:
+            return {'error': 'Unknown command: get_data'}
+        return self.reply
+
+    def get_all_data(self):
+        self.requests.append('get_all')
+        return self.reply
+
+
+class FakeAppContext:
+    def __init__(self, can_client):
+        self.can_client = can_client
+
+    def get_value(self, key):
+        return self.can_client if key == 'can_client' else None
+
+
+def read_speed(can_client):
+    reader = VehicleSpeedReader(FakeAppContext(can_client), interval=0.01)
+    reader.start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while reader.get() is None or len(can_client.requests) < 3:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        reader.stop()
+    return reader.get()
+
+
+def test_speed_reader_polls_only_the_speed():
+    can_client = FakeCanClient(36.0)
+    assert read_speed(can_client) == pytest.approx(36.0 * KMH_TO_MS)
+    assert set(can_client.requests) == {'get_data'}
+
+
+def test_speed_reader_falls_back_to_get_all():
+    can_client = FakeCanClient(18.0, has_get_data=False)
+    assert read_speed(can_client) == pytest.approx(5.0)
+    # get_data is only tried once
+    assert can_client.requests[:2] == ['get_data', 'get_all']
+    assert can_client.requests.count('get_data') == 1
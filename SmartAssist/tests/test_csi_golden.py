@@ -0,0 +1,115 @@
+"""
+CSI kernels against the golden outputs of the synthetic cases (tests/data/csi_golden.json)
+
+compute_csi must reproduce the golden absolute CSI and discrete level exactly and
+the relative CSI within REFERENCE_RTOL (float32 sums differ between numpy versions,
+see csi_cases.py). compute_csi_histogram and compute_csi_batch give the same absolute
+CSI and discrete level, and the relative CSI within HISTOGRAM_RTOL (see
+compute_csi_histogram). The cases use the CSI config
+stored in the golden file, so later config edits do not change them.
+"""
+import numpy as np
+import pytest
+
+from csi_cases import (
+    HISTOGRAM_RTOL,
+    REFERENCE_RTOL,
+    csi_arguments,
+    front_rear_pairs,
+    from_json_number,
+    levels_of,
+    load_golden,
+    mask_digest,
+    setup,
+)
+from csi_src import computation
+
+GOLDEN, GOLDEN_CONFIG = load_golden()
+CASE_NAMES = [case['name'] for case in GOLDEN['cases']]
+
+
+@pytest.fixture(scope='module')
+def golden_setup():
+    """Trapezoid masks, cases by name, and kernel arguments of the golden config"""
+    trapezoid_masks, cases = setup(computation, GOLDEN_CONFIG)
+    return trapezoid_masks, cases, csi_arguments(GOLDEN_CONFIG)
+
+
+def expected_values(case):
+    return from_json_number(case['relative_csi']), from_json_number(case['absolute_csi'])
+
+
+def test_cases_match_the_golden_file(golden_setup):
+    _, cases, _ = golden_setup
+    assert [case['name'] for case, _, _ in cases] == CASE_NAMES, 'record the golden file again'
+
+
+def test_filtering_masks():
+    trapezoid_masks = computation.create_filtering_masks(csi_config=GOLDEN_CONFIG)
+    assert {key: mask_digest(mask) for key, mask in zip(('front', 'rear'), trapezoid_masks)} == \
+        GOLDEN['filtering_masks']
+
+
+@pytest.mark.parametrize('entry', GOLDEN['discrete_csi'], ids=lambda e: f'{e["levels"]}-{e["csi"]}')
+def test_discrete_csi(entry):
+    discrete_csi, level_index = computation.get_discrete_csi(levels=np.linspace(0.0, 1.0, entry['levels']),
+                                                             continuous_csi=entry['csi'])
+    assert (discrete_csi, level_index) == (entry['discrete_csi'], entry['level_index'])
+
+
+@pytest.mark.parametrize('index', range(len(CASE_NAMES)), ids=CASE_NAMES)
+def test_reference(index, golden_setup):
+    trapezoid_masks, cases, csi_args = golden_setup
+    case, road, garbage = cases[index]
+    golden_case = GOLDEN['cases'][index]
+
+    relative_csi, absolute_csi = computation.compute_csi(
+        road_mask=road.copy(), garbage_mask=garbage.copy(), trapezoid_mask=trapezoid_masks[case['key']], **csi_args)
+
+    expected_relative, expected_absolute = expected_values(golden_case)
+    np.testing.assert_array_equal(absolute_csi, expected_absolute)
+    np.testing.assert_allclose(relative_csi, expected_relative, rtol=REFERENCE_RTOL, atol=0)
+    if golden_case['level_index'] is not None:
+        _, level_index = computation.get_discrete_csi(levels=levels_of(case['key']), continuous_csi=relative_csi)
+        assert level_index == golden_case['level_index']
+
+
+@pytest.mark.parametrize('index', range(len(CASE_NAMES)), ids=CASE_NAMES)
+def test_histogram(index, golden_setup):
+    trapezoid_masks, cases, csi_args = golden_setup
+    case, road, garbage = cases[index]
+    golden_case = GOLDEN['cases'][index]
+    expected_relative, expected_absolute = expected_values(golden_case)
+
+    relative_csi, absolute_csi = computation.compute_csi_histogram(
+        road_mask=road, garbage_mask=garbage, trapezoid_mask=trapezoid_masks[case['key']], **csi_args)
+
+    np.testing.assert_array_equal(absolute_csi, expected_absolute)
+    np.testing.assert_allclose(relative_csi, expected_relative, rtol=HISTOGRAM_RTOL, atol=0)
+    if golden_case['level_index'] is not None:
+        _, level_index = computation.get_discrete_csi(levels=levels_of(case['key']), continuous_csi=relative_csi)
+        assert level_index == golden_case['level_index']
+
+
+@pytest.mark.parametrize('pair', front_rear_pairs(CASE_NAMES),
+                         ids=[f'{CASE_NAMES[i]}+{CASE_NAMES[j]}' for i, j in front_rear_pairs(CASE_NAMES)])
+def test_batch(pair, golden_setup):
+    # Front + rear in one call, as the CSI probe batches them
+    trapezoid_masks, cases, csi_args = golden_setup
+    batch = [cases[i] for i in pair]
+    golden_cases = [GOLDEN['cases'][i] for i in pair]
+
+    relative_csi, absolute_csi, _, level_index = computation.compute_csi_batch(
+        road_masks=np.stack([road for _, road, _ in batch]),
+        garbage_masks=np.stack([garbage for _, _, garbage in batch]),
+        trapezoid_masks=np.stack([trapezoid_masks[case['key']] for case, _, _ in batch]),
+        levels=[levels_of(case['key']) for case, _, _ in batch],
+        **csi_args
+    )
+
+    for i, golden_case in enumerate(golden_cases):
+        expected_relative, expected_absolute = expected_values(golden_case)
+        np.testing.assert_array_equal(absolute_csi[i], expected_absolute)
+        np.testing.assert_allclose(relative_csi[i], expected_relative, rtol=HISTOGRAM_RTOL, atol=0)
+        expected_level = golden_case['level_index']
+        assert level_index[i] == (-1 if expected_level is None else expected_level)
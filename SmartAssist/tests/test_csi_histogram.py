@@ -0,0 +1,128 @@
+"""
+compute_csi_histogram and compute_csi_batch against the reference compute_csi
+
+compute_csi_histogram cannot be bit for bit equal to compute_csi (see its docstring):
+the absolute CSI must be identical, the relative CSI within HISTOGRAM_RTOL and the
+discrete levels the same. compute_csi_batch shares the kernel and must be identical
+to compute_csi_histogram.
+"""
+import numpy as np
+import pytest
+
+from csi_cases import HISTOGRAM_RTOL
+from csi_src.computation import (
+    _road_column_counts,
+    compute_csi,
+    compute_csi_batch,
+    compute_csi_histogram,
+    get_discrete_csi,
+)
+
+# (seed, road width as a fraction of the frame width, garbage density)
+CASES = [
+    (0, 1.0, 0.0),
+    (1, 1.0, 0.05),
+    (2, 0.8, 0.2),
+    (3, 0.5, 0.5),
+    (4, 0.3, 0.9),
+    (5, 0.9, 1.0),
+]
+
+
+def synthetic_masks(seed, shape, road_width, garbage_density, block=8):
+    """uint8 road mask (centred band of columns with ragged edges) and blocky garbage mask"""
+    rng = np.random.default_rng(seed)
+    h, w = shape
+    road = np.zeros(shape, dtype=np.uint8)
+    half = int(road_width * w / 2)
+    edges = rng.integers(0, max(1, w // 50), size=h)
+    for row in range(h):
+        road[row, max(0, w // 2 - half + edges[row]):min(w, w // 2 + half - edges[row])] = 1
+
+    blocks = (h // block + 1, w // block + 1)
+    labels = rng.integers(1, 3, size=blocks, dtype=np.uint8)
+    labels[rng.random(size=blocks) >= garbage_density] = 0
+    garbage = np.ascontiguousarray(labels.repeat(block, axis=0).repeat(block, axis=1)[:h, :w])
+    return road, garbage
+
+
+@pytest.mark.parametrize('camera', ['front', 'rear'])
+@pytest.mark.parametrize('seed, road_width, garbage_density', CASES)
+def test_histogram_matches_reference(seed, road_width, garbage_density, camera, csi_args, trapezoid_masks,
+                                     csi_levels):
+    trapezoid_mask = trapezoid_masks[camera]
+    road, garbage = synthetic_masks(seed, trapezoid_mask.shape, road_width, garbage_density)
+    road_before, garbage_before = road.copy(), garbage.copy()
+
+    # compute_csi filters its masks in place, it gets copies of the same masks
+    expected_relative, expected_absolute = compute_csi(road_mask=road.copy(), garbage_mask=garbage.copy(),
+                                                       trapezoid_mask=trapezoid_mask, **csi_args)
+    relative, absolute = compute_csi_histogram(road_mask=road, garbage_mask=garbage,
+                                               trapezoid_mask=trapezoid_mask, **csi_args)
+
+    assert np.array_equal(road, road_before) and np.array_equal(garbage, garbage_before)
+    assert absolute == expected_absolute
+    assert type(absolute) is type(expected_absolute)
+    np.testing.assert_allclose(relative, expected_relative, rtol=HISTOGRAM_RTOL, atol=0)
+    levels = csi_levels[camera]
+    assert (get_discrete_csi(levels=levels, continuous_csi=relative)
+            == get_discrete_csi(levels=levels, continuous_csi=expected_relative))
+
+
+@pytest.mark.parametrize('seed, road_width, garbage_density', CASES)
+def test_batch_identical_to_histogram(seed, road_width, garbage_density, csi_args, trapezoid_masks, csi_levels):
+    keys = ['front', 'rear']
+    shape = trapezoid_masks['front'].shape
+    frames = [synthetic_masks(seed + i, shape, road_width, garbage_density) for i in range(len(keys))]
+
+    relative, absolute, discrete, level_index = compute_csi_batch(
+        road_masks=np.stack([road for road, _ in frames]),
+        garbage_masks=np.stack([garbage for _, garbage in frames]),
+        trapezoid_masks=np.stack([trapezoid_masks[key] for key in keys]),
+        levels=[csi_levels[key] for key in keys],
+        **csi_args
+    )
+
+    for i, (key, (road, garbage)) in enumerate(zip(keys, frames)):
+        expected = compute_csi_histogram(road_mask=road, garbage_mask=garbage, trapezoid_mask=trapezoid_masks[key],
+                                         **csi_args)
+        assert (relative[i], absolute[i]) == expected
+        assert (discrete[i], level_index[i]) == get_discrete_csi(levels=csi_levels[key], continuous_csi=expected[0])
+
+
+def test_histogram_without_road_is_nan(csi_args, trapezoid_masks):
+    trapezoid_mask = trapezoid_masks['front']
+    road = np.zeros(trapezoid_mask.shape, dtype=np.uint8)
+    relative, absolute = compute_csi_histogram(road_mask=road, garbage_mask=road.copy(),
+                                               trapezoid_mask=trapezoid_mask, **csi_args)
+    assert np.isnan(relative) and np.isnan(absolute)
+
+
+@pytest.mark.parametrize('row_stride, col_stride', [(0, 1), (1, -2), (1.5, 1), ('2', 1)])
+def test_invalid_strides_raise(row_stride, col_stride, csi_args, trapezoid_masks):
+    # Always validated, not only in debug mode
+    trapezoid_mask = trapezoid_masks['front']
+    road, garbage = synthetic_masks(0, trapezoid_mask.shape, 1.0, 0.1)
+    with pytest.raises(ValueError):
+        compute_csi_histogram(road_mask=road, garbage_mask=garbage, trapezoid_mask=trapezoid_mask,
+                              row_stride=row_stride, col_stride=col_stride, **csi_args)
+    with pytest.raises(ValueError):
+        compute_csi_batch(road_masks=road[np.newaxis], garbage_masks=garbage[np.newaxis],
+                          trapezoid_masks=trapezoid_mask, levels=np.linspace(0.0, 1.0, 5),
+                          row_stride=row_stride, col_stride=col_stride, **csi_args)
+
+
+@pytest.mark.parametrize('n_labels', [3, 4, 8])
+@pytest.mark.parametrize('batch', [False, True])
+def test_road_column_counts(n_labels, batch):
+    rng = np.random.default_rng(n_labels)
+    shape = (2, 416, 64) if batch else (416, 64)
+    on_road = rng.random(size=shape) < 0.7
+    garbage = rng.integers(0, n_labels, size=shape, dtype=np.uint8)
+
+    counts = _road_column_counts(on_road=on_road, garbage_mask=garbage, n_labels=n_labels)
+
+    # 8 labels of 9 bits do not fit in 64 bits and take the per-label path
+    expected = np.stack([np.sum(on_road & (garbage == label), axis=-2) for label in range(n_labels)], axis=-2)
+    assert counts.dtype == np.int64
+    assert np.array_equal(counts, expected)
@@ -0,0 +1,182 @@
+"""
+CSI probe mask buffers (SegmentationMaskReader) on synthetic segmentation meta
+
+The segmentation meta are stand-ins holding an int32 class map, the way
+pyds.get_segmentation_masks returns it.
+"""
+import logging
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from csi_src.computation import compute_csi, compute_csi_batch, compute_csi_histogram
+from csi_src.constants import GARBAGE_UNIQUE_ID, ROAD_UNIQUE_ID
+from csi_src.masks import SegmentationMaskReader
+
+SHAPE = (416, 608)
+
+
+def synthetic_segmeta(rng, unique_id, shape=SHAPE, n_classes=2):
+    """Stand-in for NvDsInferSegmentationMeta with a blocky random class map"""
+    h, w = shape
+    blocks = rng.integers(0, n_classes, size=(h // 8 + 1, w // 8 + 1), dtype=np.int32)
+    class_map = np.ascontiguousarray(blocks.repeat(8, axis=0).repeat(8, axis=1)[:h, :w])
+    return SimpleNamespace(unique_id=unique_id, class_map=class_map)
+
+
+def synthetic_batch(rng, shape=SHAPE):
+    """[(pad_index, road segmeta, garbage segmeta)] for a front + rear batch"""
+    return [(pad_index,
+             synthetic_segmeta(rng, ROAD_UNIQUE_ID, shape, 2),
+             synthetic_segmeta(rng, GARBAGE_UNIQUE_ID, shape, 3))
+            for pad_index in (0, 1)]
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def reader():
+    return SegmentationMaskReader(max_sources=2, get_masks=lambda segmeta: segmeta.class_map,
+                                  logger=logging.getLogger('masks'))
+
+
+def store_batch(reader, batch):
+    for pad_index, road_meta, garbage_meta in batch:
+        reader.store(road_meta, pad_index)
+        reader.store(garbage_meta, pad_index)
+
+
+def test_view_is_the_class_map(reader, rng):
+    segmeta = synthetic_segmeta(rng, ROAD_UNIQUE_ID)
+    assert reader.view(segmeta) is segmeta.class_map
+    assert reader.allocations == 0
+
+
+def test_store_copies_into_uint8_buffers(reader, rng):
+    for pad_index, road_meta, garbage_meta in synthetic_batch(rng):
+        road = reader.store(road_meta, pad_index)
+        garbage = reader.store(garbage_meta, pad_index)
+        assert road.dtype == np.uint8 and garbage.dtype == np.uint8
+        assert np.array_equal(road, road_meta.class_map) and np.array_equal(garbage, garbage_meta.class_map)
+        assert not np.shares_memory(road, road_meta.class_map)
+
+
+def test_store_buffer_is_reused_by_the_next_frame_of_the_source(reader, rng):
+    first_meta, next_meta = synthetic_segmeta(rng, ROAD_UNIQUE_ID), synthetic_segmeta(rng, ROAD_UNIQUE_ID)
+    first = reader.store(first_meta, 0)
+    other_source = reader.store(synthetic_segmeta(rng, ROAD_UNIQUE_ID), 1)
+    other_before = other_source.copy()
+
+    following = reader.store(next_meta, 0)
+
+    # Valid until the next store() of the source: the earlier mask now shows the next frame
+    assert np.shares_memory(first, following)
+    assert np.array_equal(first, next_meta.class_map)
+    # Other sources keep their masks
+    assert np.array_equal(other_source, other_before)
+    assert reader.allocations == 1
+
+
+def test_buffers_are_allocated_once(reader, rng):
+    store_batch(reader, synthetic_batch(rng))
+    buffers = dict(reader.buffers)
+    for _ in range(5):
+        store_batch(reader, synthetic_batch(rng))
+    assert reader.allocations == 2  # one per model
+    assert all(reader.buffers[unique_id] is buffers[unique_id] for unique_id in buffers)
+
+
+def test_read_copies_a_second_frame_of_the_same_source(reader, rng):
+    first_meta, second_meta = synthetic_segmeta(rng, ROAD_UNIQUE_ID), synthetic_segmeta(rng, ROAD_UNIQUE_ID)
+    batch_sources = []
+    first = reader.read(first_meta, 0, batch_sources)
+    batch_sources.append(0)
+    second = reader.read(second_meta, 0, batch_sources)
+
+    assert np.shares_memory(first, reader.buffers[ROAD_UNIQUE_ID])
+    assert not np.shares_memory(second, reader.buffers[ROAD_UNIQUE_ID])
+    assert second.dtype == np.uint8
+    # The first frame of the source keeps its mask
+    assert np.array_equal(first, first_meta.class_map) and np.array_equal(second, second_meta.class_map)
+
+
+def test_stack(reader, rng):
+    batch = synthetic_batch(rng)
+    store_batch(reader, batch)
+
+    # Consecutive increasing sources are views of the buffers
+    assert np.shares_memory(reader.stack(ROAD_UNIQUE_ID, [0, 1]), reader.buffers[ROAD_UNIQUE_ID])
+    assert np.shares_memory(reader.stack(GARBAGE_UNIQUE_ID, [1]), reader.buffers[GARBAGE_UNIQUE_ID])
+    # Other orders are copies with the right masks
+    swapped = reader.stack(ROAD_UNIQUE_ID, [1, 0])
+    assert not np.shares_memory(swapped, reader.buffers[ROAD_UNIQUE_ID])
+    assert np.array_equal(swapped[0], batch[1][1].class_map) and np.array_equal(swapped[1], batch[0][1].class_map)
+
+
+def test_reallocation_keeps_the_masks_of_the_batch(reader, rng):
+    stored = reader.store(synthetic_segmeta(rng, ROAD_UNIQUE_ID), 0)
+    expected = stored.copy()
+    third = synthetic_segmeta(rng, ROAD_UNIQUE_ID)
+    reader.store(third, 2)  # higher pad index than preallocated
+    assert reader.buffers[ROAD_UNIQUE_ID].shape == (3,) + SHAPE
+    assert np.array_equal(reader.buffers[ROAD_UNIQUE_ID][0], expected)
+    assert np.array_equal(reader.buffers[ROAD_UNIQUE_ID][2], third.class_map)
+
+    # A new mask shape starts new buffers
+    reader.store(synthetic_segmeta(rng, ROAD_UNIQUE_ID, shape=(208, 304)), 0)
+    assert reader.buffers[ROAD_UNIQUE_ID].shape[1:] == (208, 304)
+    assert reader.allocations == 3
+
+
+def test_reference_kernel_leaves_the_meta_untouched(reader, rng, csi_args, trapezoid_masks):
+    _, road_meta, garbage_meta = synthetic_batch(rng)[0]
+    road_before, garbage_before = road_meta.class_map.copy(), garbage_meta.class_map.copy()
+    compute_csi(road_mask=reader.store(road_meta, 0), garbage_mask=reader.store(garbage_meta, 0),
+                trapezoid_mask=trapezoid_masks['front'], **csi_args)
+    assert np.array_equal(road_meta.class_map, road_before)
+    assert np.array_equal(garbage_meta.class_map, garbage_before)
+
+
+def test_batch_csi_from_the_buffers(reader, rng, csi_args, trapezoid_masks, csi_levels):
+    keys = ['front', 'rear']
+    batch = synthetic_batch(rng)
+    store_batch(reader, batch)
+
+    relative_csi, absolute_csi, _, _ = compute_csi_batch(
+        road_masks=reader.stack(ROAD_UNIQUE_ID, [0, 1]),
+        garbage_masks=reader.stack(GARBAGE_UNIQUE_ID, [0, 1]),
+        trapezoid_masks=np.stack([trapezoid_masks[key] for key in keys]),
+        levels=[csi_levels[key] for key in keys],
+        **csi_args
+    )
+
+    for i, (key, (_, road_meta, garbage_meta)) in enumerate(zip(keys, batch)):
+        expected = compute_csi_histogram(road_mask=road_meta.class_map, garbage_mask=garbage_meta.class_map,
+                                         trapezoid_mask=trapezoid_masks[key], **csi_args)
+        np.testing.assert_array_equal([relative_csi[i], absolute_csi[i]], expected)
+
+
+def test_store_and_stack_allocate_no_mask_memory(reader, rng):
+    batches = [synthetic_batch(rng) for _ in range(4)]
+    store_batch(reader, batches[0])
+
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for i in range(50):
+            store_batch(reader, batches[i % len(batches)])
+            reader.stack(ROAD_UNIQUE_ID, [0, 1])
+            reader.stack(GARBAGE_UNIQUE_ID, [0, 1])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Class maps of a batch: 2 frames x 2 models of int32
+    mask_bytes = 4 * SHAPE[0] * SHAPE[1] * 4
+    assert peak - base < mask_bytes / 100
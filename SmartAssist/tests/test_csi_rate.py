@@ -0,0 +1,123 @@
+"""
+CSI rate controller decisions from the vehicle speed and mask changes
+"""
+import logging
+import threading
+
+import numpy as np
+import pytest
+
+from csi_src.rate import KMH_TO_MS, CsiRateController
+
+SHAPE = (416, 608)
+
+
+class FakeSpeedReader:
+    def __init__(self, speed_kmh=None):
+        self.speed_kmh = speed_kmh
+
+    def get(self):
+        return None if self.speed_kmh is None else self.speed_kmh * KMH_TO_MS
+
+
+def masks(seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 2, size=SHAPE, dtype=np.uint8), rng.integers(0, 3, size=SHAPE, dtype=np.uint8)
+
+
+def decisions(controller, n_batches):
+    return [controller.should_process() for _ in range(n_batches)]
+
+
+def make_controller(speed_reader=None, **kwargs):
+    return CsiRateController(speed_reader=speed_reader, logger=logging.getLogger('csi_rate'), **kwargs)
+
+
+def test_full_rate_while_moving():
+    controller = make_controller(FakeSpeedReader(30.0), idle_interval=4)
+    assert all(decisions(controller, 20))
+    assert controller.stats()['skipped'] == 0
+
+
+def test_idle_rate_while_standing():
+    speed = FakeSpeedReader(0.0)
+    controller = make_controller(speed, idle_interval=4)
+    # The first idle batch is evaluated, then every 4th
+    assert decisions(controller, 9) == [True, False, False, False, True, False, False, False, True]
+    assert controller.stats()['passed'] == 3 and controller.stats()['skipped'] == 6
+
+    # Motion restores the full rate on the next batch
+    speed.speed_kmh = 10.0
+    assert all(decisions(controller, 3))
+
+
+def test_scene_change_restores_the_full_rate():
+    controller = make_controller(FakeSpeedReader(0.0), idle_interval=4)
+    road, garbage = masks(0)
+    # The first masks of a camera count as a change, the same masks again do not
+    assert controller.observe_masks('front', road, garbage) == 1.0
+    assert controller.observe_masks('front', road, garbage) == 0.0
+    assert decisions(controller, 3) == [True, False, False]
+
+    assert controller.observe_masks('front', *masks(1)) >= controller.change_threshold
+    assert all(decisions(controller, 3))
+
+
+def test_without_speed_idles_after_stable_evaluations():
+    controller = make_controller(None, idle_interval=4, stable_evaluations=3)
+    road, garbage = masks(0)
+    for _ in range(3):
+        assert controller.should_process()
+        controller.observe_masks('front', road, garbage)
+    # Changed on the first observation, stable for two: one more unchanged evaluation
+    assert controller.should_process()
+    controller.observe_masks('front', road, garbage)
+    assert decisions(controller, 4) == [True, False, False, False]
+
+
+def test_counters_are_consistent_across_threads():
+    controller = make_controller(FakeSpeedReader(0.0), idle_interval=3)
+    road, garbage = masks(0)
+    n_batches = 2000
+
+    def decide():
+        for _ in range(n_batches):
+            controller.should_process()
+
+    def observe():
+        for _ in range(n_batches // 10):
+            controller.observe_masks('front', road, garbage)
+
+    threads = [threading.Thread(target=decide), threading.Thread(target=decide), threading.Thread(target=observe)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = controller.stats()
+    assert stats['passed'] + stats['skipped'] == 2 * n_batches
+
+
+def test_inference_interval_follows_the_rate():
+    intervals = []
+    speed = FakeSpeedReader(30.0)
+    controller = make_controller(speed, idle_interval=4, set_inference_interval=intervals.append)
+    assert all(decisions(controller, 3))
+    assert intervals == []
+
+    # Idle: the road nvinfer skips 3 of 4 batches, the probe reads every batch that has masks
+    speed.speed_kmh = 0.0
+    assert all(decisions(controller, 8))
+    assert intervals == [3]
+    for evaluated in [True, False, False, False]:
+        controller.observe_batch(evaluated)
+    assert (controller.stats()['passed'], controller.stats()['skipped']) == (1, 3)
+
+    speed.speed_kmh = 10.0
+    assert controller.should_process()
+    assert intervals == [3, 0]
+
+
+def test_invalid_idle_interval_raises():
+    with pytest.raises(ValueError):
+        CsiRateController(idle_interval=0)
@@ -0,0 +1,77 @@
+"""
+Cached column weight profile of the CSI against the weight matrix it replaces
+"""
+import numpy as np
+import pytest
+
+from csi_src.computation import get_weight_matrix_linspace, get_weight_profile_linspace
+
+N_ROWS = 416
+MAX_WIDTH = 608  # resize_w of the CSI config, the widest road a mask can hold
+
+# (n_bins, linsp_start, linsp_stop): the config values and settings the functions reset
+WEIGHT_SETTINGS = [
+    (48, 0.7, 1.0),
+    (1, 0.7, 1.0),
+    (500, 0.7, 1.0),
+    (48, -0.5, 1.5),
+    (48, 0.9, 0.3),
+]
+
+
+def reference_weight_matrix(n_rows, n_cols, n_bins, linsp_start, linsp_stop):
+    """The weight matrix as get_weight_matrix_linspace built it before the cached profile"""
+    if linsp_start < 0.:
+        linsp_start = 0.
+    if linsp_stop > 1.:
+        linsp_stop = 1.
+    if linsp_start > linsp_stop:
+        linsp_start, linsp_stop = 0., 1.
+    n_bins = min(max(n_bins, 2), n_cols // 2)
+    grouping = n_cols // (n_bins * 2)
+    weights = np.linspace(start=linsp_start, stop=linsp_stop, num=n_bins)
+
+    w_road_mask = np.ones(shape=(n_rows, n_cols), dtype=np.float32)
+    matrix_weights = np.tile(A=np.repeat(weights, grouping, axis=0), reps=(n_rows, 1))
+    w_road_mask[:, :matrix_weights.shape[1]] = matrix_weights
+    w_road_mask[:, n_cols - matrix_weights.shape[1]:] = matrix_weights[:, ::-1]
+    return w_road_mask
+
+
+@pytest.mark.parametrize('n_bins, linsp_start, linsp_stop', WEIGHT_SETTINGS)
+def test_profile_broadcast_equals_weight_matrix(n_bins, linsp_start, linsp_stop):
+    # Every road width from two columns (one column has no CSI) to the full mask width
+    for n_cols in range(2, MAX_WIDTH + 1):
+        profile = get_weight_profile_linspace(n_cols, n_bins, linsp_start, linsp_stop)
+        broadcast = np.broadcast_to(profile, (N_ROWS, n_cols))
+        expected = reference_weight_matrix(N_ROWS, n_cols, n_bins, linsp_start, linsp_stop)
+
+        assert profile.shape == (n_cols,) and profile.dtype == np.float32
+        assert np.array_equal(broadcast, expected), f'n_cols={n_cols}'
+        assert np.array_equal(get_weight_matrix_linspace(N_ROWS, n_cols, n_bins, linsp_start, linsp_stop), expected)
+
+
+def test_weighted_road_mask_equals_matrix_product():
+    # compute_csi multiplies the road columns by the profile instead of the matrix
+    rng = np.random.default_rng(0)
+    road = (rng.random(size=(N_ROWS, 300)) < 0.5).astype(np.float32)
+    profile = get_weight_profile_linspace(300, 48, 0.7, 1.0)
+    weighted = road.copy()
+    weighted *= profile
+    assert np.array_equal(weighted, road * get_weight_matrix_linspace(N_ROWS, 300, 48, 0.7, 1.0))
+
+
+def test_profile_is_cached_and_read_only():
+    profile = get_weight_profile_linspace(400, 48, 0.7, 1.0)
+    assert get_weight_profile_linspace(400, 48, 0.7, 1.0) is profile
+    assert not profile.flags.writeable
+    with pytest.raises(ValueError):
+        profile[0] = 0.
+    with pytest.raises(ValueError):
+        profile *= 2
+
+    # The matrix is a writable copy, changing it leaves the cached profile alone
+    matrix = get_weight_matrix_linspace(4, 400, 48, 0.7, 1.0)
+    matrix[:] = 0.
+    expected = reference_weight_matrix(1, 400, 48, 0.7, 1.0)[0]
+    assert np.array_equal(get_weight_profile_linspace(400, 48, 0.7, 1.0), expected)
@@ -0,0 +1,89 @@
+"""
+CsiWorkerPool round trip through spawned workers and shared memory
+
+The workers are spawned, so they import csi_src themselves: the test puts a csi_src
+package on sys.path that points at the CSI sources, the spawned processes get the
+parent's sys.path.
+"""
+import os
+import time
+
+import pytest
+
+from csi_cases import garbage_mask, road_mask
+from csi_src.computation import compute_csi_histogram, get_discrete_csi
+from csi_src.worker import CsiWorkerPool
+
+CSI_SOURCES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'csi', 'src')
+
+# (road width, road offset, garbage density, garbage labels) per submitted frame
+FRAMES = [
+    (1.0, 0.0, 0.05, (1,)),
+    (0.8, 0.25, 0.2, (2,)),
+    (0.5, 0.0, 0.5, (1, 2)),
+    (0.2, 0.25, 0.0, (1,)),
+]
+
+
+@pytest.fixture
+def spawnable_csi_src(tmp_path, monkeypatch):
+    package = tmp_path / 'csi_src'
+    package.mkdir()
+    (package / '__init__.py').write_text(f'__path__ = [{CSI_SOURCES!r}]\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+
+@pytest.fixture
+def pool(spawnable_csi_src, trapezoid_masks, csi_levels, csi_args):
+    pool = CsiWorkerPool(trapezoid_masks, csi_levels, csi_args, processes=2, n_slots=len(FRAMES),
+                         max_lag_frames=len(FRAMES) - 1, stats_interval=0)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def collect_until(pool, frame_numbers, n_collected, timeout=60.0):
+    """Collect until n_collected results came back from the workers, return what is ready"""
+    ready = {}
+    deadline = time.monotonic() + timeout
+    while pool.results_collected < n_collected:
+        assert time.monotonic() < deadline, 'CSI workers did not answer'
+        for key, results in pool.collect(frame_numbers).items():
+            ready.setdefault(key, []).extend(results)
+        time.sleep(0.01)
+    return ready
+
+
+def test_results_match_compute_csi_histogram(pool, trapezoid_masks, csi_levels, csi_args):
+    shape = pool.mask_shape
+    masks = [(road_mask(shape, width, offset), garbage_mask(shape, density, labels))
+             for width, offset, density, labels in FRAMES]
+    for frame_number, (road, garbage) in enumerate(masks):
+        assert pool.submit(frame_number, 'front', road, garbage)
+    # Every slot is taken until the results are collected
+    assert not pool.submit(len(FRAMES), 'front', *masks[0])
+    assert pool.stats()['skipped'] == 1
+
+    ready = collect_until(pool, {'front': len(FRAMES) - 1}, len(FRAMES))
+    assert [result.frame_number for result in ready['front']] == list(range(len(FRAMES)))
+    for result, (road, garbage) in zip(ready['front'], masks):
+        relative_csi, absolute_csi = compute_csi_histogram(road_mask=road, garbage_mask=garbage,
+                                                           trapezoid_mask=trapezoid_masks['front'], **csi_args)
+        discrete_csi, _ = get_discrete_csi(levels=csi_levels['front'], continuous_csi=relative_csi)
+        assert result.error is None
+        assert (result.relative_csi, result.absolute_csi, result.discrete_csi) == \
+            (float(relative_csi), float(absolute_csi), float(discrete_csi))
+    assert pool.in_flight() == 0
+
+
+def test_stale_results_are_dropped(pool):
+    shape = pool.mask_shape
+    road, garbage = road_mask(shape, 0.8, 0.0), garbage_mask(shape, 0.2, (1,))
+    assert pool.submit(10, 'rear', road, garbage)
+    assert pool.submit(11, 'rear', road, garbage)
+
+    # The current frame is max_lag_frames after 11 and one more after 10
+    ready = collect_until(pool, {'rear': 11 + pool.max_lag_frames}, 2)
+    assert [result.frame_number for result in ready['rear']] == [11]
+    stats = pool.stats()
+    assert (stats['attached'], stats['stale'], stats['in_flight']) == (1, 1, 0)
@@ -0,0 +1,30 @@
+"""
+Class lookup table of the nozzlenet probe, with and without the Python threshold fallback
+"""
+from nozzlenet_src.constants import (
+    NOZZLE_STATUS_CLEAR,
+    PGIE_CLASS_ID_ACTION_OBJECT,
+    PGIE_CLASS_ID_BACKGROUND,
+    PGIE_CLASS_ID_GRAVEL,
+    PGIE_CLASS_ID_NOZZLE_CLEAR,
+)
+from nozzlenet_src.probe_context import ACTION_OBJECT_STATUS, build_class_table
+
+
+def test_kept_classes_only():
+    table = build_class_table([PGIE_CLASS_ID_ACTION_OBJECT, PGIE_CLASS_ID_NOZZLE_CLEAR])
+    assert table[PGIE_CLASS_ID_BACKGROUND] is None and table[PGIE_CLASS_ID_GRAVEL] is None
+
+    class_bit, status, action_status, _, min_confidence = table[PGIE_CLASS_ID_NOZZLE_CLEAR]
+    assert (class_bit, status, action_status, min_confidence) == (1 << PGIE_CLASS_ID_NOZZLE_CLEAR,
+                                                                  NOZZLE_STATUS_CLEAR, None, 0.0)
+    assert table[PGIE_CLASS_ID_ACTION_OBJECT][1:3] == (None, ACTION_OBJECT_STATUS)
+
+
+def test_thresholds_when_nvinfer_cannot_apply_them():
+    table = build_class_table([PGIE_CLASS_ID_ACTION_OBJECT, PGIE_CLASS_ID_NOZZLE_CLEAR],
+                              class_thresholds={PGIE_CLASS_ID_ACTION_OBJECT: 0.5, PGIE_CLASS_ID_GRAVEL: 0.7})
+    assert table[PGIE_CLASS_ID_ACTION_OBJECT][4] == 0.5
+    assert table[PGIE_CLASS_ID_NOZZLE_CLEAR][4] == 0.0
+    # A threshold does not keep a class that is filtered out
+    assert table[PGIE_CLASS_ID_GRAVEL] is None
@@ -0,0 +1,104 @@
+"""
+ConfidenceFilter hysteresis and half-life on hand-made confidence sequences
+"""
+import pytest
+
+from nozzlenet_src.constants import (
+    NOZZLE_STATUS_BLOCKED,
+    NOZZLE_STATUS_CLEAR,
+    PGIE_CLASS_ID_ACTION_OBJECT,
+    PGIE_CLASS_ID_NOZZLE_BLOCKED,
+    PGIE_CLASS_ID_NOZZLE_CLEAR,
+)
+from nozzlenet_src.probe_context import ACTION_OBJECT_STATUS
+from nozzlenet_src.smoothing import ConfidenceFilter
+
+N_CLASSES = 6  # background and the five detection classes
+
+
+def confidences(by_class_id):
+    """class_confidences list of a frame, 0.0 for the classes not given"""
+    values = [0.0] * N_CLASSES
+    for class_id, confidence in by_class_id.items():
+        values[class_id] = confidence
+    return values
+
+
+def frame(class_id, confidence):
+    return confidences({class_id: confidence})
+
+
+EMPTY = confidences({})
+
+
+def test_half_life_in_frames():
+    smoothing = ConfidenceFilter(half_life=4, on_threshold=1.0, off_threshold=1.0)
+    for _ in range(4):
+        smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_BLOCKED, 1.0))
+    # After half_life frames of a constant confidence the score is halfway there
+    assert smoothing.score(PGIE_CLASS_ID_NOZZLE_BLOCKED) == pytest.approx(0.5)
+
+    for _ in range(4):
+        smoothing.update(EMPTY)
+    assert smoothing.score(PGIE_CLASS_ID_NOZZLE_BLOCKED) == pytest.approx(0.25)
+
+
+def test_half_life_in_seconds_follows_the_pts():
+    smoothing = ConfidenceFilter(half_life=1.0, unit='seconds', on_threshold=1.0, off_threshold=1.0)
+    smoothing.update(EMPTY, pts=0)
+    # Two frames 0.5 s apart make one half-life, whatever the frame rate
+    smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_CLEAR, 1.0), pts=500_000_000)
+    smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_CLEAR, 1.0), pts=1_000_000_000)
+    assert smoothing.score(PGIE_CLASS_ID_NOZZLE_CLEAR) == pytest.approx(0.5)
+
+    # A PTS that does not move forward keeps the last frame time
+    smoothing.update(EMPTY, pts=1_000_000_000)
+    assert smoothing.score(PGIE_CLASS_ID_NOZZLE_CLEAR) == pytest.approx(0.5 * 0.5 ** 0.5)
+
+
+def test_single_frame_detection_does_not_turn_on():
+    smoothing = ConfidenceFilter(half_life=2, on_threshold=0.4, off_threshold=0.2)
+    assert smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_BLOCKED, 1.0)) == (None, None)
+    assert smoothing.update(EMPTY) == (None, None)
+
+
+def test_hysteresis():
+    # half_life 1: every frame moves the score halfway to the confidence
+    smoothing = ConfidenceFilter(half_life=1, on_threshold=0.4, off_threshold=0.2)
+    assert smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_BLOCKED, 0.7)) == (None, None)  # 0.35
+    assert smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_BLOCKED, 0.7)) == (NOZZLE_STATUS_BLOCKED, None)  # 0.525
+    # Below on_threshold but not below off_threshold: stays on
+    assert smoothing.update(EMPTY) == (NOZZLE_STATUS_BLOCKED, None)  # 0.2625
+    assert smoothing.update(EMPTY) == (None, None)  # 0.13125
+    # Back above off_threshold is not enough to turn on again
+    assert smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_BLOCKED, 0.5)) == (None, None)  # 0.315625
+
+
+def test_strongest_nozzle_class_and_action_object():
+    smoothing = ConfidenceFilter(half_life=1, on_threshold=0.4, off_threshold=0.2)
+    both = confidences({PGIE_CLASS_ID_NOZZLE_CLEAR: 0.9, PGIE_CLASS_ID_NOZZLE_BLOCKED: 1.0,
+                        PGIE_CLASS_ID_ACTION_OBJECT: 1.0})
+    assert smoothing.update(both) == (NOZZLE_STATUS_BLOCKED, ACTION_OBJECT_STATUS)
+
+    # Blocked is still on (0.25) but clear has the higher score (0.725), the action object stays on (0.25)
+    assert smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_CLEAR, 1.0)) == (NOZZLE_STATUS_CLEAR, ACTION_OBJECT_STATUS)
+    assert smoothing.update(EMPTY) == (NOZZLE_STATUS_CLEAR, None)
+
+
+def test_short_confidence_list_and_reset():
+    smoothing = ConfidenceFilter(half_life=1, on_threshold=0.4, off_threshold=0.2)
+    smoothing.update(frame(PGIE_CLASS_ID_NOZZLE_CLEAR, 1.0))
+    # Classes past the end of the list count as 0.0
+    smoothing.update([0.0, 0.0])
+    assert smoothing.score(PGIE_CLASS_ID_NOZZLE_CLEAR) == pytest.approx(0.25)
+
+    smoothing.reset()
+    assert smoothing.score(PGIE_CLASS_ID_NOZZLE_CLEAR) == 0.0
+    assert smoothing.update(EMPTY) == (None, None)
+
+
+@pytest.mark.parametrize('kwargs', [dict(unit='minutes'), dict(half_life=0),
+                                    dict(on_threshold=0.2, off_threshold=0.4)])
+def test_invalid_settings_raise(kwargs):
+    with pytest.raises(ValueError):
+        ConfidenceFilter(**kwargs)
@@ -0,0 +1,94 @@
+"""
+WindowedHistory running counts against a list-based window, SmartStateMachine on a fake clock
+"""
+import random
+
+import pytest
+
+from nozzlenet_src.state_machine import SmartStateMachine, WindowedHistory
+
+STATUSES = [None, 'clear', 'blocked', 'check']
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def brute_force_window(entries, size, window):
+    """Statuses of the last size entries that are at most window seconds older than the newest"""
+    kept = entries[-size:]
+    limit = kept[-1][0] - window
+    return [status for timestamp, status in kept if timestamp >= limit]
+
+
+def assert_matches(history, entries):
+    assert list(history) == entries[-history.size:]
+    assert len(history) == len(entries[-history.size:])
+    for index, window in enumerate(history.windows):
+        expected = brute_force_window(entries, history.size, window)
+        assert history.window_length(index) == len(expected)
+        for status in STATUSES:
+            assert history.count(status, index) == expected.count(status)
+
+
+@pytest.mark.parametrize('size', [1, 3, 16, 64])
+@pytest.mark.parametrize('seed', range(4))
+def test_counts_match_a_list_window(size, seed):
+    rng = random.Random(seed)
+    history = WindowedHistory((0.0, 0.3, 0.6, 5.0), size=size)
+    entries = []
+    timestamp = 0.0
+    for _ in range(500):
+        # Mostly frame-rate steps, with repeated timestamps and gaps longer than every window
+        timestamp += rng.choice([0.0, 1 / 30, 0.1, 0.25, 7.0])
+        status = rng.choice(STATUSES)
+        history.append(timestamp, status)
+        entries.append((timestamp, status))
+        assert_matches(history, entries)
+
+
+def test_clear_starts_over():
+    history = WindowedHistory((0.3, 0.6), size=8)
+    for i in range(20):
+        history.append(i * 0.1, 'blocked')
+    history.clear()
+    assert len(history) == 0 and list(history) == []
+    assert history.count('blocked', 1) == 0
+
+    # Slots still holding old entries do not count after clear
+    entries = [(2.0 + i * 0.1, 'clear') for i in range(5)]
+    for timestamp, status in entries:
+        history.append(timestamp, status)
+    assert_matches(history, entries)
+
+
+def test_state_machine_uses_the_injected_clock():
+    clock = FakeClock()
+    # Times and windows are exact in binary, no entry sits on a rounded window edge
+    machine = SmartStateMachine(clock=clock, time_to_activate=0.25, time_to_deactivate=0.5)
+    for i in range(10):
+        clock.now = 100.0 + i * 0.125
+        machine.status_send('blocked' if i >= 6 else None, 'true' if i % 2 else None)
+
+    # Frames 7 to 9 are in the activation window, frames 5 to 9 in the deactivation window
+    assert machine.get_window_counts('blocked', 0) == (3, 3)
+    assert machine.get_window_counts('blocked', 1) == (4, 5)
+    assert machine.get_window_counts('true', 0) == (2, 3)
+    assert machine.time_difference == 0.125
+    assert machine.ao_difference == 0.25
+    assert machine.get_current_state() == 'NOZZLE_BLOCKED'
+
+    # Without frames for a while the windows move on with the next call
+    clock.now = 102.0
+    machine.status_send(None, None)
+    assert machine.get_window_counts('blocked', 0) == (0, 1)
+    assert machine.get_window_counts('blocked', 1) == (0, 1)
+    assert machine.time_difference == 0.125
+
+    machine.reset()
+    assert machine.clock is clock
+    assert machine.get_window_counts('blocked', 1) == (0, 0)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+CSI Benchmark
+Times the CSI kernels on the synthetic masks of the golden regression tests
+
+The cases and their golden outputs live with the tests (tests/csi_cases.py,
+tests/data/csi_golden.json); tests/test_csi_golden.py checks every kernel against
+them. This tool measures the same cases:
+
+Commands:
+    bench  - time every kernel variant per frame (min / max / mean / stddev / median /
+             IQR / OPS over --rounds rounds, as pytest-benchmark reports them); strided
+             variants are estimates and report their largest error against the golden file
+    record - compute the golden outputs of the current implementation (compute_csi,
+             create_filtering_masks, get_discrete_csi) and write them to --golden;
+             only for an intended CSI change
+
+bench uses the CSI config stored in the golden file, so the results do not depend on
+later config edits.
+
+USAGE:
+    python3 tools/benchmark_csi.py bench [--rounds N] [--save PATH] [--compare PATH]
+    python3 tools/benchmark_csi.py record [--config PATH] [--golden PATH]
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import types
+
+import numpy as np
+import yaml
+
+SMARTASSIST_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(SMARTASSIST_ROOT)
+CSI_SRC = os.path.join(SMARTASSIST_ROOT, 'models', 'csi', 'src')
+DEFAULT_CONFIG = os.path.join(REPO_ROOT, 'pipeline', 'config', 'csi_config.yaml')
+
+sys.path.insert(0, os.path.join(SMARTASSIST_ROOT, 'tests'))
+from csi_cases import (  # noqa: E402
+    DISCRETE_VALUES,
+    GOLDEN_PATH,
+    csi_arguments,
+    front_rear_pairs,
+    levels_of,
+    load_golden,
+    record_golden,
+    setup,
+)
+
+
+def import_computation():
+    """Import the CSI computation module without the package __init__ (no GStreamer bins)"""
+    package = types.ModuleType('csi_src')
+    package.__path__ = [CSI_SRC]
+    sys.modules['csi_src'] = package
+    return importlib.import_module('csi_src.computation')
+
+
+# ---------------------------------------------------------------------------
+# Kernels
+# ---------------------------------------------------------------------------
+
+def run_reference(computation, cases, trapezoid_masks, csi_args):
+    """compute_csi works in place, every frame gets copies of its masks"""
+    return [computation.compute_csi(road_mask=road.copy(), garbage_mask=garbage.copy(),
+                                    trapezoid_mask=trapezoid_masks[case['key']], **csi_args)
+            for case, road, garbage in cases]
+
+
+def run_histogram(computation, cases, trapezoid_masks, csi_args, row_stride=1, col_stride=1):
+    return [computation.compute_csi_histogram(road_mask=road, garbage_mask=garbage,
+                                              trapezoid_mask=trapezoid_masks[case['key']],
+                                              row_stride=row_stride, col_stride=col_stride, **csi_args)
+            for case, road, garbage in cases]
+
+
+def run_batch(computation, batches, csi_args, row_stride=1, col_stride=1):
+    """compute_csi_batch on front + rear pairs, as the batch-2 streammux delivers them"""
+    results = []
+    for road_stack, garbage_stack, trapezoid_stack, levels in batches:
+        relative, absolute, _, _ = computation.compute_csi_batch(
+            road_masks=road_stack, garbage_masks=garbage_stack, trapezoid_masks=trapezoid_stack,
+            levels=levels, row_stride=row_stride, col_stride=col_stride, **csi_args)
+        results.extend(zip(relative.tolist(), absolute.tolist()))
+    return results
+
+
+def make_batches(cases, trapezoid_masks):
+    """Front + rear stacks of the case pairs of front_rear_pairs"""
+    batches = []
+    for pair in front_rear_pairs(cases):
+        batch = [cases[i] for i in pair]
+        batches.append((np.stack([road for _, road, _ in batch]),
+                        np.stack([garbage for _, _, garbage in batch]),
+                        np.stack([trapezoid_masks[case['key']] for case, _, _ in batch]),
+                        [levels_of(case['key']) for case, _, _ in batch]))
+    return batches
+
+
+def batch_order(cases):
+    """Case order of run_batch results"""
+    return [i for pair in front_rear_pairs(cases) for i in pair]
+
+
+# ---------------------------------------------------------------------------
+# Commands
+# ---------------------------------------------------------------------------
+
+def record(computation, args):
+    with open(args.config, mode='r') as f:
+        config = yaml.safe_load(stream=f)
+    golden = record_golden(computation, config, args.golden)
+    golden_cases = golden['cases']
+    n_nan = sum(case['relative_csi'] is None for case in golden_cases)
+    print(f'Recorded {len(golden_cases)} cases ({n_nan} without CSI) and {len(golden["discrete_csi"])} '
+          f'discrete CSI values to {args.golden}')
+    return 0
+
+
+def timing_stats(times, n_items):
+    """pytest-benchmark style statistics of per-item times in milliseconds"""
+    per_item = 1000 * np.asarray(times) / n_items
+    q1, median, q3 = np.percentile(per_item, [25, 50, 75])
+    return dict(min=per_item.min(), max=per_item.max(), mean=per_item.mean(), stddev=per_item.std(ddof=1)
+                if len(per_item) > 1 else 0.0, median=median, iqr=q3 - q1, ops=1000 / per_item.mean(),
+                rounds=len(per_item))
+
+
+def bench(computation, args):
+    golden, csi_config = load_golden(args.golden)
+    trapezoid_masks, cases = setup(computation, csi_config)
+    csi_args = csi_arguments(csi_config)
+    batches = make_batches(cases, trapezoid_masks)
+    golden_cases = golden['cases']
+    order = batch_order(cases)
+    n_frames = len(cases)
+
+    variants = [
+        ('compute_csi (reference)', lambda: run_reference(computation, cases, trapezoid_masks, csi_args), n_frames,
+         golden_cases),
+        ('compute_csi_histogram', lambda: run_histogram(computation, cases, trapezoid_masks, csi_args), n_frames,
+         golden_cases),
+        ('compute_csi_batch', lambda: run_batch(computation, batches, csi_args), n_frames,
+         [golden_cases[i] for i in order]),
+    ]
+    for row_stride, col_stride in args.strides:
+        # The strides the CSI probe runs with, on compute_csi_histogram
+        variants.append((f'compute_csi_histogram {row_stride}x{col_stride}',
+                         lambda r=row_stride, c=col_stride: run_histogram(computation, cases, trapezoid_masks,
+                                                                          csi_args, r, c),
+                         n_frames, golden_cases))
+    variants += [
+        ('create_filtering_masks', lambda: computation.create_filtering_masks(csi_config=csi_config), 1, None),
+        ('get_discrete_csi', lambda: [computation.get_discrete_csi(levels=levels_of('front'),
+                                                                   continuous_csi=v) for v in DISCRETE_VALUES],
+         len(DISCRETE_VALUES), None),
+    ]
+
+    print(f'{n_frames} synthetic frames {cases[0][1].shape}, {args.rounds} rounds, '
+          f'Python {platform.python_version()}, numpy {np.__version__}, {platform.machine()}\n')
+    print(f'{"Name (time in ms per item)":<32} {"Min":>9} {"Max":>9} {"Mean":>9} {"StdDev":>9} '
+          f'{"Median":>9} {"IQR":>9} {"OPS":>10} {"Rounds":>7} {"max rel err":>12}')
+    report = {}
+    for name, run, n_items, expected in variants:
+        results = run()  # warm-up (caches of the weight profiles)
+        times = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        stats = timing_stats(times, n_items)
+        error = ''
+        if expected is not None:
+            errors = [abs(value[0] - case['relative_csi']) for case, value in zip(expected, results)
+                      if case['relative_csi'] is not None and not np.isnan(value[0])]
+            error = f'{max(errors, default=0.0):12.2e}'
+        report[name] = stats
+        print(f'{name:<32} {stats["min"]:9.3f} {stats["max"]:9.3f} {stats["mean"]:9.3f} {stats["stddev"]:9.3f} '
+              f'{stats["median"]:9.3f} {stats["iqr"]:9.3f} {stats["ops"]:10.1f} {stats["rounds"]:7d} {error}')
+
+    if args.compare:
+        with open(args.compare, mode='r') as f:
+            previous = json.load(f)['benchmarks']
+        print(f'\nMedian against {args.compare}:')
+        for name, stats in report.items():
+            if name in previous:
+                print(f'  {name:<32} {previous[name]["median"]:9.3f} -> {stats["median"]:9.3f} ms '
+                      f'({previous[name]["median"] / stats["median"]:.2f}x)')
+    if args.save:
+        with open(args.save, mode='w') as f:
+            json.dump(dict(machine=platform.machine(), python=platform.python_version(), numpy=np.__version__,
+                           benchmarks=report), f, indent=1)
+        print(f'\nSaved to {args.save}')
+    return 0
+
+
+def parse_strides(text):
+    """'2x1,2x2' -> [(2, 1), (2, 2)]"""
+    strides = []
+    for item in filter(None, text.split(',')):
+        rows, _, cols = item.strip().lower().partition('x')
+        strides.append((int(rows), int(cols or rows)))
+    return strides
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CSI golden regression and benchmark on synthetic masks')
+    parser.add_argument('--golden', default=GOLDEN_PATH,
+                        help='Golden output file (default tests/data/csi_golden.json)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help='Record the golden outputs of the current implementation')
+    record_parser.add_argument('--config', default=DEFAULT_CONFIG, help='CSI config with trapezoid corners')
+
+    bench_parser = commands.add_parser('bench', help='Time the kernel variants')
+    bench_parser.add_argument('--rounds', type=int, default=10, help='Timed rounds per variant (default 10)')
+    bench_parser.add_argument('--strides', type=parse_strides, default=parse_strides('2x2,4x2'),
+                              help='Strided histogram variants, row x column (default 2x2,4x2, empty for none)')
+    bench_parser.add_argument('--save', help='Write the statistics to a JSON file')
+    bench_parser.add_argument('--compare', help='Compare the medians with a file written by --save')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    computation = import_computation()
+    return {'record': record, 'bench': bench}[args.command](computation, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
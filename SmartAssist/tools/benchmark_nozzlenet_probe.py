@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Nozzlenet Probe Micro-Benchmark
+Measures the per-frame cost of the nozzlenet buffer probe on the streaming thread
+
+Runs without DeepStream: when pyds / gi are not installed they are replaced by
+small stand-ins, and frames are built from fake frame and object metadata. Only the
+Python work of the probe is measured, which is what the probe context and the OSD
+text cache change.
+
+Compared paths:
+    per-frame lookups - app context lookups, if/elif class chain and OSD text
+                        formatted for every frame (the probe before ProbeContext)
+    probe context     - nozzlenet_src_pad_buffer_probe with a ProbeContext
+    nvinfer filtered  - the same probe on frames without the --clutter background
+                        detections, as when nvinfer drops them (filter-out-class-ids)
+
+USAGE:
+    python3 tools/benchmark_nozzlenet_probe.py [--frames N] [--detections N] [--clutter N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import types
+
+NOZZLENET_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'models', 'nozzlenet', 'src')
+
+
+# ---------------------------------------------------------------------------
+# Fake DeepStream metadata
+# ---------------------------------------------------------------------------
+
+class FakeColor:
+    __slots__ = ('rgba',)
+
+    def __init__(self):
+        self.rgba = None
+
+    def set(self, *rgba):
+        self.rgba = rgba
+
+
+class FakeFontParams:
+    def __init__(self):
+        self.font_name = None
+        self.font_size = 0
+        self.font_color = FakeColor()
+
+
+class FakeTextParams:
+    def __init__(self):
+        self.display_text = ''
+        self.x_offset = 0
+        self.y_offset = 0
+        self.font_params = FakeFontParams()
+        self.set_bg_clr = 0
+        self.text_bg_clr = FakeColor()
+
+
+class FakeDisplayMeta:
+    def __init__(self):
+        self.num_labels = 0
+        self.text_params = [FakeTextParams(), FakeTextParams()]
+
+
+class FakeRectParams:
+    __slots__ = ('border_color', 'border_width')
+
+    def __init__(self):
+        self.border_color = FakeColor()
+        self.border_width = 0
+
+
+class FakeObjectMeta:
+    __slots__ = ('class_id', 'confidence', 'rect_params')
+
+    def __init__(self, class_id, confidence):
+        self.class_id = class_id
+        self.confidence = confidence
+        self.rect_params = FakeRectParams()
+
+
+class FakeList:
+    __slots__ = ('data', 'next')
+
+    def __init__(self, data, next_node=None):
+        self.data = data
+        self.next = next_node
+
+
+def make_list(items):
+    node = None
+    for item in reversed(items):
+        node = FakeList(item, node)
+    return node
+
+
+class FakeFrameMeta:
+    def __init__(self, frame_num, objects, source_id=0):
+        self.frame_num = frame_num
+        self.source_id = source_id
+        self.num_obj_meta = len(objects)
+        self.obj_meta_list = make_list(objects)
+
+
+class FakeBatchMeta:
+    def __init__(self, frame_meta):
+        self.frame_meta_list = FakeList(frame_meta)
+
+
+class FakeBuffer:
+    def __init__(self, batch_meta, pts):
+        self.batch_meta = batch_meta
+        self.pts = pts
+
+
+class FakeInfo:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def get_buffer(self):
+        return self.buffer
+
+
+class FakeStructure:
+    """Stand-in for the Gst.Structure app context"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def get_value(self, key):
+        return self.values.get(key)
+
+
+class FakeFPS:
+    def get_fps(self):
+        return 30
+
+
+def install_stubs():
+    """Replace pyds and gi with stand-ins when they are not installed"""
+    buffers = {}
+    try:
+        import pyds  # noqa: F401
+        return None
+    except ImportError:
+        pass
+
+    fake_pyds = types.ModuleType('pyds')
+    fake_pyds.NvDsObjectMeta = types.SimpleNamespace(cast=lambda data: data)
+    fake_pyds.NvDsFrameMeta = types.SimpleNamespace(cast=lambda data: data)
+    fake_pyds.nvds_remove_obj_meta_from_frame = lambda frame_meta, obj_meta: None
+    fake_pyds.gst_buffer_get_nvds_batch_meta = lambda key: buffers[key].batch_meta
+    fake_pyds.nvds_acquire_display_meta_from_pool = lambda batch_meta: FakeDisplayMeta()
+    fake_pyds.nvds_add_display_meta_to_frame = lambda frame_meta, display_meta: None
+    sys.modules['pyds'] = fake_pyds
+
+    try:
+        import gi  # noqa: F401
+    except ImportError:
+        gst = types.SimpleNamespace(PadProbeReturn=types.SimpleNamespace(OK=1))
+        gi = types.ModuleType('gi')
+        gi.require_version = lambda name, version: None
+        repository = types.ModuleType('gi.repository')
+        repository.Gst = gst
+        gi.repository = repository
+        sys.modules['gi'] = gi
+        sys.modules['gi.repository'] = repository
+    return buffers
+
+
+def import_nozzlenet():
+    """Import the nozzlenet probe modules without the package __init__ (no GStreamer bins)"""
+    package = types.ModuleType('nozzlenet_src')
+    package.__path__ = [NOZZLENET_SRC]
+    sys.modules['nozzlenet_src'] = package
+    import importlib
+    return (importlib.import_module('nozzlenet_src.probes'),
+            importlib.import_module('nozzlenet_src.probe_context'),
+            importlib.import_module('nozzlenet_src.constants'))
+
+
+# ---------------------------------------------------------------------------
+# Probe before the probe context, for comparison
+# ---------------------------------------------------------------------------
+
+def per_frame_lookup_probe(pad, info, app_context, probes, probe_context, constants):
+    import pyds
+    search_item_list_ = app_context.get_value('search_item_list')
+    nn_fps_counter_ = app_context.get_value('nn_fps_counter')
+    overlay_parts = app_context.get_value('overlay_parts')
+    app_context.get_value('nozzlenet_worker')
+
+    gst_buffer = info.get_buffer()
+    fps_count = nn_fps_counter_.get_fps()
+    batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
+    display_meta = pyds.nvds_acquire_display_meta_from_pool(batch_meta)
+    frame_meta = pyds.NvDsFrameMeta.cast(batch_meta.frame_meta_list.data)
+
+    l_obj = frame_meta.obj_meta_list
+    nozzle_status_string = None
+    action_object_string = None
+    highest_confidence = 0.0
+    class_flags = set()
+    while l_obj is not None:
+        obj_meta = pyds.NvDsObjectMeta.cast(l_obj.data)
+        l_obj = l_obj.next
+        if obj_meta.class_id not in search_item_list_:
+            pyds.nvds_remove_obj_meta_from_frame(frame_meta, obj_meta)
+            continue
+        if obj_meta.class_id == constants.PGIE_CLASS_ID_NOZZLE_CLEAR:
+            nozzle_status_string = "clear"
+            obj_meta.rect_params.border_color.set(*constants.BORDER_COLOR_CLEAR)
+            class_flags.add("nozzle_clear")
+        elif obj_meta.class_id == constants.PGIE_CLASS_ID_NOZZLE_BLOCKED:
+            nozzle_status_string = "blocked"
+            obj_meta.rect_params.border_color.set(*constants.BORDER_COLOR_BLOCKED)
+            class_flags.add("nozzle_blocked")
+        elif obj_meta.class_id == constants.PGIE_CLASS_ID_CHECK_NOZZLE:
+            nozzle_status_string = "check"
+            obj_meta.rect_params.border_color.set(*constants.BORDER_COLOR_CHECK)
+            class_flags.add("check_nozzle")
+        elif obj_meta.class_id == constants.PGIE_CLASS_ID_GRAVEL:
+            nozzle_status_string = "gravel"
+            obj_meta.rect_params.border_color.set(*constants.BORDER_COLOR_GRAVEL)
+            class_flags.add("gravel")
+        elif obj_meta.class_id == constants.PGIE_CLASS_ID_ACTION_OBJECT:
+            action_object_string = "true"
+            obj_meta.rect_params.border_color.set(*constants.BORDER_COLOR_ACTION_OBJECT)
+            class_flags.add("action_object")
+        obj_meta.rect_params.border_width = constants.BORDER_WIDTH
+        if obj_meta.confidence > highest_confidence:
+            highest_confidence = obj_meta.confidence
+
+    result = probes.FrameResult(
+        frame_number=frame_meta.frame_num, source_id=0, pts=gst_buffer.pts, timestamp=time.time(),
+        fps=fps_count, num_detections=frame_meta.num_obj_meta,
+        nozzle_status=nozzle_status_string, action_object=action_object_string,
+        class_flags=frozenset(class_flags), confidence=highest_confidence, class_confidences=())
+    main_text, pm_text = probe_context.format_osd_texts(result, overlay_parts)
+    probes.set_osd_texts(display_meta, main_text, pm_text)
+    pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def make_frames(count, detections, clutter=0, seed=0):
+    """Fake frames with a slowly changing nozzle status, like a real drive, plus clutter background objects"""
+    rng = random.Random(seed)
+    classes = [5] * detections
+    frames = []
+    for frame_num in range(count):
+        if rng.random() < 0.02:
+            classes = [rng.choice((2, 3, 4, 5))] + [rng.choice((0, 1, 5)) for _ in range(detections - 1)]
+        objects = [FakeObjectMeta(class_id, rng.random()) for class_id in classes]
+        objects += [FakeObjectMeta(0, rng.random()) for _ in range(clutter)]
+        frames.append(FakeFrameMeta(frame_num, objects))
+    return frames
+
+
+class RecordingWorker:
+    """Worker stand-in: builds the OSD texts the real worker would, in the posting thread"""
+
+    def __init__(self, sources, overlay_parts):
+        self.sources = sources
+        self.overlay_parts = overlay_parts
+        self.last_output = None
+
+    def post(self, result):
+        self.last_output = self.sources.get(result.source_id).osd_cache.get(result, self.overlay_parts)
+        return True
+
+
+def run(frames, probe, buffers):
+    infos = []
+    for frame_meta in frames:
+        buffer = FakeBuffer(FakeBatchMeta(frame_meta), frame_meta.frame_num * 33333333)
+        buffers[hash(buffer)] = buffer
+        infos.append(FakeInfo(buffer))
+
+    started = time.perf_counter()
+    for info in infos:
+        probe(None, info)
+    return (time.perf_counter() - started) / len(infos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nozzlenet probe micro-benchmark with fake metadata')
+    parser.add_argument('--frames', type=int, default=20000, help='Frames per run (default 20000)')
+    parser.add_argument('--detections', type=int, default=4, help='Objects per frame (default 4)')
+    parser.add_argument('--clutter', type=int, default=4,
+                        help='Background detections per frame that nvinfer filtering removes (default 4)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per path, best is reported (default 3)')
+    args = parser.parse_args()
+
+    buffers = install_stubs()
+    if buffers is None:
+        print('pyds is installed - this benchmark only runs with the fake metadata')
+        return 1
+    probes, probe_context, constants = import_nozzlenet()
+
+    overlay_parts = {'sm_nozzle_state': 1, 'sm_fan_speed': 2, 'sm_current_status': 'clear',
+                     'sm_current_state': 'NOZZLE_CLEAR', 'sm_time_difference': 0.0,
+                     'sm_ao_status': 'N/A', 'sm_ao_difference': 0.0, 's1_pm10': 12}
+    app_context = FakeStructure({
+        'search_item_list': [1, 2, 3, 4, 5],
+        'nn_fps_counter': FakeFPS(),
+        'overlay_parts': overlay_parts,
+    })
+
+    ctx = probe_context.ProbeContext(app_context, fps_counter=FakeFPS(), search_items=[1, 2, 3, 4, 5])
+    ctx.worker = RecordingWorker(ctx.sources, overlay_parts)
+    ctx.sources.get(0)
+
+    def context_probe(pad, info):
+        return probes.nozzlenet_src_pad_buffer_probe(pad, info, ctx)
+
+    paths = {
+        'per-frame lookups': (
+            lambda pad, info: per_frame_lookup_probe(pad, info, app_context, probes, probe_context, constants),
+            args.clutter),
+        'probe context': (context_probe, args.clutter),
+        'nvinfer filtered': (context_probe, 0),
+    }
+
+    print(f'{args.frames} frames, {args.detections} detections and {args.clutter} background '
+          f'detections per frame, best of {args.repeat}\n')
+    baseline = None
+    for name, (probe, clutter) in paths.items():
+        best = min(run(make_frames(args.frames, args.detections, clutter), probe, buffers)
+                   for _ in range(args.repeat))
+        baseline = baseline or best
+        print(f'{name:<20} {best * 1e6:8.2f} us/frame   {baseline / best:5.2f}x')
+
+    print(f'\nOSD texts built for {ctx.sources.get(0).osd_cache.builds} of {2 * args.frames * args.repeat} frames')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
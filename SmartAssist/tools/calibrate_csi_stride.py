@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+CSI Stride Calibration
+Measures the accuracy and CPU saving of the fast (strided) CSI mode on recorded masks
+
+Reads the road and garbage masks dumped by the mask recording probe
+(<stream>_road_<frame>_mask.npz / <stream>_garbage_<frame>_mask.npz, array 'arr'),
+computes the CSI of every frame at full resolution and with each row x column
+stride, and reports per stride:
+    level agreement  - frames with the same discrete CSI level as full resolution
+    max level diff   - largest difference in discrete levels
+    relative CSI     - mean / max absolute error of the relative CSI
+    absolute CSI     - mean / max error of the absolute CSI, relative to full resolution
+    ms/frame         - CSI time per frame and speed-up over full resolution
+
+Streams whose name contains --rear-pattern use the rear trapezoid and 5 levels, all
+others the front trapezoid and 21 levels. Choose the largest stride whose agreement
+is acceptable and set csi_computation.calculation.row_stride / col_stride.
+
+USAGE:
+    python3 tools/calibrate_csi_stride.py MASK_DIR [--strides 2x1,1x2,2x2,4x2] [--config PATH]
+"""
+
+import argparse
+import glob
+import importlib
+import logging
+import os
+import re
+import sys
+import time
+import types
+from types import SimpleNamespace
+
+import numpy as np
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CSI_SRC = os.path.join(REPO_ROOT, 'SmartAssist', 'models', 'csi', 'src')
+DEFAULT_CONFIG = os.path.join(REPO_ROOT, 'pipeline', 'config', 'csi_config.yaml')
+
+MASK_FILE = re.compile(r'^(?P<stream>.+)_(?P<model>road|garbage)_(?P<frame>\d+)_mask\.npz$')
+
+
+def import_computation():
+    """Import the CSI computation module without the package __init__ (no GStreamer bins)"""
+    package = types.ModuleType('csi_src')
+    package.__path__ = [CSI_SRC]
+    sys.modules['csi_src'] = package
+    return importlib.import_module('csi_src.computation')
+
+
+def load_config(path):
+    """Flat CSI config with the trapezoid corners (pipeline/config/csi_config.yaml)"""
+    with open(path, mode='r') as f:
+        csi_config = SimpleNamespace(**yaml.safe_load(stream=f))
+    csi_config.road_model = SimpleNamespace(**csi_config.road_model)
+    csi_config.garbage_model = SimpleNamespace(**csi_config.garbage_model)
+    return csi_config
+
+
+def parse_strides(text):
+    """'2x1,2x2' -> [(2, 1), (2, 2)]"""
+    strides = []
+    for item in text.split(','):
+        rows, _, cols = item.strip().lower().partition('x')
+        strides.append((int(rows), int(cols or rows)))
+    return strides
+
+
+def find_frames(mask_dir):
+    """Pairs of recorded road / garbage masks: [(stream, frame, road_file, garbage_file)]"""
+    files = {}
+    for path in glob.glob(os.path.join(mask_dir, '*_mask.npz')):
+        match = MASK_FILE.match(os.path.basename(path))
+        if match:
+            files[(match['stream'], int(match['frame']), match['model'])] = path
+    return [(stream, frame, path, files[(stream, frame, 'garbage')])
+            for (stream, frame, model), path in sorted(files.items())
+            if model == 'road' and (stream, frame, 'garbage') in files]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accuracy of the strided CSI mode against full resolution')
+    parser.add_argument('mask_dir', help='Directory with recorded *_road_*_mask.npz / *_garbage_*_mask.npz')
+    parser.add_argument('--strides', default='2x1,1x2,2x2,4x2,4x4',
+                        help='Row x column strides to compare (default 2x1,1x2,2x2,4x2,4x4)')
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='CSI config with trapezoid corners')
+    parser.add_argument('--rear-pattern', default='rear', help='Stream name part of the rear camera (default rear)')
+    parser.add_argument('--max-frames', type=int, default=0, help='Use at most this many frames (0 = all)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    computation = import_computation()
+    csi_config = load_config(args.config)
+    trapezoid_masks = dict(zip(('front', 'rear'), computation.create_filtering_masks(csi_config=csi_config)))
+    levels = {'front': np.linspace(start=0.0, stop=1.0, num=21), 'rear': np.linspace(start=0.0, stop=1.0, num=5)}
+    csi_args = dict(
+        road_class_ids=csi_config.road_model.class_ids,
+        garbage_class_ids=csi_config.garbage_model.class_ids,
+        n_bins=csi_config.n_bins,
+        linsp_start=csi_config.linsp_start,
+        linsp_stop=csi_config.linsp_stop,
+        percentage_dirty_road=csi_config.percentage_dirty_road,
+        garbage_type_coeffs=csi_config.garbage_type_coefficients,
+        smooth=csi_config.smooth,
+        clip_csi=csi_config.clip_csi,
+    )
+
+    frames = find_frames(args.mask_dir)
+    if args.max_frames:
+        frames = frames[:args.max_frames]
+    if not frames:
+        print(f'No road / garbage mask pairs found in {args.mask_dir}')
+        return 1
+
+    strides = [(1, 1)] + [s for s in parse_strides(args.strides) if s != (1, 1)]
+    results = {stride: [] for stride in strides}  # (key, relative, absolute, level)
+    times = {stride: 0.0 for stride in strides}
+    skipped = 0
+
+    for stream, frame, road_file, garbage_file in frames:
+        road_mask = np.load(road_file)['arr']
+        garbage_mask = np.load(garbage_file)['arr']
+        key = 'rear' if args.rear_pattern in stream else 'front'
+        if road_mask.shape != trapezoid_masks[key].shape or garbage_mask.shape != road_mask.shape:
+            print(f'{stream} frame {frame}: mask shape {road_mask.shape} does not match {trapezoid_masks[key].shape}')
+            skipped += 1
+            continue
+
+        frame_results = {}
+        try:
+            for row_stride, col_stride in strides:
+                start = time.perf_counter()
+                relative_csi, absolute_csi = computation.compute_csi_histogram(
+                    road_mask=road_mask,
+                    garbage_mask=garbage_mask,
+                    trapezoid_mask=trapezoid_masks[key],
+                    row_stride=row_stride,
+                    col_stride=col_stride,
+                    **csi_args
+                )
+                times[(row_stride, col_stride)] += time.perf_counter() - start
+                level = -1
+                if not np.isnan(relative_csi):
+                    _, level = computation.get_discrete_csi(levels=levels[key], continuous_csi=relative_csi)
+                frame_results[(row_stride, col_stride)] = (key, float(relative_csi), float(absolute_csi), level)
+        except ValueError as e:
+            print(f'{stream} frame {frame}: {e}')
+            skipped += 1
+            continue
+        for stride, result in frame_results.items():
+            results[stride].append(result)
+
+    reference = results[(1, 1)]
+    n_frames = len(reference)
+    print(f'{n_frames} frames ({sum(r[0] == "rear" for r in reference)} rear), {skipped} skipped\n')
+    if not n_frames:
+        return 1
+
+    print(f'{"stride":>7} {"agreement":>10} {"max diff":>9} {"rel err mean":>13} {"rel err max":>12} '
+          f'{"abs err mean":>13} {"abs err max":>12} {"ms/frame":>9} {"speed-up":>9}')
+    base_time = times[(1, 1)] / n_frames
+    for stride in strides:
+        same, max_diff, rel_errors, abs_errors = 0, 0, [], []
+        for (_, rel_full, abs_full, level_full), (_, rel, abs_, level) in zip(reference, results[stride]):
+            if level == level_full:
+                same += 1
+            if level_full >= 0 and level >= 0:
+                max_diff = max(max_diff, abs(level - level_full))
+            elif level != level_full:
+                max_diff = max(max_diff, np.inf)
+            if not (np.isnan(rel_full) or np.isnan(rel)):
+                rel_errors.append(abs(rel - rel_full))
+                abs_errors.append(abs(abs_ - abs_full) / max(abs_full, 1.0))
+        rel_errors = np.array(rel_errors or [np.nan])
+        abs_errors = np.array(abs_errors or [np.nan])
+        frame_time = times[stride] / n_frames
+        print(f'{stride[0]:>3}x{stride[1]:<3} {100 * same / n_frames:9.2f}% {max_diff:9} '
+              f'{rel_errors.mean():13.5f} {rel_errors.max():12.5f} '
+              f'{100 * abs_errors.mean():12.2f}% {100 * abs_errors.max():11.2f}% '
+              f'{1000 * frame_time:9.3f} {base_time / frame_time:8.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -215,4 +215,8 @@ class CanClient:
         return self._send_request({'command': 'get_pm_values', 'sensor_id': sensor_id})
 
     def get_sd_usage(self):
-        return self._send_request({'command': 'get_sd_usage'})
\ No newline at end of file
+        return self._send_request({'command': 'get_sd_usage'})
+
+    def get_log_io_stats(self):
+        """Get write amplification and flush/fsync latency of the server's log writers"""
+        return self._send_request({'command': 'get_log_io_stats'})
\ No newline at end of file
@@ -12,6 +12,7 @@ import csv
 from pathlib import Path
 import numpy as np
 from utils import Configuration
+from log_writer import ChangeFilter, create_durability_policy, create_log_compressor, create_log_writer
 import pandas as pd
 
 
@@ -95,6 +96,13 @@ class CanServer:
 
         self.sd_card_full_flag = None
 
+        self.log_writers = {}  # {data_type: CsvLogWriter}, closed on shutdown so buffered rows are not lost
+        # One committer thread writes out and fsyncs all logs together
+        self.log_durability = create_durability_policy(self.config)
+        if self.log_durability:
+            self.log_durability.start()
+        self.log_compressor = create_log_compressor(self.config, self.log_durability)
+
         # Initialize CAN buses but don't start monitoring yet
         self.init_can_buses()
     
@@ -1080,7 +1088,7 @@ class CanServer:
                         continue
                     
                     response = self.process_request(request_data, client_name)
-                    client_socket.send(json.dumps(response).encode())
+                    client_socket.sendall(json.dumps(response).encode())
                     
                 except json.JSONDecodeError:
                     error_response = {"error": "Invalid JSON"}
@@ -1111,10 +1119,14 @@ class CanServer:
                 self.can_send_on_0F7()
 
             try:
-                self.camera_logging_thread = threading.Thread(target=self.logging_loop, args=('CAMERA',))
-                self.camera_logging_thread.daemon = True
-                self.camera_logging_thread.start()
-                print("Started CAMERA logging thread")
+                if self.config.get_camera_log_source() == 'pipeline':
+                    # The pipeline writes a row per frame itself
+                    print("CAMERA rows are logged by the pipeline, not starting CAMERA logging thread")
+                else:
+                    self.camera_logging_thread = threading.Thread(target=self.logging_loop, args=('CAMERA',))
+                    self.camera_logging_thread.daemon = True
+                    self.camera_logging_thread.start()
+                    print("Started CAMERA logging thread")
             except Exception as e:
                 print(f"Failed to start CAMERA logging thread: {e}")
                 self.error_byte = 0x05
@@ -1161,29 +1173,28 @@ class CanServer:
                 columns = self.config.get_csi_columns()
             case 'PM':
                 columns = self.config.get_pm_columns()
-        serial_number = self.config.get_serial_number()
-        log_duration = self.config.get_log_duration()
-        directory = self.config.get_directory()
-        file_index = 0
-        start_time = datetime.now().strftime("%Y_%m_%d_%H%M")
-        last_update_time = time.time()
-        last_non_nan_values = {key: np.nan for key in columns}
-
-        def write_to_file(dictionary, start_time):
-            nonlocal file_index, last_update_time
-            non_useful_values = {'Connection_Error', np.nan}
-            current_time = time.time()
-            if current_time - last_update_time >= log_duration:
-                file_index += 1
-                last_update_time = current_time
-            file_name = f'{directory}{serial_number}_{data_type}_{start_time}_{file_index}.csv'
-            if not os.path.exists(file_name):
-                with open(file_name, 'w') as f:
-                    f.write(','.join(columns) + '\n')
+        # Rows carry the raw epoch timestamp in 'time', the writer formats it (or stores it as is)
+        writer = create_log_writer(self.config, data_type, columns, self.log_compressor, self.log_durability)
+        self.log_writers[data_type] = writer
+        non_useful_values = {'Connection_Error', np.nan}
+
+        change_settings = self.config.get_change_logging(data_type)
+        change_filter = None
+        if change_settings:
+            change_filter = ChangeFilter(
+                columns,
+                max_interval=change_settings.get('max_interval', 5.0),
+                default_deadband=change_settings.get('default_deadband', 0),
+                deadbands=change_settings.get('deadbands'),
+                key_column=change_settings.get('key_column')
+            )
+            print(f"{data_type} logging on change, keep-alive every {change_filter.max_interval}s")
+
+        def write_to_file(dictionary):
             filtered_values = {str(v) for k, v in dictionary.items() if k != 'time'}
             if not filtered_values.issubset(non_useful_values):
-                with open(file_name, 'a') as f:
-                    f.write(','.join(str(x) for x in list(dictionary.values())) + '\n')
+                if change_filter is None or change_filter.should_write(dictionary):
+                    writer.write_dict(dictionary)
         
         def convert_to_pascal(value):
             return ((value / 5000.0) * 0.4 - 0.2) * 100000
@@ -1204,11 +1215,9 @@ class CanServer:
                                     if key == 'time':
                                         if sensor_data:
                                             first_key = next(iter(sensor_data))
-                                            sensor_timestamp = sensor_data[first_key]['timestamp']
-                                            formatted_time = datetime.fromtimestamp(sensor_timestamp)
-                                            null_dict[key] = formatted_time.strftime("%H:%M:%S.%f")[:-5] + '00'
+                                            null_dict[key] = float(sensor_data[first_key]['timestamp'])
                                         else:
-                                            null_dict[key] = datetime.now().strftime("%H:%M:%S.%f")[:-5] + '00'
+                                            null_dict[key] = time.time()
                                         continue
                                         
                                     if key in sensor_data:
@@ -1219,7 +1228,7 @@ class CanServer:
                                 if data_found:
                                     consecutive_null_cycles = 0
                                     print(f'Received {data_type} data: {null_dict}')
-                                    write_to_file(null_dict, start_time)
+                                    write_to_file(null_dict)
                                 else:
                                     consecutive_null_cycles += 1
                         else:
@@ -1246,7 +1255,7 @@ class CanServer:
                         
                         for key in columns:
                             if key == 'time':
-                                null_dict[key] = datetime.now().strftime("%H:%M:%S.%f")[:-5] + '00'
+                                null_dict[key] = time.time()
                                 continue
                                 
                             if key in can_data:
@@ -1272,9 +1281,7 @@ class CanServer:
 
                                 null_dict[key] = value
 
-                                can_timestamp = can_data[key]['timestamp']
-                                formatted_time = datetime.fromtimestamp(can_timestamp)
-                                null_dict['time'] = formatted_time.strftime("%H:%M:%S.%f")[:-5] + '00'
+                                null_dict['time'] = float(can_data[key]['timestamp'])
                         
                         if data_found:
                             consecutive_null_cycles = 0
@@ -1297,7 +1304,7 @@ class CanServer:
                             break
                     else:
                         # Write to file only if we have some data
-                        write_to_file(null_dict, start_time)
+                        write_to_file(null_dict)
 
                     time.sleep(0.1)  # Poll server every 100ms
 
@@ -1306,6 +1313,8 @@ class CanServer:
         except Exception as e:
             print(f"Error in logging loop: {e}")
         finally:
+            writer.close()
+            self.log_writers.pop(data_type, None)
             print(f"{data_type} logger stopped")
     
     def get_override_state(self):
@@ -1354,7 +1363,7 @@ class CanServer:
         
         self.running = True
         print(f"CAN Server listening on {self.socket_path}")
-        print("Available commands: get_all, send_data")
+        print("Available commands: get_all, get_data, send_data")
         
         # Now start CAN monitoring
         self.start_monitoring_threads()
@@ -1392,6 +1401,17 @@ class CanServer:
                     'client_keys': len(self.client_data),
                     'timestamp': time.time()
                 }
+
+        elif command == 'get_data':
+            # Only the requested keys, for clients polling single signals
+            keys = request_data.get('keys') or []
+            with self.data_lock:
+                data = {key: self.client_data.get(key, self.can_data.get(key)) for key in keys
+                        if key in self.client_data or key in self.can_data}
+            return {
+                'data': data,
+                'timestamp': time.time()
+            }
         
         elif command == 'update_can_bytes':
             byte_updates = request_data.get('bytes', {})
@@ -1541,11 +1561,25 @@ class CanServer:
                 'sd_usage': self.sd_card_full_flag,
                 'timestamp': time.time()
             }
+
+        elif command == 'get_log_io_stats':
+            return {
+                'status': 'success',
+                'log_io_stats': self.log_durability.stats() if self.log_durability else {},
+                'timestamp': time.time()
+            }
                 
     def stop_server(self):
         """Stop the server"""
         print("Stopping CAN server...")
         self.running = False
+        for writer in list(self.log_writers.values()):
+            writer.close()
+        if self.log_compressor:
+            self.log_compressor.stop()
+        if self.log_durability:
+            self.log_durability.stop()
+            print(f'Log I/O: {self.log_durability.format_stats()}')
         if self.server_socket:
             self.server_socket.close()
         if os.path.exists(self.socket_path):
@@ -1,438 +1,384 @@
 '''
 Author: Freddie Clarke | Bucher Municipal
 Date: 2024-04-29
+
+Transition-table implementation of the smart sweeper state machine.
+
+The states and timers are the same as the original python-statemachine
+version. Each call does a constant amount of work, all times come from one
+monotonic clock that can be injected, and the CAN bus is only opened when it
+is first used, so importing this module does not touch any hardware.
+
+The fan step down and the delayed nozzle open were threads in the original,
+here they are deadlines applied by status_send and the output getters.
+Entering a state that sets outputs replaces whatever was still pending: a
+ramp (blocked / action_object) or gravel stops a step down that was running,
+and a step down stops a nozzle open that was still waiting. The original
+threads kept going, so a step down could lower the fan while blocked and a
+late ramp could reopen the nozzle after clear had closed it.
 '''
 
-import asyncio
 import time
-import can
-from statemachine import StateMachine, State
-from enum import Enum
-from datetime import datetime
-import cantools
-import threading
-import random
-
-class SmartStateMachine(StateMachine):
+from collections import namedtuple
+
+State = namedtuple('State', ['id', 'value'])
+
+OUT_OF_STATE = State('out_of_state', 0)
+CHECK = State('check', 1)
+CLEAR = State('clear', 2)
+GRAVEL = State('gravel', 3)
+BLOCKED = State('blocked', 4)
+ACTION_OBJECT = State('action_object', 5)
+
+STATES = {state.id: state for state in (OUT_OF_STATE, CHECK, CLEAR, GRAVEL, BLOCKED, ACTION_OBJECT)}
+
+# nozzle statuses the detector reports, each has the state of the same name
+NOZZLE_STATUSES = ('blocked', 'clear', 'check', 'gravel')
+
+# every state can go to every other state
+TRANSITIONS = frozenset((source, target) for source in STATES for target in STATES if source != target)
+
+# outputs when entering a state: (action, fan speed, nozzle state)
+#   'set'       - set both straight away
+#   'step_down' - close the nozzle, then lower the fan one step per stepdown_time
+#   'ramp'      - raise the fan, open the nozzle ramp_time later (if the nozzle was closed)
+#   None        - leave the outputs as they are
+ENTER_OUTPUTS = {
+    'out_of_state': (None, None, None),
+    'check': (None, None, None),
+    'clear': ('step_down', 4, 0),
+    'gravel': ('set', 7, 0),
+    'blocked': ('ramp', 8, 1),
+    'action_object': ('ramp', 8, 1),
+}
+
+# nozzle states that go to action_object when an action object shows up after
+# the state timed out. gravel never did in the original (its check compared
+# against 'check'), kept so the outputs stay the same
+ACTION_OBJECT_PREEMPTS = frozenset(('blocked', 'clear', 'check'))
+
+
+class SmartStateMachine:
     '''
     A state machine to control can functions for smart sweeper software
     '''
     debug = 0
 
-    out_of_state = State('out_of_state', value=0, initial=True, enter="on_enter_out_of_state", exit="on_exit_out_of_state")
-    check = State('check', value=1, enter="on_enter_check", exit="on_exit_check")
-    clear = State('clear', value=2, enter="on_enter_clear", exit="on_exit_clear")
-    gravel = State('gravel', value=3, enter="on_enter_gravel", exit="on_exit_gravel")
-    blocked  = State('blocked', value=4, enter="on_enter_blocked", exit="on_exit_blocked")
-    action_object = State('action_object', value=5, enter="on_enter_action_object", exit="on_exit_action_object")
-
-    out_of_state_to_check = out_of_state.to(check)
-    out_of_state_to_clear = out_of_state.to(clear)
-    out_of_state_to_blocked = out_of_state.to(blocked)
-    out_of_state_to_action_object = out_of_state.to(action_object)
-    out_of_state_to_gravel = out_of_state.to(gravel)
-
-    check_to_out_of_state = check.to(out_of_state)
-    check_to_clear = check.to(clear)
-    check_to_blocked = check.to(blocked)
-    check_to_action_object = check.to(action_object)
-    check_to_gravel = check.to(gravel)
-
-    clear_to_out_of_state = clear.to(out_of_state)
-    clear_to_check = clear.to(check)
-    clear_to_blocked = clear.to(blocked)
-    clear_to_action_object = clear.to(action_object)
-    clear_to_gravel = clear.to(gravel)
-
-    gravel_to_out_of_state = gravel.to(out_of_state)
-    gravel_to_check = gravel.to(check)
-    gravel_to_clear = gravel.to(clear)
-    gravel_to_blocked = gravel.to(blocked)
-    gravel_to_action_object = gravel.to(action_object)
-
-    blocked_to_out_of_state = blocked.to(out_of_state)
-    blocked_to_check = blocked.to(check)
-    blocked_to_clear = blocked.to(clear)
-    blocked_to_action_object = blocked.to(action_object)
-    blocked_to_gravel = blocked.to(gravel)
-
-    action_object_to_out_of_state = action_object.to(out_of_state)
-    action_object_to_check = action_object.to(check)
-    action_object_to_clear = action_object.to(clear)
-    action_object_to_blocked = action_object.to(blocked)
-    action_object_to_gravel = action_object.to(gravel)
-
-    start_time = None
-    last_update_time = None
-    current_status = None
-    action_object_status = None
-    action_object_start_time = None
-    action_object_last_update_time = None
-
-    can_sent_time = None
-    nozzle_state = 0
-    fan_speed = 1
-    candidate_count = 0
+    out_of_state = OUT_OF_STATE
+    check = CHECK
+    clear = CLEAR
+    gravel = GRAVEL
+    blocked = BLOCKED
+    action_object = ACTION_OBJECT
 
     time_to_activate = 0.3
     time_to_deactivate = 0.6
-    stepdown = 0
     stepdown_time = 1
-    stepdown_state = None
+    ramp_time = 0.5
+
+    def __init__(self, bus=None, channel='can0', bustype='socketcan', clock=time.monotonic):
+        '''
+        Args:
+            bus: an open can bus to use, if None one is opened on first use of self.bus
+            channel: can channel to open when no bus is given
+            bustype: python-can interface type to open when no bus is given
+            clock: function returning the current time in seconds, must not go backwards
+        '''
+        self._bus = bus
+        self.channel = channel
+        self.bustype = bustype
+        self.clock = clock
 
-    bustype = 'socketcan'
-    channel = 'can0'
-    bus = can.interface.Bus(channel=channel, bustype=bustype)
-    check_thread = None
-    stop_thread = None
-    can_thread = None
+        self.current_state = OUT_OF_STATE
+        self.start_time = None
+        self.last_update_time = None
+        self.current_status = None
+        self.action_object_status = None
+        self.action_object_start_time = None
+        self.action_object_last_update_time = None
+
+        self.nozzle_state = 0
+        self.fan_speed = 1
+        self.candidate_count = 0
+
+        # pending timed outputs, replaced whenever a state sets new outputs
+        self.stepdown_target = None
+        self.stepdown_state = None
+        self.next_stepdown_time = None
+        self.pending_nozzle_state = None
+        self.nozzle_open_time = None
+
+    @property
+    def bus(self):
+        '''
+        The can bus, opened on first use
+        '''
+        if self._bus is None:
+            import can
+            self._bus = can.interface.Bus(channel=self.channel, bustype=self.bustype)
+        return self._bus
+
+    def close(self):
+        '''
+        Shut down the can bus if it was opened
+        '''
+        if self._bus is not None:
+            self._bus.shutdown()
+            self._bus = None
 
     def debug_print(self, *args, **kwargs):
         if self.debug == 1:
             print(*args, **kwargs)
-    
+
     def status_send(self, recieved_ns, recieved_aos):
         '''
         function to update status in the machine and enter state_trigger
         nozzle status list: blocked, unblocked, check
         action object status: True, False
         '''
+        now = self.clock()
+        # outputs that fell due since the last call come first, as they would have with the original threads
+        self.update_outputs(now)
 
         if not recieved_ns:
             self.current_status = None
-        # if the status that has been recieved is different to the current status we can treat this as if it is the new candidate for state
+        # if the status that has been recieved is different to the current status we can treat this as if it is the new
+        # candidate for state
         if recieved_ns and recieved_ns != self.current_status:
-            self.start_time = time.time()
+            self.start_time = now
             self.current_status = recieved_ns
         # otherwise the state must match the current status and therefore the current state should remain active
         elif recieved_ns:
             if self.current_status == self.current_state.id:
-                self.last_update_time = time.time()
-            elif self.current_status != self.current_state.id:
+                self.last_update_time = now
+            else:
                 self.candidate_count += 1
         # as action objects are not mutually exclusive with other statuses it is tracked by itself
         if recieved_aos is None:
             recieved_aos = 'false'
             self.action_object_status = recieved_aos
-        # if the action object status does not match the existing status and there is an action object we set this as the start time
+        # if the action object status does not match the existing status and there is an action object we set this as
+        # the start time
         if recieved_aos != self.action_object_status and recieved_aos != 'false':
-            self.action_object_start_time = time.time()
+            self.action_object_start_time = now
             self.action_object_status = recieved_aos
-        # if the action object status does match the existing status and there is an action object this becomes the update time to keep the machine in this state
+        # if the action object status does match the existing status and there is an action object this becomes the
+        # update time to keep the machine in this state
         elif recieved_aos == self.action_object_status and recieved_aos != 'false':
-            if self.current_state == self.action_object:
-                self.action_object_last_update_time = time.time()
-        elif self.current_state != self.action_object:
-            self.action_object_start_time = time.time()
+            if self.current_state is ACTION_OBJECT:
+                self.action_object_last_update_time = now
+        elif self.current_state is not ACTION_OBJECT:
+            self.action_object_start_time = now
 
-        # if there is no nozzle state we reset the activation timer on the basis that the detection is not stable enough to take an action
-        if not recieved_ns and self.start_time and time.time() - self.start_time < self.time_to_activate: 
-            self.start_time = time.time()
+        # if there is no nozzle state we reset the activation timer on the basis that the detection is not stable enough
+        # to take an action
+        if not recieved_ns and self.start_time is not None and now - self.start_time < self.time_to_activate:
+            self.start_time = now
 
         # see @state_trigger
-        self.state_trigger()
+        self.state_trigger(now)
 
-        # if after checking for state triggering the nozzle status is None and the status has been active for too long reset the activation timer,
-        # this is to prevent say a unblocked being seen once and then multiple None and then one more unblocked triggering an unblocked state as in
-        # this situation the time between the two unblocked would be > activation time
-        if not recieved_ns and self.start_time and time.time() - self.start_time > self.time_to_deactivate:
-            self.start_time = time.time()
-        
+        # if after checking for state triggering the nozzle status is None and the status has been active for too long
+        # reset the activation timer, this is to prevent say a unblocked being seen once and then multiple None and then
+        # one more unblocked triggering an unblocked state as in this situation the time between the two unblocked would
+        # be > activation time
+        if not recieved_ns and self.start_time is not None and now - self.start_time > self.time_to_deactivate:
+            self.start_time = now
 
-    def state_trigger(self):
+        self.update_outputs(now)
+
+    def _elapsed(self, since, now):
+        return now - since if since is not None else -1.0
+
+    def state_trigger(self, now=None):
         '''
         A function to determine whether or not the state machine needs to change states
         '''
+        if now is None:
+            now = self.clock()
+        state = self.current_state.id
+        status = self.current_status
+        activated = self._elapsed(self.start_time, now) >= self.time_to_activate
+        action_object_active = (self.action_object_status == 'true' and
+                                self._elapsed(self.action_object_start_time, now) >= self.time_to_activate)
+
         # if there is an action object present for long enough trigger the action object state
-        if self.current_state != self.action_object:
-            if self.action_object_start_time and time.time() - self.action_object_start_time >= self.time_to_activate and self.action_object_status == 'true':
-                if self.current_state.id == 'blocked':
-                    self.action_object_start_time = time.time()
-                    return
-                if self.current_state.id == 'clear':
-                    self.clear_to_action_object()
-                    self.action_object_start_time = time.time()
-                    return
-                if self.current_state.id == 'check':
-                    self.check_to_action_object()
-                    self.action_object_start_time = time.time()
-                    return
-                if self.current_state.id == 'gravel':
-                    self.gravel_to_action_object()
-                    self.action_object_start_time = time.time()
-                    return
-                elif self.current_state.id == 'out_of_state':
-                    self.out_of_state_to_action_object()
-                    self.action_object_start_time = time.time()
-                    return
+        if state != 'action_object' and action_object_active:
+            if state != 'blocked':
+                self.transition(ACTION_OBJECT, now)
+            self.action_object_start_time = now
+            return
+
+        # if the current state is out of state, trigger a state based on the current status if it has been active long
+        # enough
+        if state == 'out_of_state':
+            if self.candidate_count > 2:
+                if activated and status in NOZZLE_STATUSES:
+                    self.transition(STATES[status], now)
                 return
 
-        # if the current state is out of state, trigger a state based on the current status if it has been active long enough
-        if self.candidate_count > 2:
-            if self.current_state == self.out_of_state:
-                if self.start_time and time.time() - self.start_time >= self.time_to_activate:
-                    if self.current_status == 'blocked':
-                        self.out_of_state_to_blocked()
-                        return
-                    if self.current_status == 'clear':
-                        self.out_of_state_to_clear()
-                        return
-                    if self.current_status == 'check':
-                        self.out_of_state_to_check()
-                        return
-                    if self.current_status == 'gravel':
-                        self.out_of_state_to_gravel()
-                        return
-
-                return
-        
         # state transition for the action object state if it has been inactive for too long
-        if self.current_state == self.action_object and self.action_object_last_update_time:
-            if self.action_object_start_time and time.time() - self.action_object_last_update_time > self.time_to_deactivate:
-                if time.time() - self.start_time >= self.time_to_activate:
-                    if self.current_status == 'blocked':
-                        self.action_object_to_blocked()
-                        return
-                    if self.current_status == 'clear':
-                        self.action_object_to_clear()
-                        return
-                    if self.current_status == 'check':
-                        self.action_object_to_check()
-                        return
-                    if self.current_status == 'gravel':
-                        self.action_object_to_gravel()
-                        return
-                    elif self.action_object_status == 'false':
-                        self.action_object_to_out_of_state()
-                        return
-                else:
-                    self.action_object_to_out_of_state()
-                
-                self.action_object_last_update_time = None
-        else:
-            if self.last_update_time and time.time() - self.last_update_time > self.time_to_deactivate:
-                # state transition for the blocked state if it has been inactive for too long
-                if self.current_state.id == 'blocked' and time.time() - self.action_object_start_time >= self.time_to_activate and self.action_object_status == 'true':
-                    self.blocked_to_action_object()
-                    return
-                if self.current_state.id == 'blocked' and time.time() - self.start_time >= self.time_to_activate:
-                    if self.current_status == 'clear' and self.candidate_count > 2:
-                        self.blocked_to_clear()
-                        return
-                    if self.current_status == 'check' and self.candidate_count > 2:
-                        self.blocked_to_check()
-                        return
-                    if self.current_status == 'gravel' and self.candidate_count > 2:
-                        self.blocked_to_gravel()
-                        return
-                    elif not self.current_status:
-                        self.blocked_to_out_of_state()
-                        return
-                elif self.current_state.id == 'blocked':
-                    self.blocked_to_out_of_state()
-                    return
-                # state transition for the clear state if it has been inactive for too long
-                if self.current_state.id == 'clear' and time.time() - self.action_object_start_time >= self.time_to_activate and self.action_object_status == 'true':
-                    self.clear_to_action_object()
-                    return
-                if self.current_state.id == 'clear' and time.time() - self.start_time >= self.time_to_activate:
-                    if self.current_status == 'blocked' and self.candidate_count > 2:
-                        self.clear_to_blocked()
-                        return                    
-                    if self.current_status == 'check' and self.candidate_count > 2:
-                        self.clear_to_check()
-                        return
-                    if self.current_status == 'gravel' and self.candidate_count > 2:
-                        self.clear_to_gravel()
-                        return
-                    elif not self.current_status:
-                        self.clear_to_out_of_state()
-                        return
-                elif self.current_state.id == 'clear':
-                    self.clear_to_out_of_state()
+        elif state == 'action_object' and self.action_object_last_update_time:
+            if (self.action_object_start_time is not None and
+                    now - self.action_object_last_update_time > self.time_to_deactivate):
+                if not activated:
+                    self.transition(OUT_OF_STATE, now)
+                elif status in NOZZLE_STATUSES:
+                    self.transition(STATES[status], now)
                     return
-                # state transition for the check state if it has been inactive for too long
-                if self.current_state.id == 'check' and time.time() - self.action_object_start_time >= self.time_to_activate and self.action_object_status == 'true':
-                    self.check_to_action_object()
-                    return
-                if self.current_state.id == 'check' and time.time() - self.start_time >= self.time_to_activate:
-                    if self.current_status == 'blocked' and self.candidate_count > 2:
-                        self.check_to_blocked()
-                        return
-                    if self.current_status == 'clear' and self.candidate_count > 2:
-                        self.check_to_clear()
-                        return
-                    if self.current_status == 'gravel' and self.candidate_count > 2:
-                        self.check_to_gravel()
-                        return
-                    elif not self.current_status:
-                        self.check_to_out_of_state()
-                        return
-                elif self.current_state.id == 'check':
-                    self.check_to_out_of_state()
-                    self.last_update_time = None
-                    return
-                
-                # state transition for the gravel state if it has been inactive for too long
-                if self.current_state.id == 'check' and time.time() - self.action_object_start_time >= self.time_to_activate and self.action_object_status == 'true':
-                    self.gravel_to_action_object()
-                    return
-                if self.current_state.id == 'gravel' and time.time() - self.start_time >= self.time_to_activate:
-                    if self.current_status == 'blocked' and self.candidate_count > 2:
-                        self.gravel_to_blocked()
-                        return
-                    if self.current_status == 'clear' and self.candidate_count > 2:
-                        self.gravel_to_clear()
-                        return
-                    if self.current_status == 'check' and self.candidate_count > 2:
-                        self.gravel_to_check()
-                        return
-                    elif not self.current_status:
-                        self.gravel_to_out_of_state()
-                        return
-                elif self.current_state.id == 'gravel':
-                    self.gravel_to_out_of_state()
-                    self.last_update_time = None
+                elif self.action_object_status == 'false':
+                    self.transition(OUT_OF_STATE, now)
                     return
+                self.action_object_last_update_time = None
 
-    def step_down(self, target_fan_speed, target_nozzle_state):
+        # state transition for a nozzle state if it has been inactive for too long
+        elif state in NOZZLE_STATUSES:
+            if self._elapsed(self.last_update_time, now) > self.time_to_deactivate:
+                if state in ACTION_OBJECT_PREEMPTS and action_object_active:
+                    self.transition(ACTION_OBJECT, now)
+                elif not activated:
+                    self.transition(OUT_OF_STATE, now)
+                elif status != state and status in NOZZLE_STATUSES and self.candidate_count > 2:
+                    self.transition(STATES[status], now)
+                elif not status:
+                    self.transition(OUT_OF_STATE, now)
+
+    def transition(self, target, now=None):
+        '''
+        Move to another state and run its enter actions
+        Args:
+            target: the State to enter
+            now: clock time of the transition
+        '''
+        if (self.current_state.id, target.id) not in TRANSITIONS:
+            raise ValueError(f'no transition from {self.current_state.id} to {target.id}')
+        if now is None:
+            now = self.clock()
+        self.current_state = target
+        self.candidate_count = 0
+
+        if target is ACTION_OBJECT:
+            self.debug_print('#### entering action object state ####')
+            self.action_object_start_time = now
+            self.action_object_last_update_time = now
+        elif target is OUT_OF_STATE:
+            self.debug_print('#### Returning to out of state ####')
+            self.start_time = now
+            self.last_update_time = None
+        else:
+            self.debug_print(f'#### entering {target.id} state ####')
+            self.start_time = now
+            self.last_update_time = now
+
+        action, fan_speed, nozzle_state = ENTER_OUTPUTS[target.id]
+        if action == 'set':
+            self.cancel_timed_outputs()
+            self.fan_speed = fan_speed
+            self.nozzle_state = nozzle_state
+        elif action == 'ramp':
+            self.ramp_fan_then_open(fan_speed, nozzle_state, now)
+        elif action == 'step_down':
+            if self.fan_speed > fan_speed:
+                self.step_down(fan_speed, nozzle_state, now)
+            else:
+                self.cancel_timed_outputs()
+                self.nozzle_state = nozzle_state
+                self.fan_speed = fan_speed
+
+    def cancel_timed_outputs(self):
+        self.stepdown_target = None
+        self.stepdown_state = None
+        self.next_stepdown_time = None
+        self.pending_nozzle_state = None
+        self.nozzle_open_time = None
+
+    def step_down(self, target_fan_speed, target_nozzle_state, now=None):
         '''
         Function to gradually lower fan speed and change nozzle state
         Args:
             target_fan_speed: The target fan speed to step down to
             target_nozzle_state: The target nozzle state to set
+            now: clock time the step down starts
         '''
-        # Monitor the state that triggered the step down so it can stop if a state transition occurs
-        self.trigger_state = self.current_state
+        if now is None:
+            now = self.clock()
+        self.cancel_timed_outputs()
+        # Monitor the state that triggered the step down so it pauses if a state transition occurs
+        self.stepdown_state = self.current_state
+        self.stepdown_target = target_fan_speed
+        self.next_stepdown_time = now
         self.nozzle_state = target_nozzle_state
-        
-        # While the fan speed is greater than 1 and has not reached the target speed and the current state is still the trigger state
-        while self.fan_speed > 1 and self.fan_speed != target_fan_speed and self.fan_speed > target_fan_speed:
-            if self.current_state == self.trigger_state or self.current_state == self.out_of_state:
-                print(f'stepping down from {self.fan_speed} to {target_fan_speed}')
-                self.fan_speed -= 1
-                time.sleep(self.stepdown_time)
-        return
+        self.update_outputs(now)
 
-    def ramp_fan_then_open(self, target_fan_speed, target_nozzle_state):
+    def ramp_fan_then_open(self, target_fan_speed, target_nozzle_state, now=None):
         '''
         Function to raise the fanspeed before opening the nozzle
         '''
-        self.trigger_state = self.current_state
+        if now is None:
+            now = self.clock()
+        self.cancel_timed_outputs()
         self.fan_speed = target_fan_speed
-        time.sleep(0.5)
-        self.nozzle_state = target_nozzle_state
+        if self.nozzle_state == 0:
+            self.pending_nozzle_state = target_nozzle_state
+            self.nozzle_open_time = now + self.ramp_time
+        else:
+            self.nozzle_state = target_nozzle_state
+
+    def update_outputs(self, now=None):
+        '''
+        Apply the timed output changes that are due, called for every status_send and output read
+        '''
+        if now is None:
+            now = self.clock()
+        if self.nozzle_open_time is not None and now >= self.nozzle_open_time:
+            self.nozzle_state = self.pending_nozzle_state
+            self.pending_nozzle_state = None
+            self.nozzle_open_time = None
+
+        # While the fan speed is greater than 1 and above the target speed and the current state is still the trigger
+        # state, catching up on the steps that fell due since the last call
+        while self.stepdown_target is not None:
+            if self.fan_speed <= 1 or self.fan_speed <= self.stepdown_target:
+                self.stepdown_target = None
+                self.stepdown_state = None
+                self.next_stepdown_time = None
+            elif self.current_state not in (self.stepdown_state, OUT_OF_STATE):
+                # paused, the next step is taken as soon as the trigger state is back
+                self.next_stepdown_time = max(self.next_stepdown_time, now)
+                break
+            elif now >= self.next_stepdown_time:
+                self.debug_print(f'stepping down from {self.fan_speed} to {self.stepdown_target}')
+                self.fan_speed -= 1
+                self.next_stepdown_time += self.stepdown_time
+            else:
+                break
 
     def get_nozzle_state(self):
         '''
         Function to return the current nozzle state
         Returns: self.nozzle_state
         '''
-        return(self.nozzle_state)
+        self.update_outputs()
+        return self.nozzle_state
 
     def get_fan_speed(self):
-        return(self.fan_speed)
-    
+        self.update_outputs()
+        return self.fan_speed
+
     def get_current_status(self):
-        return(self.current_status)
-    
+        return self.current_status
+
     def get_current_state(self):
-        return(self.current_state.id)
+        return self.current_state.id
 
     def get_time_difference(self):
-        if self.start_time:
-            return(time.time() - self.start_time)
-    
+        if self.start_time is not None:
+            return self.clock() - self.start_time
+
     def get_action_object_status(self):
-        return(self.action_object_status)
+        return self.action_object_status
 
     def get_action_object_difference(self):
-        return(time.time() - self.action_object_start_time)     
-        
-    def on_enter_clear(self):
-        #self.can_send(4, 0)
-        #self.nozzle_state = 0
-        #self.fan_speed = 4
-        # Create a thread to step down the fan speed without blocking
-        if self.fan_speed > 4:
-            thread = threading.Thread(target=self.step_down, args=(4, 0))
-            thread.start()
-        else:
-            self.nozzle_state = 0
-            self.fan_speed = 4
-        self.debug_print('#### entering clear state ####')
-        self.start_time = time.time()
-        self.last_update_time = time.time()
-        self.candidate_count = 0
-        return
-
-    def on_exit_clear(self):
-        pass
-
-    def on_enter_action_object(self):
-        if self.nozzle_state == 0:
-            thread = threading.Thread(target=self.ramp_fan_then_open, args=(8, 1))
-            thread.start()
-        else:
-            self.nozzle_state = 1
-            self.fan_speed = 8
-        self.debug_print('#### entering action object state ####')
-        self.action_object_start_time = time.time()
-        self.action_object_last_update_time = time.time()
-        self.candidate_count = 0
-        return
-    
-    def on_exit_action_object(self):
-        pass
-
-    def on_enter_blocked(self):
-        if self.nozzle_state == 0:
-            thread = threading.Thread(target=self.ramp_fan_then_open, args=(8, 1))
-            thread.start()
-        else:
-            self.nozzle_state = 1
-            self.fan_speed = 8
-        self.debug_print('#### entering blocked state ####')
-        self.start_time = time.time()
-        self.last_update_time = time.time()
-        self.candidate_count = 0
-        return
-
-    def on_exit_blocked(self):
-        pass
-
-    def on_enter_check(self):
-        #self.can_send(1, 0)
-        #self.nozzle_state = 0
-        #self.fan_speed = 1
-        self.debug_print('#### entering check state ####')
-        self.start_time = time.time()
-        self.last_update_time = time.time()
-        self.candidate_count = 0
-        return
-
-    def on_exit_check(self):
-        pass
-
-    def on_enter_out_of_state(self):
-        self.debug_print('#### Returning to out of state ####')
-        self.start_time = time.time()
-        self.last_update_time = None
-        self.candidate_count = 0
-        return
-
-    def on_exit_out_of_state(self):
-        pass
-
-    def on_enter_gravel(self):
-        self.nozzle_state = 0
-        self.fan_speed = 7
-        self.debug_print('#### entering gravel state ####')
-        self.start_time = time.time()
-        self.last_update_time = time.time()
-        self.candidate_count = 0
-        return
-    
-    def on_exit_gravel(self):
-        pass
-
+        if self.action_object_start_time is not None:
+            return self.clock() - self.action_object_start_time
+        return 0.0
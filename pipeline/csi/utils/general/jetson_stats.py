@@ -1,5 +1,6 @@
 import sys
-import pandas as pd
+import csv
+import threading
 from jtop import jtop
 from pathlib import Path
 from datetime import datetime
@@ -9,17 +10,95 @@ ROOT = FILE.parents[2]
 if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
+# pipeline/ first, for the shared log durability policy (log_writer.py, utils.py)
+PIPELINE_ROOT = FILE.parents[3]
+if str(PIPELINE_ROOT) not in sys.path:
+    sys.path.insert(0, str(PIPELINE_ROOT))
+
+from log_writer import DurabilityPolicy, create_durability_policy
+
+
+class TegraStatsLog:
+    """
+    Tegra stats CSV committed by the shared DurabilityPolicy (log_writer.py).
+
+    Rows are kept in memory as before and the new ones are appended to the file
+    on every commit. The columns are all keys in order of first appearance, like
+    the pandas writer; when a new key shows up the file is rewritten with it.
+    """
+    data_type = 'tegra_stats'
+
+    def __init__(self, path, durability):
+        self.durability = durability
+        self.file = open(path, "w", newline="")
+        self.rows = []
+        self.columns = {}
+        self.header_columns = 0
+        self.rows_written = 0
+        self.lock = threading.Lock()
+
+    def append(self, stats):
+        with self.lock:
+            self.rows.append(stats)
+            for key in stats:
+                self.columns.setdefault(key)
+
+    def commit(self):
+        with self.lock:
+            if len(self.columns) != self.header_columns:
+                self.file.seek(0)
+                self.file.truncate()
+                self.rows_written = 0
+            writer = csv.DictWriter(self.file, fieldnames=list(self.columns))
+            if self.rows_written == 0:
+                writer.writeheader()
+                self.header_columns = len(self.columns)
+            writer.writerows(self.rows[self.rows_written:])
+            self.rows_written = len(self.rows)
+            self.durability.sync(self.file)
+
+    def close(self):
+        self.commit()
+        self.file.close()
+
+
+def create_policy():
+    """
+    The DurabilityPolicy configured in logging_config.yaml. With log_sync_interval 0
+    rows are written every log_flush_interval seconds without fsync, as by the other logs.
+    """
+    try:
+        from utils import Configuration
+        config = Configuration()
+        policy = create_durability_policy(config)
+        flush_interval = config.get_log_flush_interval()
+    except Exception as e:
+        print(f"Logging config not available, using the default flush interval: {e}")
+        policy, flush_interval = None, 2.0
+    if policy is None:
+        policy = DurabilityPolicy(sync_interval=flush_interval, fsync=False, stats_interval=0)
+    return policy
+
 
 def main() -> None:
     """
     This function is used to monitor and save Jetson 
     performance data as a CSV file.
 
+    The CSV is written while measuring, by the shared log durability policy.
+
     :return: None.
     """
-    data = []
+    now = datetime.now()
+    timestamp = now.strftime(format="%Y-%m-%d-%H-%M-%S")
+    path = ROOT / f"tegra_stats_{timestamp}.csv"
+    policy = create_policy()
+    log = TegraStatsLog(path, policy)
+    policy.register(log)
+    policy.start()
 
     print(f"\nStarting measuring Tegra stats until CTRL+C\n")
+    print(f"\nSaving Tegra stats to:\n{path}\n")
 
     try:
         with jtop() as jetson:
@@ -27,17 +106,13 @@ def main() -> None:
             while jetson.ok():
                 try:
                     # Read tegra stats
-                    data.append(jetson.stats)
+                    log.append(jetson.stats)
                 except KeyboardInterrupt:
                     break
     finally:
-        now = datetime.now()
-        timestamp = now.strftime(format="%Y-%m-%d-%H-%M-%S")
-        path = ROOT / f"tegra_stats_{timestamp}.csv"
-        print(f"\nSaving Tegra stats to:\n{path}\n")
-        
-        df = pd.DataFrame(data=data)
-        df.to_csv(path_or_buf=path, index=False)
+        policy.unregister(log)
+        policy.stop()
+        log.close()
         
 
 if __name__ == "__main__":
@@ -703,15 +703,14 @@ def debug_save_preds_and_probs_buffer_probe(pad: Gst.Pad,
 
                 # Retrieve mask data in the numpy format from segmeta
                 if frame_meta.frame_num % factor == 0:
+                    # Saved before the probe returns, no copy needed
                     class_map = pyds.get_segmentation_masks(segmeta)
-                    class_map = np.array(object=class_map, copy=True, order="C")                
                     file = preds_save_path / f"{stream_paths[frame_meta.pad_index]}_{gies[segmeta.unique_id]}_{str(frame_meta.frame_num).zfill(5)}_mask.npz"
                     np.savez_compressed(file=file, arr=class_map, allow_pickle=False)
 
                 # Retrieve probabilities data in the numpy format from segmeta
                 if frame_meta.frame_num % factor == 0:
                     probabilities_map = pyds.get_segmentation_class_probabilities_map(segmeta)
-                    probabilities_map = np.array(object=probabilities_map, copy=True, order="C")
                     file = preds_save_path / f"{stream_paths[frame_meta.pad_index]}_{gies[segmeta.unique_id]}_{str(frame_meta.frame_num).zfill(5)}_probs.npz"
                     np.savez_compressed(file=file, arr=probabilities_map, allow_pickle=False)
 
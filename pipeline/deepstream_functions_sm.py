@@ -14,17 +14,19 @@ from gi.repository import Gst
 from enum import Enum
 from datetime import datetime
 import time
-import os
+import atexit
 from utils import Configuration
 from can_subsystem import can_send_on_1F7
+from log_writer import QueuedLogWriter, create_log_writer
 
 config = Configuration()
 serial_number = config.get_serial_number()
 log_duration = config.get_log_duration()
 columns = config.get_camera_columns()
 directory = config.get_directory()
-last_update_time = None
-file_index = 0
+# Created on the first frame; rows are queued and written off the streaming thread,
+# the writer buffers them and rotates files after log_duration
+camera_logger = None
 
 video_start_time = datetime.now().strftime("%H:%M:%S")
 file_start_time = datetime.now().strftime("%Y_%m_%d_%H%M")
@@ -46,24 +48,11 @@ class DETECTION_CATEGORIES(Enum):
     
 
 def nozzlenet_src_pad_buffer_probe(pad, info, u_data, fps_counter_, search_item_list_):
-    global CAN_ENABLED
-
-    start_time = file_start_time
-
-    def write_to_file(dictionary, start_time):
-        global last_update_time, file_index, directory   
-        if last_update_time is None:
-            last_update_time = time.time()
-        current_time = time.time()
-        if current_time - last_update_time >= log_duration:  # 20 minutes = 1200 seconds
-            file_index += 1
-            last_update_time = current_time
-        file_name = f'{directory}{serial_number}_CAMERA_{start_time}_{file_index}.csv'
-        if not os.path.exists(file_name):
-            with open(file_name, 'w') as f:
-                f.write(','.join(columns))
-        with open(file_name, 'a') as f:
-            f.write('\n' + ','.join(str(x) for x in list(dictionary.values())))
+    global CAN_ENABLED, camera_logger
+
+    if camera_logger is None:
+        camera_logger = QueuedLogWriter(create_log_writer(config, 'CAMERA', columns))
+        atexit.register(camera_logger.stop)
 
     prediction_dict = dict.fromkeys(columns, 0.0)
 
@@ -119,10 +108,7 @@ def nozzlenet_src_pad_buffer_probe(pad, info, u_data, fps_counter_, search_item_
             break
 
         if obj_meta.class_id not in search_item_list_ :
-            print('class id = ', obj_meta.class_id)
-            print('search item list = ', search_item_list_)
             pyds.nvds_remove_obj_meta_from_frame(frame_meta, obj_meta)
-            print(f"class = {obj_meta.class_id} object deleted , total deleted = {deleted}")
             deleted += 1
 
             obj_id += 1
@@ -197,7 +183,7 @@ def nozzlenet_src_pad_buffer_probe(pad, info, u_data, fps_counter_, search_item_
 
     pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
 
-    prediction_dict["time"] = f'{datetime.now().strftime("%H:%M:%S.%f")[:-5]}00'
-    write_to_file(prediction_dict, start_time)
+    prediction_dict["time"] = time.time()
+    camera_logger.log(list(prediction_dict.values()))
 
     return Gst.PadProbeReturn.OK
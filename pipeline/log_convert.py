@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Convert columnar logs (.clog, written when log_format is columnar) to the usual CSV files.
+
+python3 log_convert.py /mnt/syslogic_sd_card/upload/                 # every .clog in the folder, CSVs next to them
+python3 log_convert.py SN217841_CAN_2025_01_01_0800_0.clog -o out/   # single file into another folder
+"""
+import argparse
+import os
+import sys
+
+from log_writer import export_columnar_log
+
+
+def convert(path, output_dir=None, remove=False):
+    csv_name = os.path.splitext(os.path.basename(path))[0] + '.csv'
+    csv_path = os.path.join(output_dir or os.path.dirname(path), csv_name)
+    export_columnar_log(path, csv_path)
+    print(f'{path} -> {csv_path}')
+    if remove:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert columnar .clog logs to CSV')
+    parser.add_argument('paths', nargs='+', help='.clog files or folders containing them')
+    parser.add_argument('-o', '--output-dir', default=None, help='folder for the CSV files (default: next to the input)')
+    parser.add_argument('--remove', action='store_true', help='delete each .clog after a successful conversion')
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.clog')))
+        else:
+            files.append(path)
+
+    failed = 0
+    for path in files:
+        try:
+            convert(path, args.output_dir, args.remove)
+        except Exception as e:
+            print(f'Failed to convert {path}: {e}')
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Merge the CAN, CAMERA, CSI and PM logs of one rotation window into a single time-aligned CSV.
+
+Every stream is written by its own logging thread with its own HH:MM:SS.d00 timestamps. This tool puts
+them on one monotonic timeline (a fixed grid, or the union of all timestamps) and attaches to every
+timeline row the last value of each stream that is not older than the stream's tolerance
+(pandas merge_asof, so the cost grows linearly with the number of rows). Settings come from
+merge_settings in logging_config.yaml and can be overridden on the command line.
+
+A window is one rotated file of the anchor stream (CAN by default), from its first to its last row.
+The writers do not rotate together: each has its own start time and rotation index, rotates on size
+and restarts on its own, so the files of the other streams are picked by the time they cover, not by
+their names. Merged files are written under a .part name the uploader skips and renamed when complete.
+
+python3 log_merge.py /mnt/syslogic_sd_card/upload/                       # every complete window found
+python3 log_merge.py logs/ --start 2025_01_01_0800 --index 0 -o merged/  # one window
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from log_writer import PARTIAL_SUFFIX, export_columnar_log
+
+
+DEFAULT_CONFIG = '/mnt/ssd/csi_pipeline/config/logging_config.yaml'
+
+
+STREAMS = ['CAN', 'CAMERA', 'CSI', 'PM']
+
+DEFAULT_STREAM_SETTINGS = {
+    'CAN': {'tolerance': 1.0, 'direction': 'backward'},
+    'CAMERA': {'tolerance': 0.5, 'direction': 'backward'},
+    'CSI': {'tolerance': 2.0, 'direction': 'backward'},
+    'PM': {'tolerance': 15.0, 'direction': 'backward', 'key_column': 'sensor_id'},
+}
+
+LOG_NAME = re.compile(
+    r'^(?P<serial>[A-Za-z0-9]+)_(?P<stream>[A-Z]+)_(?P<start>\d{4}_\d{2}_\d{2}_\d{4})_(?P<index>\d+)'
+    r'\.(?P<ext>csv|csv\.gz|csv\.zst|clog)$'
+)
+
+
+def parse_start(start):
+    """Start time of a log file name, e.g. 2025_01_01_0800"""
+    return datetime.strptime(start, '%Y_%m_%d_%H%M')
+
+
+def find_logs(directory):
+    """Stream logs of a folder: {serial: {stream: [(start, index, path)]}}, in writing order"""
+    logs = {}
+    for name in sorted(os.listdir(directory)):
+        match = LOG_NAME.match(name)
+        if not match or match['stream'] not in STREAMS:
+            continue
+        files = logs.setdefault(match['serial'], {}).setdefault(match['stream'], [])
+        files.append((match['start'], int(match['index']), os.path.join(directory, name)))
+    for streams in logs.values():
+        for files in streams.values():
+            files.sort()
+    return logs
+
+
+def file_span(path, start):
+    """First and last timestamp of one stream log, None if it has no valid time"""
+    times = to_timestamps(load_stream(path, columns=['time'])['time'], parse_start(start))
+    times = times[~np.isnat(times)]
+    if not len(times):
+        return None
+    return times.min(), times.max()
+
+
+def find_windows(directory, anchor='CAN', stream_settings=None):
+    """
+    Windows of the anchor stream and the files of every stream that cover them
+
+    A file belongs to a window when its rows overlap the window widened by the stream's tolerance,
+    so a window can take several files of a stream (rotation, restart) and a file can serve two windows.
+
+    :return: {(serial, start, index): (first, last, {stream: [(path, start)]})}, first / last as datetime64
+    """
+    stream_settings = stream_settings or DEFAULT_STREAM_SETTINGS
+    windows = {}
+    for serial, streams in find_logs(directory).items():
+        spans = {stream: [(path, start, file_span(path, start)) for start, _, path in files]
+                 for stream, files in streams.items()}
+        for start, index, path in streams.get(anchor, []):
+            window_span = file_span(path, start)
+            if window_span is None:
+                continue
+            first, last = window_span
+            paths = {}
+            for stream, files in spans.items():
+                settings = {**DEFAULT_STREAM_SETTINGS[stream], **stream_settings.get(stream, {})}
+                tolerance = np.timedelta64(int(settings.get('tolerance', 1.0) * 1e9), 'ns')
+                covering = [(file_path, file_start) for file_path, file_start, span in files
+                            if span is not None and span[0] <= last + tolerance and span[1] >= first - tolerance]
+                if covering:
+                    paths[stream] = covering
+            windows[(serial, start, index)] = (first, last, paths)
+    return windows
+
+
+def load_stream(path, columns=None):
+    """Read one stream log as strings; .clog files go through the CSV export first"""
+    if path.endswith('.clog'):
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, 'export.csv')
+            export_columnar_log(path, csv_path)
+            return pd.read_csv(csv_path, dtype=str, keep_default_na=False, usecols=columns)
+    # pandas picks the decompression from the .gz / .zst extension
+    return pd.read_csv(path, dtype=str, keep_default_na=False, usecols=columns)
+
+
+def to_timestamps(times, start):
+    """
+    Turn the HH:MM:SS.d00 column into datetimes on the window's date.
+
+    The logs carry no date, so a jump back of more than 12 hours is taken as a midnight rollover.
+    """
+    offsets = pd.to_timedelta(times, errors='coerce').to_numpy()
+    day = np.datetime64(start.date(), 'ns')
+    half_day = np.timedelta64(12, 'h')
+    start_offset = np.timedelta64(start.hour * 60 + start.minute, 'm')
+
+    valid = ~np.isnat(offsets)
+    days = np.zeros(len(offsets), dtype=np.int64)
+    if valid.any():
+        valid_offsets = offsets[valid]
+        # Rows before the file's start clock by more than half a day belong to the next day
+        first_day = 1 if valid_offsets[0] < start_offset - half_day else 0
+        steps = np.diff(valid_offsets, prepend=valid_offsets[:1])
+        days[valid] = first_day + np.cumsum(steps < -half_day)
+    timestamps = day + offsets + days * np.timedelta64(1, 'D')
+    return timestamps
+
+
+def load_window_rows(files, first, last):
+    """
+    Rows of one stream between first and last, from all files that cover them
+
+    :param files: [(path, start)] of the stream
+    """
+    frames = []
+    for path, start in files:
+        frame = load_stream(path)
+        frame['timestamp'] = to_timestamps(frame.pop('time'), parse_start(start))
+        frames.append(frame[(frame['timestamp'] >= first) & (frame['timestamp'] <= last)])
+    return pd.concat(frames, ignore_index=True)
+
+
+def prepare_stream(stream, frame, settings, taken):
+    """Sort one stream on its timestamps and rename columns so they are unique in the merged file"""
+    frame = frame[~frame['timestamp'].isna()].sort_values('timestamp', kind='stable')
+
+    key_column = settings.get('key_column')
+    if key_column and key_column in frame.columns:
+        # One set of columns per key, e.g. per PM sensor
+        parts = []
+        for key, group in frame.groupby(key_column, sort=True):
+            group = group.drop(columns=[key_column])
+            group = group.rename(columns={c: f'{c}_{key}' for c in group.columns if c != 'timestamp'})
+            parts.append(group)
+    else:
+        parts = [frame]
+
+    renamed = []
+    for part in parts:
+        mapping = {}
+        for column in part.columns:
+            if column == 'timestamp':
+                continue
+            name = column if column not in taken else f'{stream}_{column}'
+            taken.add(name)
+            mapping[column] = name
+        renamed.append(part.rename(columns=mapping))
+    return renamed
+
+
+def build_timeline(frames, interval, first, last):
+    """Timeline from first to last: a grid of interval seconds, or the union of all timestamps"""
+    if not interval:
+        stamps = np.unique(np.concatenate([f['timestamp'].to_numpy() for f in frames] +
+                                          [np.array([first, last], dtype='datetime64[ns]')]))
+        return stamps[(stamps >= first) & (stamps <= last)]
+    step = np.timedelta64(int(interval * 1e9), 'ns')
+    # Align the grid to whole intervals so windows merged separately line up
+    first = first - (first - np.datetime64(0, 'ns')) % step
+    return np.arange(first, last + step, step)
+
+
+def merge_window(paths, first, last, interval=0.1, stream_settings=None):
+    """
+    Merge the streams of one window into one DataFrame on a common timeline
+
+    :param paths: {stream: [(path, start)]} as found by find_windows
+    :param first: First timestamp of the window (datetime64)
+    :param last: Last timestamp of the window (datetime64)
+    """
+    stream_settings = stream_settings or DEFAULT_STREAM_SETTINGS
+
+    taken = {'time'}
+    prepared = []
+    for stream in STREAMS:
+        if stream not in paths:
+            continue
+        settings = {**DEFAULT_STREAM_SETTINGS[stream], **stream_settings.get(stream, {})}
+        # Rows up to one tolerance outside the window still fill its first / last timeline rows
+        tolerance = pd.Timedelta(seconds=settings.get('tolerance', 1.0))
+        frame = load_window_rows(paths[stream], first - tolerance, last + tolerance)
+        for part in prepare_stream(stream, frame, settings, taken):
+            prepared.append((part, settings))
+
+    timeline = build_timeline([p for p, _ in prepared], interval, np.datetime64(first, 'ns'),
+                              np.datetime64(last, 'ns'))
+    merged = pd.DataFrame({'timestamp': timeline})
+    for part, settings in prepared:
+        merged = pd.merge_asof(
+            merged, part, on='timestamp',
+            direction=settings.get('direction', 'backward'),
+            tolerance=pd.Timedelta(seconds=settings.get('tolerance', 1.0))
+        )
+
+    time_column = merged.pop('timestamp').dt.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3]
+    merged.insert(0, 'time', time_column)
+    return merged
+
+
+def write_merged(merged, out_path):
+    """Write under a .part name first so the uploader never picks up a half-written file"""
+    partial = out_path + PARTIAL_SUFFIX
+    try:
+        merged.to_csv(partial, index=False)
+        os.replace(partial, out_path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge CAN/CAMERA/CSI/PM logs of a rotation window on one timeline')
+    parser.add_argument('directory', help='folder with the stream logs')
+    parser.add_argument('--start',
+                        help='window start as in the anchor file names, e.g. 2025_01_01_0800 (default: all windows)')
+    parser.add_argument('--index', type=int, default=None, help='rotation index of the anchor file (default: all)')
+    parser.add_argument('--anchor', default=None, choices=STREAMS,
+                        help='stream whose rotated files make the windows (default: merge_settings anchor or CAN)')
+    parser.add_argument('-o', '--output-dir', default=None, help='folder for merged files (default: the input folder)')
+    parser.add_argument('--config', default=None, help='logging_config.yaml to read merge_settings from')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='timeline grid in seconds, 0 for the union of all timestamps')
+    parser.add_argument('--require-all', action='store_true', help='skip windows that miss one of the four streams')
+    args = parser.parse_args()
+
+    # Read the yaml directly so the tool also runs off-vehicle without the CAN dependencies of utils.py
+    merge_settings = {}
+    try:
+        with open(args.config or DEFAULT_CONFIG, 'r') as file:
+            merge_settings = yaml.safe_load(file).get('merge_settings') or {}
+    except OSError:
+        print('logging_config.yaml not found, using default merge settings')
+    interval = args.interval if args.interval is not None else merge_settings.get('interval', 0.1)
+    stream_settings = merge_settings.get('streams') or DEFAULT_STREAM_SETTINGS
+    anchor = args.anchor or merge_settings.get('anchor', 'CAN')
+
+    output_dir = args.output_dir or args.directory
+    os.makedirs(output_dir, exist_ok=True)
+
+    merged_count = 0
+    for (serial, start, index), (first, last, paths) in find_windows(args.directory, anchor, stream_settings).items():
+        if args.start and start != args.start:
+            continue
+        if args.index is not None and index != args.index:
+            continue
+        if args.require_all and len(paths) < len(STREAMS):
+            print(f'Skipping {serial} {start} {index}: only {sorted(paths)}')
+            continue
+        merged = merge_window(paths, first, last, interval, stream_settings)
+        out_path = os.path.join(output_dir, f'{serial}_MERGED_{start}_{index}.csv')
+        write_merged(merged, out_path)
+        n_files = sum(len(files) for files in paths.values())
+        print(f'{out_path}: {len(merged)} rows from {n_files} files of {", ".join(sorted(paths))}')
+        merged_count += 1
+
+    if not merged_count:
+        print('No matching log windows found')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Replay logged nozzlenet detections through the CAN state machine, as fast as it can step.
+
+Input is CAMERA logs (csv, csv.gz, csv.zst or .clog) or raw per-frame detection dumps. A dump is a CSV
+with one row per detection and the columns time (seconds, or HH:MM:SS.d00), class_id and confidence.
+Rows of one frame are grouped on frame_number if the dump has it, otherwise on time.
+Every frame is fed to SmartStateMachine on a clock that follows the logged times. The run produces:
+  - the 1F7 byte timeline: nozzle_byte and fan_byte (low nibbles, as the probe sets them) whenever they change
+  - activation latency: time from the first frame of a run of a status to the state machine entering it
+  - flap count: state changes that return to the previous state within --flap-window seconds
+
+Giving several values for --activate, --deactivate or --threshold sweeps the whole grid in parallel
+(multiprocessing, one replay per combination) and writes one result row per combination.
+
+CAMERA logs only carry the frame's highest confidence and one flag per class, so the confidence threshold
+is applied to that frame maximum. Detection dumps are thresholded per detection.
+When several nozzle classes are present in one frame, the most severe wins:
+blocked, check, gravel, then clear.
+
+The replay feeds the state machine directly and does not model the nozzlenet ConfidenceFilter
+(smoothing in nozzlenet_config.yaml): CAMERA logs only hold one confidence per frame, not one per class.
+Results with smoothing enabled on the vehicle are not reproduced.
+
+python3 log_replay.py logs/*_CAMERA_*.csv.gz                                     # one replay, writes the timeline
+python3 log_replay.py logs/ --activate 0.2,0.3,0.4 --deactivate 0.4,0.6,0.8 --threshold 0.4,0.5 -o sweep.csv
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from can_state_machine import SmartStateMachine
+from log_merge import LOG_NAME, load_stream, to_timestamps
+
+
+# Nozzlenet class ids (see DETECTION_CATEGORIES in pipeline_w_logging.py) and their CAMERA columns
+CLASS_COLUMNS = {
+    1: 'action_object',
+    2: 'check_nozzle',
+    3: 'gravel',
+    4: 'nozzle_blocked',
+    5: 'nozzle_clear',
+}
+
+# Nozzle status per class, most severe first
+STATUS_PRIORITY = [
+    (4, 'blocked'),
+    (2, 'check'),
+    (3, 'gravel'),
+    (5, 'clear'),
+]
+ACTION_OBJECT_CLASS = 1
+
+# Columns of the confidence matrix, one per class id
+CLASS_IDS = sorted(CLASS_COLUMNS)
+
+
+class Frames:
+    """Per-frame detections of one log: times in seconds and the highest confidence per class (0 if absent)"""
+
+    def __init__(self, name, times, confidence):
+        self.name = name
+        self.times = times
+        self.confidence = confidence
+
+    def __len__(self):
+        return len(self.times)
+
+
+def parse_start(path):
+    """Start of a log from its file name, falling back to today for files that do not follow the naming"""
+    match = LOG_NAME.match(os.path.basename(path))
+    if match:
+        return datetime.strptime(match['start'], '%Y_%m_%d_%H%M')
+    now = datetime.now()
+    return datetime(now.year, now.month, now.day)
+
+
+def to_seconds(times, start):
+    """Numeric seconds are used as they are, HH:MM:SS.d00 goes through log_merge's midnight-aware parsing"""
+    numeric = pd.to_numeric(times, errors='coerce')
+    if not numeric.isna().all():
+        return numeric.to_numpy(dtype=np.float64)
+    stamps = to_timestamps(times, start)
+    return (stamps - stamps[0]).astype('timedelta64[ns]').astype(np.float64) / 1e9
+
+
+def load_camera_log(path, frame):
+    start = parse_start(path)
+    times = to_seconds(frame['time'], start)
+    highest = pd.to_numeric(frame.get('confidence', pd.Series(0.0, index=frame.index)), errors='coerce')
+    highest = highest.fillna(0.0).to_numpy(dtype=np.float64)
+
+    confidence = np.zeros((len(frame), len(CLASS_IDS)), dtype=np.float64)
+    for i, class_id in enumerate(CLASS_IDS):
+        column = CLASS_COLUMNS[class_id]
+        if column in frame.columns:
+            flags = pd.to_numeric(frame[column], errors='coerce').fillna(0.0).to_numpy() > 0.5
+            confidence[flags, i] = highest[flags]
+    return times, confidence
+
+
+def load_detection_dump(path, frame):
+    start = parse_start(path)
+    key = 'frame_number' if 'frame_number' in frame.columns else 'time'
+    detections = pd.DataFrame({
+        'key': frame[key],
+        'time': to_seconds(frame['time'], start),
+        'class_id': pd.to_numeric(frame['class_id'], errors='coerce'),
+        'confidence': pd.to_numeric(frame['confidence'], errors='coerce').fillna(0.0),
+    })
+    if key == 'frame_number':
+        detections['key'] = pd.to_numeric(detections['key'], errors='coerce')
+    # Frames without detections keep their row with an empty class_id
+    per_frame = detections.groupby('key', sort=True)['time'].first()
+    per_class = detections.dropna(subset=['class_id']).pivot_table(
+        index='key', columns='class_id', values='confidence', aggfunc='max')
+    per_class = per_class.reindex(index=per_frame.index, columns=CLASS_IDS).fillna(0.0)
+    return per_frame.to_numpy(dtype=np.float64), per_class.to_numpy(dtype=np.float64)
+
+
+def load_frames(path):
+    """Read a CAMERA log or detection dump into Frames, sorted on time"""
+    frame = load_stream(path)
+    if 'class_id' in frame.columns:
+        times, confidence = load_detection_dump(path, frame)
+    else:
+        times, confidence = load_camera_log(path, frame)
+    valid = ~np.isnan(times)
+    times, confidence = times[valid], confidence[valid]
+    order = np.argsort(times, kind='stable')
+    return Frames(os.path.basename(path), times[order], confidence[order])
+
+
+def frame_statuses(frames, threshold):
+    """Nozzle status (or None) and action object flag of every frame, vectorised over the whole log"""
+    present = frames.confidence >= max(threshold, np.finfo(np.float64).tiny)
+    statuses = np.full(len(frames), None, dtype=object)
+    # Least severe first so the more severe status overwrites it
+    for class_id, status in reversed(STATUS_PRIORITY):
+        statuses[present[:, CLASS_IDS.index(class_id)]] = status
+    action_object = present[:, CLASS_IDS.index(ACTION_OBJECT_CLASS)]
+    return statuses, action_object
+
+
+def replay(frames, time_to_activate, time_to_deactivate, threshold):
+    """
+    Step the state machine through one log
+
+    Returns (timeline rows, transition list, activation latencies):
+      timeline: (time, state, nozzle_byte, fan_byte) whenever one of them changes
+      transitions: (time, from_state, to_state)
+      latencies: seconds from the start of a status run to entering its state
+    """
+    statuses, action_object = frame_statuses(frames, threshold)
+    times = frames.times.tolist()
+    if not times:
+        return [], [], []
+
+    now = [times[0]]
+    machine = SmartStateMachine(clock=lambda: now[0])
+    machine.time_to_activate = time_to_activate
+    machine.time_to_deactivate = time_to_deactivate
+
+    timeline = []
+    transitions = []
+    latencies = []
+    last_output = None
+    state = machine.current_state.id
+    run_status = None
+    run_start = None
+    action_start = None
+    previous_action = False
+
+    for t, status, action in zip(times, statuses.tolist(), action_object.tolist()):
+        now[0] = t
+        if status is not None and status != run_status:
+            run_status, run_start = status, t
+        if action and not previous_action:
+            action_start = t
+        previous_action = action
+
+        machine.status_send(status, 'true' if action else None)
+
+        new_state = machine.current_state.id
+        if new_state != state:
+            transitions.append((t, state, new_state))
+            if new_state == 'action_object' and action_start is not None:
+                latencies.append(t - action_start)
+            elif new_state == run_status:
+                latencies.append(t - run_start)
+            state = new_state
+
+        output = (state, machine.nozzle_state & 0x0F, machine.fan_speed & 0x0F)
+        if output != last_output:
+            timeline.append((t,) + output)
+            last_output = output
+    return timeline, transitions, latencies
+
+
+def count_flaps(transitions, flap_window):
+    """State changes that go back to the state left less than flap_window seconds before"""
+    flaps = 0
+    for (t0, before, _), (t1, _, after) in zip(transitions, transitions[1:]):
+        if after == before and t1 - t0 < flap_window:
+            flaps += 1
+    return flaps
+
+
+def evaluate(frames_list, time_to_activate, time_to_deactivate, threshold, flap_window):
+    """Replay every log with one parameter set and summarise the result"""
+    started = time.perf_counter()
+    latencies = []
+    transitions = 0
+    flaps = 0
+    frame_count = 0
+    duration = 0.0
+    for frames in frames_list:
+        _, log_transitions, log_latencies = replay(frames, time_to_activate, time_to_deactivate, threshold)
+        latencies.extend(log_latencies)
+        transitions += len(log_transitions)
+        flaps += count_flaps(log_transitions, flap_window)
+        frame_count += len(frames)
+        if len(frames):
+            duration += frames.times[-1] - frames.times[0]
+
+    latencies = np.array(latencies) if latencies else np.array([np.nan])
+    hours = duration / 3600 if duration else np.nan
+    return {
+        'time_to_activate': time_to_activate,
+        'time_to_deactivate': time_to_deactivate,
+        'threshold': threshold,
+        'frames': frame_count,
+        'transitions': transitions,
+        'flaps': flaps,
+        'flaps_per_hour': flaps / hours,
+        'activations': int(np.count_nonzero(~np.isnan(latencies))),
+        'latency_mean': float(np.nanmean(latencies)) if not np.isnan(latencies).all() else np.nan,
+        'latency_p90': float(np.nanpercentile(latencies, 90)) if not np.isnan(latencies).all() else np.nan,
+        'latency_max': float(np.nanmax(latencies)) if not np.isnan(latencies).all() else np.nan,
+        'replay_seconds': time.perf_counter() - started,
+    }
+
+
+# Frames are handed to the pool workers once, not with every task
+_worker_frames = None
+
+
+def _init_worker(frames_list):
+    global _worker_frames
+    _worker_frames = frames_list
+
+
+def _evaluate_task(task):
+    return evaluate(_worker_frames, *task)
+
+
+def parse_values(text):
+    return [float(value) for value in text.split(',') if value.strip()]
+
+
+def find_logs(paths):
+    """Files as given, folders are searched for CAMERA logs"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                match = LOG_NAME.match(name)
+                if match and match['stream'] == 'CAMERA':
+                    found.append(os.path.join(path, name))
+        else:
+            found.append(path)
+    return found
+
+
+def write_timeline(frames_list, args, path):
+    parts = []
+    for frames in frames_list:
+        timeline, _, _ = replay(frames, args.activate[0], args.deactivate[0], args.threshold[0])
+        part = pd.DataFrame(timeline, columns=['time', 'state', 'nozzle_byte', 'fan_byte'])
+        part.insert(0, 'log', frames.name)
+        parts.append(part)
+    timeline = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    timeline.to_csv(path, index=False, float_format='%.3f')
+    print(f'{path}: {len(timeline)} 1F7 byte changes')
+
+
+def main():
+    defaults = SmartStateMachine
+    parser = argparse.ArgumentParser(
+        description='Replay CAMERA logs / detection dumps through the nozzle state machine')
+    parser.add_argument('paths', nargs='+', help='CAMERA logs, detection dumps, or folders with CAMERA logs')
+    parser.add_argument('--activate', type=parse_values, default=[defaults.time_to_activate],
+                        help=f'time_to_activate value(s), comma separated (default {defaults.time_to_activate})')
+    parser.add_argument('--deactivate', type=parse_values, default=[defaults.time_to_deactivate],
+                        help=f'time_to_deactivate value(s), comma separated (default {defaults.time_to_deactivate})')
+    parser.add_argument('--threshold', type=parse_values, default=[0.0],
+                        help='confidence threshold(s), comma separated (default 0: every logged detection counts)')
+    parser.add_argument('--flap-window', type=float, default=1.0,
+                        help='seconds within which a return to the previous state is a flap')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes for sweeps (default: all cores)')
+    parser.add_argument('-o', '--output', default='replay_results.csv',
+                        help='result CSV, one row per parameter combination')
+    parser.add_argument('--timeline', default=None,
+                        help='write the 1F7 byte timeline of the first parameter combination to this CSV')
+    args = parser.parse_args()
+
+    logs = find_logs(args.paths)
+    if not logs:
+        print('No logs found')
+        return 1
+
+    started = time.perf_counter()
+    frames_list = [load_frames(path) for path in logs]
+    frame_count = sum(len(f) for f in frames_list)
+    print(f'Loaded {frame_count} frames from {len(logs)} logs in {time.perf_counter() - started:.1f} s')
+
+    grid = list(itertools.product(args.activate, args.deactivate, args.threshold, [args.flap_window]))
+    started = time.perf_counter()
+    if len(grid) == 1 or args.jobs <= 1:
+        results = [evaluate(frames_list, *task) for task in grid]
+    else:
+        with Pool(min(args.jobs, len(grid)), initializer=_init_worker, initargs=(frames_list,)) as pool:
+            results = pool.map(_evaluate_task, grid, chunksize=1)
+    elapsed = time.perf_counter() - started
+
+    results = pd.DataFrame(results).sort_values(['flaps', 'latency_mean'], kind='stable')
+    results.to_csv(args.output, index=False, float_format='%.4f')
+    print(f'{len(grid)} parameter combinations, {frame_count * len(grid) / elapsed:.0f} frames/s')
+    print(results.drop(columns=['replay_seconds']).head(10).to_string(index=False))
+    print(f'Results written to {args.output}')
+
+    if args.timeline or len(grid) == 1:
+        write_timeline(frames_list, args, args.timeline or os.path.splitext(args.output)[0] + '_timeline.csv')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1090 @@
+import fcntl
+import gzip
+import json
+import math
+import numbers
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+STAGING_DIR_NAME = '.writing'
+STAGING_LOCK_NAME = '.lock'
+COLUMNAR_MAGIC = b'CLOG1\n'
+PARTIAL_SUFFIX = '.part'
+
+
+def format_log_time(timestamp=None):
+    """Format a timestamp the way the CSV loggers always have: HH:MM:SS.d00"""
+    if timestamp is None:
+        timestamp = time.time()
+    return _time_formatter.format(timestamp)
+
+
+class _LogTimeFormatter:
+    """Caches the HH:MM:SS part so strftime only runs once per second, not once per row."""
+    def __init__(self, tz=None):
+        # Local time of this machine when tz is None
+        self.tz = tz
+        # (second, prefix) kept in one tuple so the logging threads never see a torn update
+        self.cache = (None, '')
+
+    def format(self, timestamp):
+        second = int(timestamp)
+        cached_second, prefix = self.cache
+        if second != cached_second:
+            # Building a datetime and calling strftime is the expensive part; keep it per second
+            prefix = datetime.fromtimestamp(second, self.tz).strftime("%H:%M:%S")
+            self.cache = (second, prefix)
+        # Same rounding as datetime.fromtimestamp, truncated to tenths like the old [:-5] slice
+        tenths = min(round((timestamp - second) * 1e6) // 100000, 9)
+        return f'{prefix}.{tenths}00'
+
+
+_time_formatter = _LogTimeFormatter()
+
+
+def sync_directory(directory):
+    """fsync a directory so a rename into it survives a power cut"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class DurabilityPolicy:
+    """
+    Shared flush policy for every log writer on the SD card.
+
+    One committer thread wakes every sync_interval seconds and commits all registered writers
+    together (group commit): their buffered rows are written and each file is fsynced once. A
+    row is therefore on the card at most sync_interval seconds (plus the fsync itself) after it
+    was written, however slowly its stream produces rows. Between commits the writers only write
+    whole multiples of alignment bytes, so the card is not asked to rewrite the same flash page
+    for every small append.
+
+    Metrics (stats()):
+    - write_amplification: bytes of alignment-sized pages touched by all writes / bytes written.
+      Every flush that ends inside a page makes the card rewrite that page on the next one.
+    - flush latency: time to write out and fsync one writer's buffer (average, max, last).
+    - fsync latency: time spent in os.fsync alone.
+    """
+    def __init__(self, sync_interval=2.0, alignment=4096, fsync=True, stats_interval=600):
+        self.sync_interval = sync_interval
+        self.alignment = alignment
+        self.fsync = fsync
+        self.stats_interval = stats_interval
+        self.writers = []
+        self.lock = threading.Lock()
+
+        self.bytes_written = 0
+        self.bytes_touched = 0
+        self.write_count = 0
+        self.commit_count = 0
+        self.fsync_count = 0
+        self.fsync_time = 0.0
+        self.fsync_max = 0.0
+        self.flush_count = 0
+        self.flush_time = 0.0
+        self.flush_max = 0.0
+        self.flush_last = 0.0
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.commit_loop, name='log_committer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.commit_all()
+
+    def register(self, writer):
+        with self.lock:
+            self.writers.append(writer)
+
+    def unregister(self, writer):
+        with self.lock:
+            if writer in self.writers:
+                self.writers.remove(writer)
+
+    def commit_loop(self):
+        last_stats = time.monotonic()
+        while not self.stop_event.wait(self.sync_interval):
+            self.commit_all()
+            if self.stats_interval and time.monotonic() - last_stats >= self.stats_interval:
+                last_stats = time.monotonic()
+                print(f'Log I/O: {self.format_stats()}')
+
+    def commit_all(self):
+        with self.lock:
+            writers = list(self.writers)
+        for writer in writers:
+            try:
+                writer.commit()
+            except Exception as e:
+                print(f'Failed to commit {writer.data_type} log: {e}')
+        self.commit_count += 1
+
+    def aligned_size(self, offset, size):
+        """Largest part of size bytes written at offset that ends on a page boundary"""
+        if self.alignment <= 1:
+            return size
+        return max((offset + size) // self.alignment * self.alignment - offset, 0)
+
+    def record_write(self, offset, size):
+        if not size:
+            return
+        with self.lock:
+            self.write_count += 1
+            self.bytes_written += size
+            if self.alignment > 1:
+                pages = -(-(offset + size) // self.alignment) - offset // self.alignment
+                self.bytes_touched += pages * self.alignment
+            else:
+                self.bytes_touched += size
+
+    def record_flush(self, seconds):
+        with self.lock:
+            self.flush_count += 1
+            self.flush_time += seconds
+            self.flush_last = seconds
+            self.flush_max = max(self.flush_max, seconds)
+
+    def sync(self, file):
+        """Flush a file object and fsync it if the policy asks for it"""
+        file.flush()
+        if not self.fsync:
+            return
+        started = time.monotonic()
+        os.fsync(file.fileno())
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.fsync_count += 1
+            self.fsync_time += elapsed
+            self.fsync_max = max(self.fsync_max, elapsed)
+
+    def sync_directory(self, directory):
+        if self.fsync:
+            sync_directory(directory)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'bytes_written': self.bytes_written,
+                'bytes_touched': self.bytes_touched,
+                'write_amplification': self.bytes_touched / self.bytes_written if self.bytes_written else 0.0,
+                'writes': self.write_count,
+                'commits': self.commit_count,
+                'fsyncs': self.fsync_count,
+                'fsync_avg_ms': 1000 * self.fsync_time / self.fsync_count if self.fsync_count else 0.0,
+                'fsync_max_ms': 1000 * self.fsync_max,
+                'flushes': self.flush_count,
+                'flush_avg_ms': 1000 * self.flush_time / self.flush_count if self.flush_count else 0.0,
+                'flush_max_ms': 1000 * self.flush_max,
+                'flush_last_ms': 1000 * self.flush_last,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"{s['bytes_written'] / 1024:.0f} KB written, write amplification {s['write_amplification']:.2f}, "
+                f"flush avg {s['flush_avg_ms']:.1f} ms / max {s['flush_max_ms']:.1f} ms, "
+                f"fsync avg {s['fsync_avg_ms']:.1f} ms / max {s['fsync_max_ms']:.1f} ms")
+
+
+class FileSyncer:
+    """
+    Applies the same bounded-loss interval to files written by someone else, e.g. the video
+    fragments of a GStreamer splitmuxsink, which cannot be fsynced from inside the element.
+
+    track() a file when it is opened: it is fsynced every sync_interval seconds while open.
+    release() it when it is closed: it gets a last fsync and so does its directory.
+    """
+    def __init__(self, sync_interval=2.0):
+        self.sync_interval = sync_interval
+        self.paths = set()
+        self.lock = threading.Lock()
+        self.fsync_count = 0
+        self.fsync_time = 0.0
+        self.fsync_max = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.sync_loop, name='file_syncer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def track(self, path):
+        with self.lock:
+            self.paths.add(path)
+
+    def release(self, path):
+        with self.lock:
+            self.paths.discard(path)
+        self.sync_path(path)
+        sync_directory(os.path.dirname(path) or '.')
+
+    def sync_path(self, path):
+        started = time.monotonic()
+        try:
+            # fsync through any descriptor writes back the file's dirty pages
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError as e:
+            print(f'Failed to sync {path}: {e}')
+        finally:
+            os.close(fd)
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.fsync_count += 1
+            self.fsync_time += elapsed
+            self.fsync_max = max(self.fsync_max, elapsed)
+
+    def sync_loop(self):
+        while not self.stop_event.wait(self.sync_interval):
+            with self.lock:
+                paths = list(self.paths)
+            for path in paths:
+                self.sync_path(path)
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        self.thread.join(timeout)
+        with self.lock:
+            paths = list(self.paths)
+            self.paths.clear()
+        for path in paths:
+            self.sync_path(path)
+
+
+# Staging folder and its lock file of this process, per staging root
+_process_staging = {}
+_process_staging_lock = threading.Lock()
+
+
+def process_staging_directory(staging_root):
+    """
+    Staging folder of this process inside staging_root, locked for as long as the process runs
+
+    Every process stages its files in its own subfolder, so recovery can tell the files of a
+    process that is gone from the open files of a live writer of the same stream in another
+    process (the pipeline's CAMERA writer next to the logging server's, for example).
+    """
+    key = (staging_root, os.getpid())
+    with _process_staging_lock:
+        if key not in _process_staging:
+            directory = os.path.join(staging_root, str(os.getpid()))
+            os.makedirs(directory, exist_ok=True)
+            lock_file = open(os.path.join(directory, STAGING_LOCK_NAME), 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            _process_staging[key] = (directory, lock_file)
+        return _process_staging[key][0]
+
+
+class RotatingLogWriter:
+    """
+    Keeps one open log file per logged stream and buffers rows in memory.
+
+    Rows are flushed to disk when the buffer reaches flush_bytes, when flush_interval seconds
+    have passed since the last flush, or on close(). The file is rotated after max_duration
+    seconds or once it grows past max_bytes, and every new file starts with its header.
+
+    While a file is being written it lives in a hidden staging directory next to the upload
+    directory. Only when it is closed is it moved (same filesystem, atomic rename) into the
+    upload directory, so the uploader never picks up a half written file. Each process stages
+    in its own locked subfolder (see process_staging_directory); on start a writer only
+    releases files of its stream from folders whose process is gone.
+
+    With a DurabilityPolicy the time based flush is left to the policy's committer thread, which
+    also fsyncs the file, and buffer-full flushes only write whole pages (see DurabilityPolicy).
+
+    Subclasses define the on-disk format through extension, start_file(), append_row() and
+    write_pending().
+    """
+    extension = None
+    file_mode = 'w'
+    # write_pending() can write part of the buffer, so flushes can stop on a page boundary
+    partial_writes = False
+
+    def __init__(self, directory, serial_number, data_type, columns, max_duration,
+                 max_bytes=0, flush_interval=1.0, flush_bytes=64 * 1024, compressor=None, durability=None):
+        self.directory = directory
+        self.compressor = compressor
+        self.durability = durability
+        self.staging_root = os.path.join(directory, STAGING_DIR_NAME)
+        self.staging_directory = process_staging_directory(self.staging_root)
+        self.serial_number = serial_number
+        self.data_type = data_type
+        self.columns = list(columns)
+        self.time_index = self.columns.index('time') if 'time' in self.columns else None
+        self.max_duration = max_duration
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+
+        self.start_time = datetime.now().strftime("%Y_%m_%d_%H%M")
+        self.file_index = 0
+        self.file = None
+        self.file_name = None
+        self.file_opened_at = 0.0
+        self.file_bytes = 0
+
+        self.pending_bytes = 0
+        self.last_flush = time.monotonic()
+
+        self.rows_written = 0
+        self.flush_count = 0
+        self.unsynced = False
+        # The logging thread writes, but close() can also come from the server shutting down
+        # and commit() from the durability policy's committer thread
+        self.lock = threading.Lock()
+
+        self.recover_staged_files()
+        if self.durability is not None:
+            self.durability.register(self)
+
+    def recover_staged_files(self):
+        """
+        Release files of this stream left in staging by runs that did not close cleanly
+
+        Covers the folders of processes that are gone (their lock is free), this process's own
+        folder (a PID reused after a reboot) and files staged directly in the staging root by
+        versions without per-process folders. Folders of live processes are left alone.
+        """
+        self.recover_directory(self.staging_root)
+        self.recover_directory(self.staging_directory)
+        for name in os.listdir(self.staging_root):
+            directory = os.path.join(self.staging_root, name)
+            if directory == self.staging_directory or not os.path.isdir(directory):
+                continue
+            try:
+                with open(os.path.join(directory, STAGING_LOCK_NAME), 'a') as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # The process is still running
+                    self.recover_directory(directory)
+                    if os.listdir(directory) == [STAGING_LOCK_NAME]:
+                        os.remove(os.path.join(directory, STAGING_LOCK_NAME))
+                        os.rmdir(directory)
+            except OSError as e:
+                print(f'Failed to recover {self.data_type} logs from {directory}: {e}')
+
+    def recover_directory(self, directory):
+        """Release the files of this stream in one staging folder"""
+        for name in os.listdir(directory):
+            if not name.startswith(f'{self.serial_number}_{self.data_type}_'):
+                continue
+            staged = os.path.join(directory, name)
+            try:
+                if name.endswith(PARTIAL_SUFFIX):
+                    # Compression cut short; the uncompressed original is still here
+                    os.remove(staged)
+                    continue
+                self.publish(staged, name)
+                print(f'Recovered unfinished {self.data_type} log {name}')
+            except OSError as e:
+                print(f'Failed to recover {self.data_type} log {name}: {e}')
+
+    def publish(self, staged, name):
+        """Move a finished file from staging into the upload directory, compressing it first if enabled"""
+        if self.compressor is not None:
+            self.compressor.submit(staged, self.directory, name)
+        else:
+            os.replace(staged, os.path.join(self.directory, name))
+            if self.durability is not None:
+                self.durability.sync_directory(self.directory)
+
+    def open_file(self):
+        self.file_name = f'{self.serial_number}_{self.data_type}_{self.start_time}_{self.file_index}{self.extension}'
+        # Our own buffering decides when to hit the card, the file object only needs a small one
+        self.file = open(os.path.join(self.staging_directory, self.file_name), self.file_mode,
+                         buffering=self.flush_bytes)
+        self.file_opened_at = time.monotonic()
+        self.file_bytes = 0
+        self.start_file()
+
+    def release_file(self):
+        """Flush and close the current file and hand it over to the uploader"""
+        if self.file is None:
+            return
+        self._flush()
+        if self.durability is not None:
+            # The data has to be on the card before the rename makes the file visible
+            self.durability.sync(self.file)
+        self.file.close()
+        self.file = None
+        self.unsynced = False
+        staged = os.path.join(self.staging_directory, self.file_name)
+        try:
+            self.finish_file(staged)
+        except OSError as e:
+            print(f'Failed to release {self.data_type} log {self.file_name}: {e}')
+
+    def finish_file(self, staged):
+        self.publish(staged, self.file_name)
+
+    def rotate(self):
+        self.release_file()
+        self.file_index += 1
+        self.open_file()
+
+    def should_rotate(self, now):
+        if self.max_duration and now - self.file_opened_at >= self.max_duration:
+            return True
+        if self.max_bytes and self.file_bytes + self.pending_bytes >= self.max_bytes:
+            return True
+        return False
+
+    def should_flush(self, now):
+        if self.pending_bytes >= self.flush_bytes:
+            return True
+        # The durability policy's committer takes care of time based flushes
+        return self.durability is None and now - self.last_flush >= self.flush_interval
+
+    def write_row(self, values):
+        """
+        Queue one row (a sequence of values in column order) for writing.
+
+        The 'time' column may hold a raw epoch timestamp; it is written as HH:MM:SS.d00.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if self.file is None:
+                self.open_file()
+            elif self.should_rotate(now):
+                self.rotate()
+
+            self.append_row(values)
+            self.rows_written += 1
+
+            if self.should_flush(now):
+                self._flush(aligned=self.durability is not None)
+
+    def write_dict(self, dictionary):
+        self.write_row(list(dictionary.values()))
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self, aligned=False):
+        """Write the buffered rows; with aligned only the part that ends on a page boundary"""
+        if self.file is None:
+            return
+        if self.pending_bytes:
+            offset = self.file_bytes
+            size = None
+            if aligned and self.partial_writes:
+                size = self.durability.aligned_size(offset, self.pending_bytes)
+            if size != 0:
+                self.write_pending(size)
+                self.flush_count += 1
+                self.unsynced = True
+                if self.durability is not None:
+                    self.durability.record_write(offset, self.file_bytes - offset)
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def commit(self):
+        """Write everything buffered and fsync it, called by the durability policy's committer"""
+        with self.lock:
+            if self.file is None or not (self.pending_bytes or self.unsynced):
+                return
+            started = time.monotonic()
+            self._flush()
+            self.durability.sync(self.file)
+            self.unsynced = False
+            self.durability.record_flush(time.monotonic() - started)
+
+    def close(self):
+        with self.lock:
+            self.release_file()
+        if self.durability is not None:
+            self.durability.unregister(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start_file(self):
+        raise NotImplementedError
+
+    def append_row(self, values):
+        raise NotImplementedError
+
+    def write_pending(self, size=None):
+        """Write size bytes of the buffer (all of it when None) and keep the rest pending"""
+        raise NotImplementedError
+
+
+class CsvLogWriter(RotatingLogWriter):
+    """Rotating writer producing the plain CSV files the uploader and analysts expect"""
+    extension = '.csv'
+    partial_writes = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.header = ','.join(self.columns) + '\n'
+        self.pending = []
+
+    def start_file(self):
+        self.pending.append(self.header)
+        self.pending_bytes += len(self.header)
+
+    def append_row(self, values):
+        if self.time_index is not None and isinstance(values[self.time_index], float):
+            values = list(values)
+            values[self.time_index] = format_log_time(values[self.time_index])
+        line = ','.join(str(x) for x in values) + '\n'
+        self.pending.append(line)
+        self.pending_bytes += len(line)
+
+    def write_pending(self, size=None):
+        data = ''.join(self.pending)
+        if size is None or size >= len(data):
+            self.pending = []
+        else:
+            # Rows split at the page boundary, the rest goes out with the next flush
+            data, rest = data[:size], data[size:]
+            self.pending = [rest]
+        self.file.write(data)
+        self.file_bytes += len(data)
+        self.pending_bytes -= len(data)
+
+
+# Value kinds recorded next to every columnar value so the CSV export can reproduce str(value)
+KIND_MIXED = -1
+KIND_FLOAT = 0
+KIND_INT = 1
+KIND_FLOAT32 = 2
+KIND_BOOL = 3
+KIND_TEXT = 4
+
+_VALUE_KINDS = {
+    float: KIND_FLOAT,
+    np.float64: KIND_FLOAT,
+    int: KIND_INT,
+    np.int8: KIND_INT, np.int16: KIND_INT, np.int32: KIND_INT, np.int64: KIND_INT,
+    np.uint8: KIND_INT, np.uint16: KIND_INT, np.uint32: KIND_INT, np.uint64: KIND_INT,
+    np.float32: KIND_FLOAT32,
+    np.float16: KIND_FLOAT32,
+    bool: KIND_BOOL,
+    np.bool_: KIND_BOOL,
+}
+
+# Storage types for a column block, narrowest first. The position in this list is the code on disk.
+_STORAGE_DTYPES = [np.dtype(t) for t in ('<u1', '<i1', '<i2', '<i4', '<f4', '<f8')]
+_FLOAT64_CODE = len(_STORAGE_DTYPES) - 1
+
+_MAX_EXACT_INT = 2 ** 53
+
+_BLOCK_HEADER = struct.Struct('<4sIII')  # marker, n_rows, n_columns, text table size
+_BLOCK_MARKER = b'BLK1'
+
+
+class ColumnarLogWriter(RotatingLogWriter):
+    """
+    Rotating writer storing rows column-wise as typed binary blocks instead of CSV text.
+
+    Rows are collected per column and written every block_rows rows (and on rotation or close)
+    as one block. Each column of a block is stored in the narrowest dtype that holds it exactly
+    (trying the type given for it in signal_types first), and only once if it did not change
+    during the block. A kind code keeps ints, floats, float32s, bools and text apart, so
+    export_columnar_log() reproduces the exact CSV the CsvLogWriter would have written. Text
+    values (e.g. 'Connection_Error') are stored once per block in a table and referenced by index.
+
+    Nothing is stringified on the logging thread. Without a DurabilityPolicy rows in the current
+    block are lost on a power cut, so block_rows bounds the loss instead of flush_interval; with
+    one, every commit writes the rows collected so far as a (shorter) block.
+
+    File layout: COLUMNAR_MAGIC, one JSON header line, then blocks of
+    [block header][text table as JSON][kind, dtype code, constant flag per column]
+    followed per column by [kinds if mixed][values].
+    """
+    extension = '.clog'
+    file_mode = 'wb'
+
+    def __init__(self, *args, block_rows=600, signal_types=None, export_csv=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.block_rows = block_rows
+        hints = {k: np.dtype(v).newbyteorder('<') for k, v in (signal_types or {}).items()}
+        # Storage types to try per column, the configured one first
+        self.candidates = [[hints[name]] + _STORAGE_DTYPES if name in hints else _STORAGE_DTYPES
+                           for name in self.columns]
+        self.export_csv = export_csv
+        self.pending_columns = [[] for _ in self.columns]
+        self.pending_rows = 0
+
+    def recover_directory(self, directory):
+        # A CSV next to its .clog is an export cut short by a shutdown, the .clog is the complete copy
+        names = set(os.listdir(directory))
+        for name in names:
+            if not name.startswith(f'{self.serial_number}_{self.data_type}_'):
+                continue
+            if name.endswith(CsvLogWriter.extension) and name[:-len(CsvLogWriter.extension)] + self.extension in names:
+                os.remove(os.path.join(directory, name))
+        super().recover_directory(directory)
+
+    def start_file(self):
+        header = {
+            'columns': self.columns,
+            'serial_number': self.serial_number,
+            'data_type': self.data_type,
+            'start_time': self.start_time,
+            'file_index': self.file_index,
+            # The device's UTC offset in seconds, so an export on another machine writes the device's local time
+            'utc_offset': datetime.now().astimezone().utcoffset().total_seconds(),
+        }
+        data = COLUMNAR_MAGIC + json.dumps(header).encode() + b'\n'
+        self.file.write(data)
+        self.file_bytes += len(data)
+
+    def should_flush(self, now):
+        return self.pending_rows >= self.block_rows
+
+    def append_row(self, values):
+        for column, value in zip(self.pending_columns, values):
+            column.append(value)
+        self.pending_rows += 1
+        # Rough on-disk estimate, only used for size based rotation
+        self.pending_bytes += 2 * len(self.columns)
+
+    def encode_column(self, column, candidates, texts):
+        """
+        Turn one column of a block into (kind, kinds array or None, values array).
+
+        Text values are added once to the block's shared text table and stored as their index in it.
+        """
+        types = set(map(type, column))
+        if len(types) == 1:
+            kind = _VALUE_KINDS.get(types.pop(), KIND_TEXT)
+            kinds = None
+        else:
+            kind = KIND_MIXED
+            kinds = np.fromiter((_VALUE_KINDS.get(type(v), KIND_TEXT) for v in column), dtype=np.int8,
+                                count=len(column))
+
+        numeric = column
+        if kind == KIND_TEXT:
+            numeric = [texts.setdefault(str(v), len(texts)) for v in column]
+        elif kind == KIND_MIXED and (kinds == KIND_TEXT).any():
+            numeric = [texts.setdefault(str(v), len(texts)) if k == KIND_TEXT else v
+                       for k, v in zip(kinds.tolist(), column)]
+        values = np.array(numeric, dtype=np.float64)
+
+        # Ints past 2**53 do not survive float64, keep them as text
+        if kind in (KIND_INT, KIND_MIXED):
+            big = np.abs(values) >= _MAX_EXACT_INT
+            if kind == KIND_MIXED:
+                big &= kinds == KIND_INT
+            if big.any():
+                if kinds is None:
+                    kinds = np.full(len(column), kind, dtype=np.int8)
+                    kind = KIND_MIXED
+                for i in np.flatnonzero(big):
+                    values[i] = texts.setdefault(str(column[i]), len(texts))
+                    kinds[i] = KIND_TEXT
+        return kind, kinds, self.narrow(values, candidates)
+
+    @staticmethod
+    def narrow(values, candidates):
+        """Return (dtype code, values) in the first storage type that holds every value exactly"""
+        for dtype in candidates:
+            if dtype == _STORAGE_DTYPES[_FLOAT64_CODE]:
+                break
+            with np.errstate(invalid='ignore', over='ignore'):
+                narrowed = values.astype(dtype)
+            if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+                return _STORAGE_DTYPES.index(dtype), narrowed
+        return _FLOAT64_CODE, values.astype(_STORAGE_DTYPES[_FLOAT64_CODE], copy=False)
+
+    def write_pending(self, size=None):
+        n_rows = self.pending_rows
+        texts = {}
+        descriptors = np.empty((len(self.columns), 3), dtype=np.int8)
+        payload = []
+        for i, (column, candidates) in enumerate(zip(self.pending_columns, self.candidates)):
+            kind, kinds, (code, values) = self.encode_column(column, candidates, texts)
+            # A column that did not change during the block is stored once
+            constant = kinds is None and np.array_equal(values, np.broadcast_to(values[0], values.shape),
+                                                        equal_nan=True)
+            descriptors[i] = (kind, code, constant)
+            if kinds is not None:
+                payload.append(kinds.tobytes())
+            payload.append(values[:1].tobytes() if constant else values.tobytes())
+
+        text_table = json.dumps(list(texts)).encode()
+        data = b''.join([_BLOCK_HEADER.pack(_BLOCK_MARKER, n_rows, len(self.columns), len(text_table)),
+                         text_table, descriptors.tobytes()] + payload)
+        self.file.write(data)
+        self.file_bytes += len(data)
+
+        self.pending_columns = [[] for _ in self.columns]
+        self.pending_rows = 0
+        self.pending_bytes = 0
+
+    def finish_file(self, staged):
+        if not self.export_csv:
+            super().finish_file(staged)
+            return
+        # Convert next to the staged file, then release only the CSV
+        csv_name = self.file_name[:-len(self.extension)] + CsvLogWriter.extension
+        staged_csv = os.path.join(self.staging_directory, csv_name)
+        thread = threading.Thread(target=self.export_and_release, args=(staged, staged_csv, csv_name))
+        thread.daemon = True
+        thread.start()
+
+    def export_and_release(self, staged, staged_csv, csv_name):
+        try:
+            export_columnar_log(staged, staged_csv)
+            os.remove(staged)
+            self.publish(staged_csv, csv_name)
+        except Exception as e:
+            print(f'Failed to export {self.data_type} log {os.path.basename(staged)} to CSV: {e}')
+
+
+class LogCompressor:
+    """
+    Compresses finished log files on one low priority background thread before they reach the uploader.
+
+    Writers hand over files from their staging directory with submit(). The compressed copy is
+    written next to it as <name>.gz.part (or .zst.part), renamed into the upload directory once
+    complete, and the original is removed. If the device stops half way the original is still in
+    staging and gets picked up again on the next start.
+    """
+    def __init__(self, method='gzip', level=6, nice=19, durability=None):
+        if method == 'zstd' and zstandard is None:
+            print('zstandard is not installed, compressing logs with gzip instead')
+            method = 'gzip'
+        self.method = method
+        self.level = level
+        self.nice = nice
+        self.durability = durability
+        self.suffix = '.zst' if method == 'zstd' else '.gz'
+        self.queue = queue.Queue()
+        self.files_compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.thread = threading.Thread(target=self.compress_loop, name='log_compressor')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, staged, directory, name):
+        self.queue.put((staged, directory, name))
+
+    def compress_loop(self):
+        try:
+            # Linux applies nice per thread, so only this worker drops its priority
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+        except (AttributeError, OSError) as e:
+            print(f'Could not lower log compressor priority: {e}')
+        while True:
+            staged, directory, name = self.queue.get()
+            if staged is None:
+                break
+            try:
+                self.compress(staged, directory, name)
+            except Exception as e:
+                # Never lose the log: hand over the uncompressed file instead
+                print(f'Failed to compress log {name}, uploading it uncompressed: {e}')
+                try:
+                    os.replace(staged, os.path.join(directory, name))
+                except OSError as e:
+                    print(f'Failed to release log {name}: {e}')
+
+    def compress(self, staged, directory, name):
+        partial = staged + self.suffix + PARTIAL_SUFFIX
+        with open(staged, 'rb') as src, open(partial, 'wb') as dst:
+            if self.method == 'zstd':
+                zstandard.ZstdCompressor(level=self.level).copy_stream(src, dst)
+            else:
+                # mtime=0 keeps the output reproducible for the same input
+                with gzip.GzipFile(filename=name, mode='wb', compresslevel=self.level, fileobj=dst, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, 1024 * 1024)
+            if self.durability is not None:
+                self.durability.sync(dst)
+        self.bytes_in += os.path.getsize(staged)
+        self.bytes_out += os.path.getsize(partial)
+        os.replace(partial, os.path.join(directory, name + self.suffix))
+        if self.durability is not None:
+            self.durability.sync_directory(directory)
+        os.remove(staged)
+        self.files_compressed += 1
+
+    def stop(self, timeout=30):
+        """Finish the files already queued, then stop the worker"""
+        self.queue.put((None, None, None))
+        self.thread.join(timeout)
+
+
+class QueuedLogWriter:
+    """
+    Hands rows from a time critical thread (e.g. a GStreamer pad probe) to a log writer.
+
+    log() only appends the row to a deque, which is atomic in CPython and needs no lock, so the
+    calling thread never waits for formatting or the card. A background thread drains the deque
+    into the writer every poll_interval seconds. If the writer falls behind by more than
+    max_rows rows the oldest ones are dropped (and counted) rather than blocking the caller.
+    on_drain(n_rows) is called on the background thread after every drain that wrote rows.
+    """
+    def __init__(self, writer, max_rows=10000, poll_interval=0.1, on_drain=None):
+        self.writer = writer
+        self.max_rows = max_rows
+        self.poll_interval = poll_interval
+        self.on_drain = on_drain
+        self.queue = deque(maxlen=max_rows)
+        self.rows_queued = 0
+        self.rows_dropped = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.drain_loop, name=f'{writer.data_type.lower()}_log_queue')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def log(self, values):
+        """Queue one row (values in column order). Safe to call from any thread."""
+        if len(self.queue) == self.max_rows:
+            self.rows_dropped += 1
+        self.queue.append(values)
+        self.rows_queued += 1
+
+    def drain(self):
+        rows = 0
+        while True:
+            try:
+                values = self.queue.popleft()
+            except IndexError:
+                break
+            self.writer.write_row(values)
+            rows += 1
+        if rows and self.on_drain is not None:
+            try:
+                self.on_drain(rows)
+            except Exception as e:
+                print(f'{self.writer.data_type} log drain callback failed: {e}')
+        return rows
+
+    def drain_loop(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.drain()
+            except Exception as e:
+                print(f'Failed to write queued {self.writer.data_type} rows: {e}')
+
+    def stop(self, timeout=5):
+        """Write what is still queued and close the writer"""
+        self.stop_event.set()
+        self.thread.join(timeout)
+        self.drain()
+        self.writer.close()
+
+
+def create_log_writer(config, data_type, columns, compressor=None, durability=None):
+    """Create the writer configured in logging_config.yaml (csv or columnar) for one stream"""
+    writer_settings = dict(
+        directory=config.get_directory(),
+        serial_number=config.get_serial_number(),
+        data_type=data_type,
+        columns=columns,
+        max_duration=config.get_log_duration(),
+        max_bytes=config.get_max_log_size(),
+        flush_interval=config.get_log_flush_interval(),
+        flush_bytes=config.get_log_buffer_size(),
+        compressor=compressor,
+        durability=durability
+    )
+    if config.get_log_format() == 'columnar':
+        return ColumnarLogWriter(
+            block_rows=config.get_columnar_block_rows(),
+            signal_types=config.get_signal_types(data_type),
+            export_csv=config.get_columnar_export_csv(),
+            **writer_settings
+        )
+    return CsvLogWriter(**writer_settings)
+
+
+def create_durability_policy(config):
+    """The configured DurabilityPolicy (not started), or None when log_sync_interval is 0"""
+    if not config.get_log_sync_interval():
+        return None
+    return DurabilityPolicy(
+        sync_interval=config.get_log_sync_interval(),
+        alignment=config.get_log_write_alignment(),
+        fsync=config.get_log_fsync(),
+        stats_interval=config.get_log_io_stats_interval()
+    )
+
+
+def create_log_compressor(config, durability=None):
+    """The configured LogCompressor, or None when log_compression is none"""
+    if config.get_log_compression() not in ('gzip', 'zstd'):
+        return None
+    return LogCompressor(
+        method=config.get_log_compression(),
+        level=config.get_log_compression_level(),
+        durability=durability
+    )
+
+
+def read_columnar_log(path):
+    """
+    Read a .clog file written by ColumnarLogWriter.
+
+    Returns (header dict, list of blocks); each block is (text table, [(kinds, values) per column])
+    where kinds and values are arrays of the block's length. A block cut short by a power loss
+    at the end of the file is ignored.
+    """
+    blocks = []
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f'{path} is not a columnar log')
+        header = json.loads(f.readline())
+
+        def read_exact(size):
+            data = f.read(size)
+            if len(data) != size:
+                raise EOFError
+            return data
+
+        while True:
+            try:
+                marker, n_rows, n_columns, text_size = _BLOCK_HEADER.unpack(read_exact(_BLOCK_HEADER.size))
+                if marker != _BLOCK_MARKER:
+                    raise ValueError(f'Corrupt block in {path}')
+                texts = json.loads(read_exact(text_size))
+                descriptors = np.frombuffer(read_exact(3 * n_columns), dtype=np.int8).reshape(n_columns, 3)
+                columns = []
+                for kind, code, constant in descriptors.tolist():
+                    if kind == KIND_MIXED:
+                        kinds = np.frombuffer(read_exact(n_rows), dtype=np.int8)
+                    else:
+                        kinds = np.full(n_rows, kind, dtype=np.int8)
+                    dtype = _STORAGE_DTYPES[code]
+                    count = 1 if constant else n_rows
+                    values = np.frombuffer(read_exact(count * dtype.itemsize), dtype=dtype)
+                    if constant:
+                        values = np.repeat(values, n_rows)
+                    columns.append((kinds, values))
+            except EOFError:
+                # Clean end of file, or a block cut short
+                break
+            blocks.append((texts, columns))
+    return header, blocks
+
+
+def _format_value(kind, value):
+    if kind == KIND_FLOAT:
+        return str(float(value))
+    if kind == KIND_INT:
+        return str(int(value))
+    if kind == KIND_FLOAT32:
+        return str(np.float32(value))
+    return str(bool(value))
+
+
+def export_columnar_log(path, csv_path):
+    """Write the CSV that CsvLogWriter would have produced for the rows stored in a .clog file"""
+    header, blocks = read_columnar_log(path)
+    columns = header['columns']
+    # Files written before the header had utc_offset fall back to the local time of this machine
+    if header.get('utc_offset') is None:
+        time_formatter = _time_formatter
+    else:
+        time_formatter = _LogTimeFormatter(timezone(timedelta(seconds=header['utc_offset'])))
+    time_index = columns.index('time') if 'time' in columns else None
+    with open(csv_path, 'w') as f:
+        f.write(','.join(columns) + '\n')
+        for texts, block_columns in blocks:
+            columns_out = []
+            for i, (kinds, values) in enumerate(block_columns):
+                out = []
+                for kind, value in zip(kinds.tolist(), values.tolist()):
+                    if kind == KIND_TEXT:
+                        out.append(texts[int(value)])
+                    elif i == time_index and kind == KIND_FLOAT:
+                        out.append(time_formatter.format(value))
+                    else:
+                        out.append(_format_value(kind, value))
+                columns_out.append(out)
+            f.writelines(','.join(row) + '\n' for row in zip(*columns_out))
+
+
+class ChangeFilter:
+    """
+    Decides whether a logged row carries new information.
+
+    A row passes when any signal moved by more than its deadband since the last row that passed,
+    when a non numeric signal changed at all, or when max_interval seconds passed without a row
+    (keep-alive). The 'time' column is never compared. With key_column set (e.g. PM sensor_id),
+    rows are compared against the last row with the same key.
+    """
+    def __init__(self, columns, max_interval=5.0, default_deadband=0, deadbands=None, key_column=None):
+        deadbands = deadbands or {}
+        self.max_interval = max_interval
+        self.key_column = key_column
+        # (column, deadband) pairs resolved once so the per row check is a flat loop
+        self.tracked = [(column, deadbands.get(column, default_deadband))
+                        for column in columns if column != 'time']
+        self.last_rows = {}  # {key: (monotonic time, {column: value})}
+        self.rows_seen = 0
+        self.rows_passed = 0
+
+    @staticmethod
+    def moved(previous, value, deadband):
+        if isinstance(value, numbers.Real) and isinstance(previous, numbers.Real):
+            value_nan = math.isnan(value)
+            previous_nan = math.isnan(previous)
+            if value_nan or previous_nan:
+                return value_nan != previous_nan
+            if deadband:
+                return abs(value - previous) > deadband
+            return value != previous
+        return value != previous
+
+    def should_write(self, dictionary, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.rows_seen += 1
+        key = dictionary.get(self.key_column) if self.key_column else None
+        last = self.last_rows.get(key)
+
+        write = last is None or now - last[0] >= self.max_interval
+        if not write:
+            previous_row = last[1]
+            for column, deadband in self.tracked:
+                if self.moved(previous_row.get(column), dictionary.get(column), deadband):
+                    write = True
+                    break
+
+        if write:
+            self.last_rows[key] = (now, dict(dictionary))
+            self.rows_passed += 1
+        return write
@@ -82,6 +82,7 @@ from app_context import Config, AppContext, GETFPS
 from gst_helper_functions import make_bucher_ds_filesrc, make_element, link_request_srcpad_to_static_sinkpad, link_static_srcpad_pad_to_request_sinkpad, modify_deepstream_config_files
 from enum import Enum
 from utils import Configuration
+from log_writer import FileSyncer, QueuedLogWriter, create_durability_policy, create_log_compressor, create_log_writer
 from can_state_machine import SmartStateMachine
 from can_client import CanClient
 from csi.utils.probes.probe_functions import compute_csi_buffer_probe
@@ -188,10 +189,7 @@ def nozzlenet_src_pad_buffer_probe(pad, info, u_data):
         except StopIteration:
             pass
         if obj_meta.class_id not in search_item_list_:
-            print('class id = ', obj_meta.class_id)
-            print('search item list = ', search_item_list_)
             pyds.nvds_remove_obj_meta_from_frame(frame_meta, obj_meta)
-            print(f'class = {obj_meta.class_id} object deleted , total deleted = {deleted}')
             deleted += 1
             obj_id += 1
         else:
@@ -236,6 +234,14 @@ def nozzlenet_src_pad_buffer_probe(pad, info, u_data):
             print(f'CAN communication error: {e}')
     
     pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
+
+    camera_logger = app_context.get_value('camera_logger')
+    if camera_logger is not None:
+        # Logged here, one row per frame; the writer formats the raw timestamp
+        prediction_dict['time'] = time.time()
+        camera_logger.log(list(prediction_dict.values()) + [frame_number, frame_meta.buf_pts])
+        return Gst.PadProbeReturn.OK
+
     prediction_dict['time'] = f"{datetime.now().strftime('%H:%M:%S.%f')[:-5]}00"
 
     for key, value in prediction_dict.items():
@@ -543,6 +549,15 @@ def bus_call(bus, message, loop):
                 if ret == Gst.StateChangeReturn.FAILURE:
                     sys.stderr.write('Failed to set pipeline to NULL state\n')
                 loop.quit()
+    elif t == Gst.MessageType.ELEMENT:
+        structure = message.get_structure()
+        file_syncer = app_context.get_value('file_syncer')
+        if structure is not None and file_syncer is not None:
+            # splitmuxsink announces every fragment it opens and closes
+            if structure.get_name() == 'splitmuxsink-fragment-opened':
+                file_syncer.track(structure.get_string('location'))
+            elif structure.get_name() == 'splitmuxsink-fragment-closed':
+                file_syncer.release(structure.get_string('location'))
     elif t == Gst.MessageType.WARNING:
         err, debug = message.parse_warning()
         sys.stderr.write('Warning: %s: %s\n' % (err, debug))
@@ -1365,6 +1380,12 @@ def create_bucher_inference_bin(app_context=app_context):
     modify_deepstream_config_files(infer_config_file_path, infer_config_file_path, 'property', 'input-tensor-from-meta', infer_config_input_tensor_from_meta, app_context)
     modify_deepstream_config_files(infer_config_file_path, infer_config_file_path, 'property', 'infer-dims', infer_config_infer_dims, app_context)
 
+    # classes outside the search item list are dropped by nvinfer, so the probe only walks the detections it uses
+    search_item_list_ = app_context.get_value('search_item_list')
+    infer_config_filter_out_class_ids = ';'.join(str(class_id) for class_id in sorted({category.value for category in DETECTION_CATEGORIES} - set(search_item_list_)))
+    if infer_config_filter_out_class_ids:
+        modify_deepstream_config_files(infer_config_file_path, infer_config_file_path, 'property', 'filter-out-class-ids', infer_config_filter_out_class_ids, app_context)
+
     metamux_config_file_path = config_paths_dict_.get('metamux', None)['path']
     cameras = app_context.get_value('init_config')['cameras']
     num_sources = len([camera for camera in cameras if camera.get('capture_test_passed') == True])
@@ -1598,6 +1619,28 @@ def main(args):
     app_context.set_value('state_machine', state_machine)
     app_context.set_value('serial_number', serial_number)
     app_context.set_value('log_duration', log_duration) 
+    file_syncer = None
+    if logging_config.get_log_sync_interval():
+        # Recorded video fragments get the same bounded loss on power cut as the CSV logs
+        file_syncer = FileSyncer(sync_interval=logging_config.get_log_sync_interval())
+        app_context.set_value('file_syncer', file_syncer)
+    camera_logger = None
+    log_durability = None
+    if logging_config.get_camera_log_source() == 'pipeline':
+        # CAMERA rows are written here per frame instead of being sampled by the CAN server
+        log_durability = create_durability_policy(logging_config)
+        if log_durability:
+            log_durability.start()
+        camera_writer = create_log_writer(logging_config, 'CAMERA', columns + ['frame_number', 'pts'],
+                                          create_log_compressor(logging_config, log_durability), log_durability)
+
+        def camera_log_heartbeat(rows):
+            # The server's CAMERA logging thread used to flag live predictions in the fan byte
+            if can_client.connected:
+                can_client.update_can_bytes({'fan_byte': {'operation': 'update_bits', 'value': 0xF0, 'mask': 0xF0}})
+
+        camera_logger = QueuedLogWriter(camera_writer, on_drain=camera_log_heartbeat)
+        app_context.set_value('camera_logger', camera_logger)
     app_context.set_value('camera_columns', columns)
     app_context.set_value('csi_columns', csi_columns)
     app_context.set_value('log_directory', log_directory)
@@ -1768,6 +1811,16 @@ def main(args):
     notify_systemd('STOPPING=1')
     if pipeline and pipeline.get_state(Gst.CLOCK_TIME_NONE) != Gst.State.NULL:
         pipeline.set_state(Gst.State.NULL)
+    if file_syncer is not None:
+        file_syncer.stop()
+    if camera_logger is not None:
+        camera_logger.stop()
+        if camera_logger.rows_dropped:
+            print(f'CAMERA logger dropped {camera_logger.rows_dropped} of {camera_logger.rows_queued} rows')
+        if camera_writer.compressor is not None:
+            camera_writer.compressor.stop()
+    if log_durability is not None:
+        log_durability.stop()
     logger.debug(f"app context: shutdown initiated by user process = {app_context.get_boolean('shutdown_initiated_by_user_process').value}")
     logger.debug(f"app context: process_id = {app_context.get_int('main_process_id').value}")
     logger.debug(f"app context: pid_path = {app_context.get_string('pid_path')}")
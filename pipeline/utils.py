@@ -66,6 +66,62 @@ class Configuration:
     
     def get_log_duration(self):
         return self.get('logging_settings')[1].get('max_log_duration')
+
+    def get_logging_setting(self, key, default=None):
+        # Newer settings are looked up by name so older config files without them keep working
+        for setting in self.get('logging_settings'):
+            if key in setting:
+                return setting[key]
+        return default
+
+    def get_max_log_size(self):
+        return int(self.get_logging_setting('max_log_size_mb', 0) * 1024 * 1024)
+
+    def get_log_flush_interval(self):
+        return self.get_logging_setting('log_flush_interval', 2.0)
+
+    def get_log_buffer_size(self):
+        return int(self.get_logging_setting('log_buffer_size_kb', 64) * 1024)
+
+    def get_log_format(self):
+        return self.get_logging_setting('log_format', 'csv')
+
+    def get_columnar_block_rows(self):
+        return self.get_logging_setting('columnar_block_rows', 600)
+
+    def get_columnar_export_csv(self):
+        return bool(self.get_logging_setting('columnar_export_csv', 1))
+
+    def get_log_compression(self):
+        return self.get_logging_setting('log_compression', 'none')
+
+    def get_log_compression_level(self):
+        return self.get_logging_setting('log_compression_level', 6)
+
+    def get_log_sync_interval(self):
+        return self.get_logging_setting('log_sync_interval', 0)
+
+    def get_log_write_alignment(self):
+        return int(self.get_logging_setting('log_write_alignment_kb', 4) * 1024)
+
+    def get_log_fsync(self):
+        return bool(self.get_logging_setting('log_fsync', 0))
+
+    def get_log_io_stats_interval(self):
+        return self.get_logging_setting('log_io_stats_interval', 600)
+
+    def get_camera_log_source(self):
+        return self.get_logging_setting('camera_log_source', 'server')
+
+    def get_signal_types(self, data_type):
+        return (self.get('signal_types') or {}).get(data_type, {})
+
+    def get_change_logging(self, data_type):
+        """On-change logging settings for one stream, or None when the stream logs every cycle"""
+        settings = (self.get('change_logging') or {}).get(data_type)
+        if not settings or not settings.get('enabled'):
+            return None
+        return settings
     
     def get_pm_columns(self):
         return self.get('signal_settings').get('pm_signals')
@@ -3,6 +3,9 @@
 Rename CSV files from old naming scheme to new.
 
 SN217993_CAN_2025_11_12_0819_0.csv -> CAN_TMS_SN217993_2025-11-12T08:19:00.000Z.csv
+
+Compressed logs keep their suffix:
+SN217993_CAN_2025_11_12_0819_0.csv.gz -> CAN_TMS_SN217993_2025-11-12T08:19:00.000Z.csv.gz
 """
 
 import os
@@ -11,10 +14,18 @@ import shutil
 import argparse
 from pathlib import Path
 
+# compression suffixes written by the logger after .csv
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
 
 def parse_source_filename(filename: str) -> dict | None:
     """Parse filename into components. Returns None if it doesn't match."""
-    # Remove .csv extension
+    # Remove compression suffix and .csv extension
+    compression = ''
+    for suffix in COMPRESSED_SUFFIXES:
+        if filename.endswith(suffix):
+            compression = suffix
+            filename = filename[:-len(suffix)]
     name = filename.rsplit('.', 1)[0]
 
     # Pattern: VEHICLE_ID_DATA_TYPE_YEAR_MONTH_DAY_TIME_INCREMENT
@@ -41,7 +52,8 @@ def parse_source_filename(filename: str) -> dict | None:
         'day': day,
         'hours': hours,
         'minutes': minutes,
-        'increment': int(increment)
+        'increment': int(increment),
+        'compression': compression
     }
 
 
@@ -54,7 +66,7 @@ def create_target_filename(parsed: dict) -> str:
         f"{parsed['hours']}:{parsed['minutes']}:00.000Z"
     )
 
-    return f"{parsed['data_type']}_TMS_{parsed['vehicle_id']}_{timestamp}.csv"
+    return f"{parsed['data_type']}_TMS_{parsed['vehicle_id']}_{timestamp}.csv{parsed.get('compression', '')}"
 
 
 def rename_csvs(source_dir: str, output_dir: str | None = None, dry_run: bool = False) -> None:
@@ -79,8 +91,13 @@ def rename_csvs(source_dir: str, output_dir: str | None = None, dry_run: bool =
     if not dry_run:
         renamed_dir.mkdir(exist_ok=True)
 
-    # Find all CSV files in source directory and subdirectories
-    csv_files = list(source_path.glob("**/*.csv"))
+    # Find all CSV files (plain or compressed) in source directory and subdirectories.
+    # Hidden folders (e.g. the logger's .writing staging folder) hold files still being written.
+    patterns = ["**/*.csv"] + [f"**/*.csv{suffix}" for suffix in COMPRESSED_SUFFIXES]
+    csv_files = [
+        f for pattern in patterns for f in source_path.glob(pattern)
+        if not any(part.startswith('.') for part in f.relative_to(source_path).parts)
+    ]
 
     if not csv_files:
         print(f"No CSV files found in: {source_path}")
@@ -29,6 +29,14 @@ bloblogger.setLevel(logging.WARNING)
 
 CONFIG_FILE = Path(os.getcwd()) / "config.json"
 
+# compressed csv logs from the logger: content encoding per extra suffix
+COMPRESSION_ENCODINGS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+# still being written/compressed by the logger, never upload
+PARTIAL_SUFFIX = '.part'
+
 
 def load_config():
     """load config and make paths"""
@@ -91,7 +99,7 @@ def extract_timestamp_minute(filename):
 
 def extract_data_type_from_csv(filename):
     """extract DATA_TYPE from CSV filename: [DATA_TYPE]_[VEHICLE_TYPE]_[VEHICLE_ID]_[TIMESTAMP].csv"""
-    pattern = r'^([^_]+)_[^_]+_[^_]+_\d{4}-\d{2}-\d{2}T[\d:.]+Z\.csv$'
+    pattern = r'^([^_]+)_[^_]+_[^_]+_\d{4}-\d{2}-\d{2}T[\d:.]+Z\.csv(\.gz|\.zst)?$'
     match = re.match(pattern, filename)
     if match:
         return match.group(1)
@@ -159,7 +167,7 @@ def get_files_sorted_by_age(directory):
     files = []
     if directory.exists():
         for f in directory.iterdir():
-            if f.is_file():
+            if f.is_file() and not f.name.startswith('.') and not f.name.endswith(PARTIAL_SUFFIX):
                 files.append(f)
     # oldest first by filename timestamp, fall back to mtime if no timestamp
     result = []
@@ -211,9 +219,9 @@ def parse_video_filename(filename):
 
 
 def parse_csv_filename(filename):
-    """[DATA_TYPE]_[VEHICLE_TYPE]_[VEHICLE_ID]_[TIMESTAMP].csv
+    """[DATA_TYPE]_[VEHICLE_TYPE]_[VEHICLE_ID]_[TIMESTAMP].csv, optionally .csv.gz / .csv.zst
     -> {vehicle_id, year, month, day} or None"""
-    pattern = r'^([^_]+)_([^_]+)_([^_]+)_(\d{4})-(\d{2})-(\d{2})T[\d:.]+Z\.csv$'
+    pattern = r'^([^_]+)_([^_]+)_([^_]+)_(\d{4})-(\d{2})-(\d{2})T[\d:.]+Z\.csv(\.gz|\.zst)?$'
     match = re.match(pattern, filename)
 
     if not match:
@@ -227,6 +235,23 @@ def parse_csv_filename(filename):
     }
 
 
+def get_content_settings(file_path):
+    """content type by real extension, compressed csv keeps text/csv plus content encoding"""
+    suffixes = [s.lower() for s in file_path.suffixes]
+    content_encoding = None
+    if suffixes and suffixes[-1] in COMPRESSION_ENCODINGS:
+        content_encoding = COMPRESSION_ENCODINGS[suffixes[-1]]
+        suffixes = suffixes[:-1]
+    extension = suffixes[-1] if suffixes else ''
+
+    content_type = 'application/octet-stream'
+    if extension == '.csv':
+        content_type = 'text/csv'
+    elif extension == '.mp4':
+        content_type = 'video/mp4'
+    return ContentSettings(content_type=content_type, content_encoding=content_encoding)
+
+
 def upload_file_to_blob(file_path, blob_endpoint, sas_token, blob_path=None):
     """upload file to azure. blob_path is optional container prefix."""
     file_path = Path(file_path)
@@ -237,13 +262,8 @@ def upload_file_to_blob(file_path, blob_endpoint, sas_token, blob_path=None):
     logger.info(f"Uploading {file_name} to blob storage...")
 
     try:
-        # content type
-        extension = file_path.suffix.lower()
-        content_type = 'application/octet-stream'
-        if extension == '.csv':
-            content_type = 'text/csv'
-        elif extension == '.mp4':
-            content_type = 'video/mp4'
+        # content type (and encoding for compressed csv)
+        content_settings = get_content_settings(file_path)
 
         # build blob url with optional path
         if blob_path:
@@ -257,7 +277,7 @@ def upload_file_to_blob(file_path, blob_endpoint, sas_token, blob_path=None):
             blob_client.upload_blob(
                 f,
                 overwrite=True,
-                content_settings=ContentSettings(content_type=content_type)
+                content_settings=content_settings
             )
 
         logger.info(f"Successfully uploaded {file_name}")